@@ -0,0 +1 @@
+"""查找和替换的基准测试：语料生成（corpus）和计时（run）"""
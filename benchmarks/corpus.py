@@ -0,0 +1,159 @@
+"""生成基准测试用的合成语料：指定数量、大小和匹配密度的 .txt/.docx/.xlsx 文件
+
+同样的参数和随机种子总是生成同样的内容。每个文件中关键字出现的次数写入 manifest.json，
+基准测试据此检查查找结果是否正确。
+
+    python -m benchmarks.corpus 输出文件夹 --txt 200 --docx 50 --xlsx 50 --size 64
+"""
+import os
+import json
+import random
+import argparse
+
+DEFAULT_KEYWORD = 'needle'
+# 写在 manifest.json 中，用来认出这个工具生成的语料文件夹
+GENERATOR = 'textsearch-benchmark-corpus'
+# 每 1 万个字符中关键字出现的次数
+DEFAULT_DENSITY = 5.0
+
+_WORDS = ['alpha', 'beta', 'gamma', 'delta', 'search', 'replace', 'office', 'document', 'sheet', 'value',
+          'report', 'budget', 'quarter', 'summary', '文本', '查找', '替换', '表格', '文档', '数据', '季度', '报告']
+
+
+class CorpusSpec:
+    """语料参数；size 为每个文件的目标字符数"""
+
+    def __init__(self, txt=100, docx=20, xlsx=20, size=64 * 1024, density=DEFAULT_DENSITY,
+                 keyword=DEFAULT_KEYWORD, seed=0):
+        self.txt = txt
+        self.docx = docx
+        self.xlsx = xlsx
+        self.size = size
+        self.density = density
+        self.keyword = keyword
+        self.seed = seed
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+def _words(rng, spec, chars):
+    """返回若干单词（其中按密度混入关键字），总长度约为 chars，以及关键字出现的次数"""
+    words = []
+    count = length = 0
+    keyword_chance = spec.density / 10000 * 6
+    while length < chars:
+        if rng.random() < keyword_chance:
+            word = spec.keyword
+            count += 1
+        else:
+            word = rng.choice(_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return words, count
+
+
+def _write_txt(path, rng, spec):
+    words, count = _words(rng, spec, spec.size)
+    lines = [' '.join(words[i:i + 12]) for i in range(0, len(words), 12)]
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('\n'.join(lines))
+    return count
+
+
+def _write_docx(path, rng, spec):
+    import docx
+    words, count = _words(rng, spec, spec.size)
+    doc = docx.Document()
+    for i in range(0, len(words), 30):
+        doc.add_paragraph(' '.join(words[i:i + 30]))
+    doc.save(path)
+    return count
+
+
+def _write_xlsx(path, rng, spec):
+    from openpyxl import Workbook
+    words, count = _words(rng, spec, spec.size)
+    wb = Workbook()
+    sheet = wb.active
+    row = []
+    for word in words:
+        row.append(word)
+        if len(row) == 10:
+            sheet.append(row)
+            row = []
+    if row:
+        sheet.append(row)
+    wb.save(path)
+    return count
+
+
+_WRITERS = {'txt': _write_txt, 'docx': _write_docx, 'xlsx': _write_xlsx}
+
+
+def generate(folder, spec):
+    """在 folder 中生成语料并写入 manifest.json，返回 manifest
+
+    folder 不是空文件夹也不是之前生成的语料时抛出 ValueError，不往别的文件夹中写入文件。
+    """
+    if os.path.isdir(folder) and os.listdir(folder) and not is_corpus(folder):
+        raise ValueError(f"{folder} 不是空文件夹，也不是基准测试生成的语料，请换一个文件夹")
+    rng = random.Random(spec.seed)
+    os.makedirs(folder, exist_ok=True)
+    files = {}
+    for ext in ('txt', 'docx', 'xlsx'):
+        for i in range(getattr(spec, ext)):
+            # 分散到子目录中，遍历时也有目录结构
+            subdir = os.path.join(folder, ext, f'{i // 100:03d}')
+            os.makedirs(subdir, exist_ok=True)
+            path = os.path.join(subdir, f'file{i:05d}.{ext}')
+            files[os.path.relpath(path, folder)] = _WRITERS[ext](path, rng, spec)
+    manifest = {'generator': GENERATOR, 'spec': spec.to_dict(), 'files': files}
+    with open(os.path.join(folder, 'manifest.json'), 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, ensure_ascii=False, indent=1)
+    return manifest
+
+
+def load_manifest(folder):
+    with open(os.path.join(folder, 'manifest.json'), encoding='utf-8') as file:
+        return json.load(file)
+
+
+def is_corpus(folder):
+    """folder 中是否有这个工具写入的 manifest.json"""
+    try:
+        manifest = load_manifest(folder)
+    except (OSError, ValueError):
+        return False
+    return isinstance(manifest, dict) and manifest.get('generator') == GENERATOR
+
+
+def add_spec_arguments(parser):
+    parser.add_argument('--txt', type=int, default=100, help='.txt 文件数（默认 %(default)s）')
+    parser.add_argument('--docx', type=int, default=20, help='.docx 文件数（默认 %(default)s）')
+    parser.add_argument('--xlsx', type=int, default=20, help='.xlsx 文件数（默认 %(default)s）')
+    parser.add_argument('--size', type=int, default=64, help='每个文件的字符数，单位 K（默认 %(default)s）')
+    parser.add_argument('--density', type=float, default=DEFAULT_DENSITY,
+                        help='每 1 万个字符中关键字的出现次数（默认 %(default)s）')
+    parser.add_argument('--keyword', default=DEFAULT_KEYWORD, help='关键字（默认 %(default)s）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子（默认 %(default)s）')
+
+
+def spec_from_args(args):
+    return CorpusSpec(args.txt, args.docx, args.xlsx, args.size * 1024, args.density, args.keyword, args.seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.corpus', description='生成基准测试用的合成语料')
+    parser.add_argument('folder', help='输出文件夹')
+    add_spec_arguments(parser)
+    args = parser.parse_args(argv)
+    try:
+        manifest = generate(args.folder, spec_from_args(args))
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"已生成 {len(manifest['files'])} 个文件，关键字共出现 {sum(manifest['files'].values())} 次")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,339 @@
+"""查找和替换的基准测试
+
+分别计时遍历、提取、匹配、完整查找、预览和替换，输出每个阶段的文件/秒、MB/秒、峰值内存
+以及单个文件耗时的 p50/p95，并把结果保存为 JSON 以便对比不同版本。
+不需要显示器：加上 --gui 时以 offscreen 平台运行 Qt 界面的预览。
+
+    python -m benchmarks.run --txt 500 --docx 100 --xlsx 100 --output before.json
+    python -m benchmarks.run ... --output after.json --compare before.json
+"""
+import os
+
+# 必须在导入 PyQt6 之前设置
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import argparse
+import subprocess
+
+from textsearch.engine import SearchStats, compile_pattern, count_matches, search_tree
+from textsearch.extractors import read_file, file_type_of
+from textsearch.ooxml_replace import replace_office
+from textsearch.parallel import ExtractPool, default_workers
+from textsearch.preview import PreviewText, PAGED_PREVIEW_BYTES
+from textsearch.profiling import Profiler
+from textsearch.sniff import AUTO_ENCODING, file_encoding
+from textsearch.streaming import stream_replace, commit_replace
+from textsearch.walker import walk_files
+
+from .corpus import add_spec_arguments, spec_from_args, generate, is_corpus, load_manifest
+
+PHASES = ['walk', 'extract', 'match', 'search', 'preview', 'replace']
+FILE_FILTERS = ['*.txt', '*.docx', '*.xlsx']
+
+
+def reset_peak_rss():
+    """把进程的峰值内存重置为当前值（Linux），其他系统上忽略"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 上单位为字节，Linux 上为 KB
+    return maxrss / (1024 * 1024) if sys.platform == 'darwin' else maxrss / 1024
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Phase:
+    """一个阶段的计时：每个文件的耗时、字节数和出错数"""
+
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.files = 0
+        self.bytes = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.peak_rss = None
+        self._started = None
+
+    def __enter__(self):
+        reset_peak_rss()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self._started
+        self.peak_rss = peak_rss_mb()
+
+    def measure(self, fn, size=0):
+        """计时一个文件的处理，出错时计数并返回 None"""
+        started = time.perf_counter()
+        try:
+            result = fn()
+        except Exception:
+            self.errors += 1
+            result = None
+        self.latencies.append(time.perf_counter() - started)
+        self.files += 1
+        self.bytes += size
+        return result
+
+    def summary(self):
+        seconds = self.seconds or 1e-9
+        p50, p95 = percentile(self.latencies, 0.5), percentile(self.latencies, 0.95)
+        return {
+            'files': self.files,
+            'bytes': self.bytes,
+            'seconds': round(self.seconds, 4),
+            'files_per_second': round(self.files / seconds, 1),
+            'mb_per_second': round(self.bytes / (1024 * 1024) / seconds, 2),
+            'p50_ms': round(p50 * 1000, 3) if p50 is not None else None,
+            'p95_ms': round(p95 * 1000, 3) if p95 is not None else None,
+            'errors': self.errors,
+            'peak_rss_mb': round(self.peak_rss, 1) if self.peak_rss is not None else None,
+        }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def prepare_corpus(folder, spec):
+    """语料参数与 manifest.json 一致时直接使用，否则重新生成
+
+    只删除这个工具生成的语料文件夹；folder 是其他不空的文件夹时抛出 ValueError。
+    """
+    manifest = load_manifest(folder) if is_corpus(folder) else None
+    if manifest is None or manifest['spec'] != spec.to_dict():
+        if manifest is not None:
+            shutil.rmtree(folder)
+        manifest = generate(folder, spec)
+    return {os.path.join(folder, rel): count for rel, count in manifest['files'].items()}
+
+
+class Benchmark:
+    def __init__(self, corpus_dir, expected, pattern, encoding, workers, gui):
+        self.corpus_dir = corpus_dir
+        self.expected = expected
+        self.pattern = pattern
+        self.encoding = encoding
+        self.workers = workers
+        self.gui = gui
+        self.files = []
+        self.texts = {}
+        self.checks = {}
+
+    def run_walk(self, phase):
+        # 单个文件的耗时为从遍历器取出下一个路径所用的时间
+        self.files = []
+        paths = iter(walk_files(self.corpus_dir, FILE_FILTERS))
+        while True:
+            started = time.perf_counter()
+            path = next(paths, None)
+            if path is None:
+                break
+            phase.latencies.append(time.perf_counter() - started)
+            self.files.append(path)
+        phase.files = len(self.files)
+
+    def run_extract(self, phase):
+        for path in self.files:
+            result = phase.measure(lambda: read_file(path, self.encoding), os.path.getsize(path))
+            if result is not None:
+                self.texts[path] = result[0]
+
+    def run_match(self, phase):
+        mismatches = 0
+        for path, text in self.texts.items():
+            count = phase.measure(lambda: count_matches(self.pattern, text), len(text.encode('utf-8')))
+            if count != self.expected.get(path):
+                mismatches += 1
+        self.checks['match_mismatches'] = mismatches
+
+    def run_search(self, phase):
+        pool = ExtractPool(self.workers) if self.workers > 0 else None
+        stats = SearchStats()
+        # 单个文件的耗时取自 Profiler，Office 文件为子进程中各阶段的耗时
+        profiler = Profiler()
+        mismatches = 0
+        try:
+            # 进程池的启动时间也计入完整查找
+            for path, count, error in search_tree(self.corpus_dir, self.pattern, FILE_FILTERS, self.encoding,
+                                                  stats=stats, pool=pool, profiler=profiler):
+                if error is not None:
+                    phase.errors += 1
+                elif count != self.expected.get(path):
+                    mismatches += 1
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        phase.files = stats.files_scanned
+        phase.bytes = stats.bytes_read
+        phase.latencies = [profile.total() for profile in profiler.snapshot()]
+        self.checks['search_mismatches'] = mismatches
+
+    def run_preview(self, phase):
+        matched = [path for path in self.files if self.expected.get(path)]
+        if self.gui:
+            window = self._gui_window()
+            for path in matched:
+                phase.measure(lambda: window.preview_path(path), os.path.getsize(path))
+            window.close()
+            return
+        for path in matched:
+            phase.measure(lambda: self._preview(path), os.path.getsize(path))
+
+    def _preview(self, path):
+        if file_type_of(path) == 'text' and os.path.getsize(path) > PAGED_PREVIEW_BYTES:
+            return PreviewText.from_text_file(path, file_encoding(path, self.encoding), self.pattern)
+        content, _ = read_file(path, self.encoding)
+        return PreviewText.from_string(content, self.pattern)
+
+    def _gui_window(self):
+        from PyQt6.QtWidgets import QApplication
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        from main import TextSearchApp
+        self._app = QApplication.instance() or QApplication([])
+        window = TextSearchApp()
+        window.search_input.setText(self.pattern.pattern)
+        return window
+
+    def run_replace(self, phase):
+        # 在语料的副本上替换，语料本身保持不变
+        work_dir = tempfile.mkdtemp(prefix='textsearch-bench-replace-')
+        try:
+            copy_dir = os.path.join(work_dir, 'corpus')
+            shutil.copytree(self.corpus_dir, copy_dir)
+            mismatches = 0
+            for path in self.files:
+                copy_path = os.path.join(copy_dir, os.path.relpath(path, self.corpus_dir))
+                num_subs = phase.measure(lambda: self._replace(copy_path), os.path.getsize(copy_path))
+                if num_subs is not None and num_subs != self.expected.get(path):
+                    mismatches += 1
+            self.checks['replace_mismatches'] = mismatches
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _replace(self, path):
+        if file_type_of(path) == 'text':
+            temp_path, num_subs = stream_replace(path, self.pattern, 'REPLACED', file_encoding(path, self.encoding))
+        else:
+            temp_path, num_subs = replace_office(path, self.pattern, 'REPLACED')
+        if temp_path is not None:
+            commit_replace(path, temp_path)
+        return num_subs
+
+
+def compare(results, baseline):
+    """打印与之前结果的对比"""
+    print(f"{'阶段':<10}{'之前 文件/秒':>14}{'现在 文件/秒':>14}{'倍数':>8}{'之前 p95':>12}{'现在 p95':>12}")
+    for name, now in results['phases'].items():
+        before = baseline.get('phases', {}).get(name)
+        if before is None:
+            continue
+        ratio = now['files_per_second'] / before['files_per_second'] if before['files_per_second'] else float('nan')
+        print(f"{name:<10}{before['files_per_second']:>14}{now['files_per_second']:>14}{ratio:>8.2f}"
+              f"{str(before['p95_ms']):>12}{str(now['p95_ms']):>12}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run', description='查找和替换的基准测试')
+    add_spec_arguments(parser)
+    parser.add_argument('--corpus', default=os.path.join(tempfile.gettempdir(), 'textsearch-bench-corpus'),
+                        help='语料文件夹，参数变化时重新生成（默认 %(default)s）')
+    parser.add_argument('--phases', default=','.join(PHASES), help='要运行的阶段，逗号分隔（默认 %(default)s）')
+    parser.add_argument('--encoding', default=AUTO_ENCODING, help='纯文本文件的编码（默认 %(default)s）')
+    parser.add_argument('--workers', type=int, default=default_workers(),
+                        help='完整查找阶段解析 Office 文件的进程数，0 表示不用进程池（默认 %(default)s）')
+    parser.add_argument('--gui', action='store_true', help='预览阶段使用 offscreen 的 Qt 界面')
+    parser.add_argument('--output', help='把结果保存为 JSON 文件')
+    parser.add_argument('--compare', metavar='JSON', help='与之前保存的结果对比')
+    args = parser.parse_args(argv)
+
+    spec = spec_from_args(args)
+    phases = [p for p in args.phases.split(',') if p]
+    unknown = [p for p in phases if p not in PHASES]
+    if unknown:
+        parser.error(f"未知的阶段: {', '.join(unknown)}")
+
+    try:
+        expected = prepare_corpus(args.corpus, spec)
+    except ValueError as e:
+        parser.error(str(e))
+    pattern = compile_pattern(spec.keyword)
+    bench = Benchmark(args.corpus, expected, pattern, args.encoding, args.workers, args.gui)
+    # 其他阶段都需要文件列表，提取结果供匹配阶段使用
+    if 'walk' not in phases:
+        bench.run_walk(Phase('walk'))
+    if 'match' in phases and 'extract' not in phases:
+        bench.run_extract(Phase('extract'))
+
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'workers': args.workers,
+            'encoding': args.encoding,
+            'gui': args.gui,
+        },
+        'corpus': spec.to_dict(),
+        'phases': {},
+    }
+    for name in PHASES:
+        if name not in phases:
+            continue
+        with Phase(name) as phase:
+            getattr(bench, f'run_{name}')(phase)
+        results['phases'][name] = summary = phase.summary()
+        print(f"{name:<8} {summary['files']:>6} 个文件 {summary['seconds']:>8.3f} 秒 "
+              f"{summary['files_per_second']:>9} 个文件/秒 {summary['mb_per_second']:>8} MB/秒 "
+              f"p50 {summary['p50_ms']} ms p95 {summary['p95_ms']} ms 峰值内存 {summary['peak_rss_mb']} MB")
+    results['checks'] = bench.checks
+    if any(bench.checks.values()):
+        print(f"匹配数与语料不一致: {bench.checks}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            compare(results, json.load(file))
+    return 1 if any(bench.checks.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,22 +1,344 @@
 import sys
 import os
 import re
-import fnmatch
-from PyQt6.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QWidget, QLineEdit, QListWidget,
+import importlib.util
+import threading
+import time
+from PyQt6.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QWidget, QLineEdit, QListView,
                              QTextEdit, QPushButton, QHBoxLayout, QLabel, QMessageBox, QDialog, QCheckBox,
-                             QComboBox)
+                             QComboBox, QSpinBox, QFileDialog)
 from PyQt6.QtSvgWidgets import QSvgWidget
-from PyQt6.QtCore import Qt, QUrl, QTimer
+from PyQt6.QtCore import (Qt, QUrl, QTimer, QObject, QRunnable, QThreadPool, QPoint, QAbstractListModel, QModelIndex,
+                          pyqtSignal)
 from PyQt6.QtGui import QPixmap, QTextCursor, QTextCharFormat, QColor
 
-# 需要安装第三方库
-try:
-    import docx
-    from openpyxl import load_workbook
-except ImportError:
+# 需要安装第三方库；这里只检查是否安装，解析 Office 文件时才导入
+if importlib.util.find_spec('docx') is None or importlib.util.find_spec('openpyxl') is None:
     print("请安装 python-docx 和 openpyxl 库以支持 Office 文件格式。")
     sys.exit(1)
 
+from textsearch import extractors
+from textsearch.engine import (SearchStats, MatchOptions, MATCH_COUNT, MATCH_EXISTS, MATCH_TOP, compile_pattern,
+                               parse_file_filters, search_tree, replace_tree)
+from textsearch.parallel import ExtractPool, DEFAULT_CHUNK_SIZE, default_workers
+from textsearch.cache import TextCache
+from textsearch.index import TrigramIndex
+from textsearch.streaming import commit_replace
+from textsearch.walker import WalkOptions, DEFAULT_EXCLUDES
+from textsearch.snapshot import SearchSnapshot
+from textsearch.preview import PreviewText, PAGED_PREVIEW_BYTES, scan_text_file
+from textsearch.extractors import file_type_of
+from textsearch.archives import is_virtual
+from textsearch.locations import load_text_map
+from textsearch.sniff import AUTO_ENCODING, file_encoding
+from textsearch.journal import UndoJournal
+from textsearch.autosave import AutoSaver, write_content
+from textsearch.profiling import Profiler
+from textsearch.multiterm import MultiPattern, TermCounts, load_terms, parse_terms
+from textsearch.results import (ResultStore, ResultView, FORMATS, SORT_NONE, SORT_PATH, SORT_COUNT, SORT_FORMAT,
+                                first_match_context)
+
+# 后台查找结果分批发送到界面：攒够这么多条或超过这么长时间就发送一次
+RESULT_BATCH_SIZE = 200
+RESULT_BATCH_INTERVAL = 0.1
+
+# 自动刷新结果时轮询文件夹的间隔（毫秒）
+REFRESH_INTERVAL_MS = 5000
+
+# 大文件预览在后台查找匹配，每隔这么多秒把新找到的匹配和分页位置发到界面
+PREVIEW_SCAN_INTERVAL = 0.2
+
+# 预览中一次最多高亮这么多个可见的匹配项
+MAX_VISIBLE_HIGHLIGHTS = 2000
+
+# 性能分析中列出最慢的这么多个文件
+SLOWEST_FILES = 50
+
+
+# 上下文片段：每批最多在后台读取这么多行，最多缓存这么多行
+SNIPPET_BATCH_SIZE = 100
+SNIPPET_CACHE_SIZE = 5000
+
+# 结果排序下拉框中的选项
+SORT_NAMES = [(SORT_NONE, "查找顺序"), (SORT_PATH, "路径"), (SORT_COUNT, "匹配数（从多到少）"), (SORT_FORMAT, "格式")]
+
+# 匹配方式下拉框中的选项
+MATCH_MODE_NAMES = [(MATCH_COUNT, "统计所有匹配"), (MATCH_EXISTS, "只判断是否包含（找到第一个即停止）"),
+                    (MATCH_TOP, "每个文件只统计前 N 个匹配")]
+
+
+def result_text(file_path, count, match_options):
+    """结果列表中的一行"""
+    if match_options.mode == MATCH_EXISTS:
+        text = f"{file_path} - 包含匹配"
+    elif match_options.is_capped(count):
+        text = f"{file_path} - 至少 {count} 处匹配"
+    else:
+        text = f"{file_path} - {count} 处匹配"
+    if isinstance(count, TermCounts):
+        text += f"（{count.summary()}）"
+    return text
+
+
+class SearchSignals(QObject):
+    # 参数中的 int 为查找编号，界面据此丢弃已取消查找的迟到结果
+    results = pyqtSignal(int, list)
+    progress = pyqtSignal(int, str)
+    finished = pyqtSignal(int, bool, list)
+
+
+class SnippetSignals(QObject):
+    # 结果编号和 [(行号, 第一个匹配的位置, 上下文片段)]
+    ready = pyqtSignal(int, list)
+
+
+class SnippetWorker(QRunnable):
+    """在线程池中读取结果行的上下文片段"""
+
+    def __init__(self, generation, rows, pattern, encoding, cache=None):
+        super().__init__()
+        self.generation = generation
+        # [(行号, 路径)]
+        self.rows = rows
+        self.pattern = pattern
+        self.encoding = encoding
+        self.cache = cache
+        self.signals = SnippetSignals()
+
+    def run(self):
+        snippets = []
+        for row, file_path in self.rows:
+            try:
+                offset, snippet = first_match_context(file_path, self.pattern, self.encoding, cache=self.cache)
+            except Exception:
+                offset, snippet = -1, ""
+            snippets.append((row, offset, snippet))
+        self.signals.ready.emit(self.generation, snippets)
+
+
+class ResultModel(QAbstractListModel):
+    """结果列表的数据模型：数据按列保存在 ResultStore 中，只为显示出来的行生成文字
+
+    给出 snippet_source 时，显示出来的行在后台读取第一个匹配的上下文片段，读完后再刷新。
+    """
+
+    def __init__(self, thread_pool):
+        super().__init__()
+        self.thread_pool = thread_pool
+        self.store = ResultStore()
+        self.view = ResultView(self.store)
+        self.describe = None
+        # (pattern, encoding, 文本缓存) 或 None
+        self.snippet_source = None
+        self.snippets = {}
+        self.requested = set()
+        self.pending = []
+        self.generation = 0
+        self.snippet_timer = QTimer()
+        self.snippet_timer.setSingleShot(True)
+        self.snippet_timer.timeout.connect(self.fetch_snippets)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.view)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.view.row_at(index.row())
+        if role == Qt.ItemDataRole.DisplayRole:
+            text = self.describe(self.store, row)
+            snippet = self.snippets.get(row)
+            if snippet:
+                text += f"    {snippet}"
+            elif snippet is None and self.snippet_source is not None:
+                self.request_snippet(row)
+            return text
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return self.store.path(row)
+        return None
+
+    def reset(self, describe, snippet_source=None):
+        """清空结果；describe(store, row) 返回一行的文字"""
+        self.beginResetModel()
+        self.store = ResultStore()
+        view = ResultView(self.store)
+        view.configure(self.view.text, self.view.min_count, self.view.file_type, self.view.sort)
+        self.view = view
+        self.describe = describe
+        self.snippet_source = snippet_source
+        self.snippets = {}
+        self.requested = set()
+        self.pending = []
+        self.generation += 1
+        self.endResetModel()
+
+    def append(self, entries):
+        """追加 [(路径, 匹配数)]"""
+        rows = [self.store.append(file_path, count) for file_path, count in entries]
+        rows = self.view.accepted(rows)
+        if not rows:
+            return
+        first = len(self.view)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self.view.show(rows)
+        self.endInsertRows()
+
+    def configure_view(self, text, min_count, file_type, sort):
+        self.beginResetModel()
+        self.view.configure(text, min_count, file_type, sort)
+        self.endResetModel()
+
+    def update_view(self):
+        """查找结束后按当前条件重新排序（查找过程中新结果先排在末尾）"""
+        if self.view.sort != SORT_NONE:
+            self.configure_view(self.view.text, self.view.min_count, self.view.file_type, self.view.sort)
+
+    def path(self, index):
+        return self.store.path(self.view.row_at(index.row())) if index.isValid() else None
+
+    def index_of_path(self, file_path):
+        row = self.store.find(file_path)
+        position = self.view.position_of(row) if row >= 0 else -1
+        return self.index(position) if position >= 0 else QModelIndex()
+
+    def request_snippet(self, row):
+        if row in self.requested:
+            return
+        self.requested.add(row)
+        self.pending.append(row)
+        if not self.snippet_timer.isActive():
+            self.snippet_timer.start(50)
+
+    def fetch_snippets(self):
+        # 快速滚动时只读取最近请求的行
+        rows = self.pending[-SNIPPET_BATCH_SIZE:]
+        for row in self.pending[:-SNIPPET_BATCH_SIZE]:
+            self.requested.discard(row)
+        self.pending = []
+        if not rows or self.snippet_source is None:
+            return
+        pattern, encoding, cache = self.snippet_source
+        worker = SnippetWorker(self.generation, [(row, self.store.path(row)) for row in rows], pattern, encoding,
+                               cache)
+        worker.signals.ready.connect(self.on_snippets_ready)
+        self.thread_pool.start(worker)
+
+    def on_snippets_ready(self, generation, snippets):
+        if generation != self.generation:
+            return
+        for row, offset, snippet in snippets:
+            self.snippets[row] = snippet
+            self.store.first_offsets[row] = offset
+        while len(self.snippets) > SNIPPET_CACHE_SIZE:
+            row = next(iter(self.snippets))
+            del self.snippets[row]
+            self.requested.discard(row)
+        if len(self.view):
+            self.dataChanged.emit(self.index(0), self.index(len(self.view) - 1))
+
+
+class AutoSaveSignals(QObject):
+    # 后台保存完成：文件路径、耗时（秒）、异常（成功时为 None）
+    saved = pyqtSignal(str, float, object)
+
+
+class PreviewScanSignals(QObject):
+    # 预览编号和 scan_text_file 返回的一批结果
+    batch = pyqtSignal(int, object)
+    failed = pyqtSignal(int, object)
+
+
+class PreviewScanWorker(QRunnable):
+    """在线程池中查找大的纯文本文件的匹配和分页位置，界面先显示第一页"""
+
+    def __init__(self, generation, file_path, encoding, pattern):
+        super().__init__()
+        self.generation = generation
+        self.file_path = file_path
+        self.encoding = encoding
+        self.pattern = pattern
+        self.cancel_event = threading.Event()
+        self.signals = PreviewScanSignals()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        try:
+            for batch in scan_text_file(self.file_path, self.encoding, self.pattern, self.cancel_event,
+                                        PREVIEW_SCAN_INTERVAL):
+                if self.cancel_event.is_set():
+                    return
+                self.signals.batch.emit(self.generation, batch)
+        except Exception as e:
+            self.signals.failed.emit(self.generation, e)
+
+
+class SearchWorker(QRunnable):
+    """在线程池中遍历并查找文件，分批把结果发回界面线程"""
+
+    def __init__(self, generation, folder_path, pattern, file_filters, encoding, pool=None, cache=None,
+                 index=None, walk_options=None, snapshot=None, profiler=None, match_options=None):
+        super().__init__()
+        self.generation = generation
+        self.profiler = profiler
+        self.match_options = match_options or MatchOptions()
+        self.pool = pool
+        self.cache = cache
+        self.index = index
+        self.walk_options = walk_options
+        self.snapshot = snapshot
+        self.folder_path = folder_path
+        self.pattern = pattern
+        self.file_filters = file_filters
+        self.encoding = encoding
+        self.cancel_event = threading.Event()
+        self.signals = SearchSignals()
+        # 多关键字查找时各关键字的匹配总数
+        self.term_totals = {}
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        stats = SearchStats()
+        batch = []
+        errors = []
+        last_emit = time.monotonic()
+        try:
+            for file_path, count, error in search_tree(self.folder_path, self.pattern, self.file_filters,
+                                                       self.encoding, self.cancel_event, stats, self.pool,
+                                                       self.cache, self.index, self.walk_options, self.snapshot,
+                                                       self.profiler, self.match_options):
+                if error is not None:
+                    errors.append((file_path, error))
+                elif count:
+                    if isinstance(count, TermCounts):
+                        for term, n in count.counts.items():
+                            self.term_totals[term] = self.term_totals.get(term, 0) + n
+                    batch.append((file_path, count))
+
+                now = time.monotonic()
+                if len(batch) >= RESULT_BATCH_SIZE or now - last_emit >= RESULT_BATCH_INTERVAL:
+                    self.flush(batch, stats)
+                    batch = []
+                    last_emit = now
+        except Exception as e:
+            # 线程池中未处理的异常会让 PyQt6 直接退出；报告为错误，并照常发出 finished 让界面结束查找状态
+            errors.append((self.folder_path, e))
+        finally:
+            self.flush(batch, stats)
+            self.signals.finished.emit(self.generation, self.cancel_event.is_set(), errors)
+
+    def flush(self, batch, stats):
+        if batch:
+            self.signals.results.emit(self.generation, batch)
+        summary = stats.summary()
+        if self.term_totals:
+            summary += f"；{TermCounts(self.term_totals).summary()}"
+        self.signals.progress.emit(self.generation, summary)
+
+
 class TextSearchApp(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -35,29 +357,118 @@ class TextSearchApp(QMainWindow):
         # 正则表达式复选框
         self.regex_checkbox = QCheckBox("使用正则表达式")
 
+        # 多关键字：分号分隔的关键字按字面一次扫描同时查找，也可以从文件加载（每行一个）
+        self.multi_term_checkbox = QCheckBox("多个关键字（分号分隔）")
+        self.multi_term_checkbox.toggled.connect(self.on_multi_term_toggled)
+        self.load_terms_button = QPushButton("从文件加载关键字")
+        self.load_terms_button.clicked.connect(self.load_terms_file)
+
+        # 索引复选框：为文件夹建立三元组索引，之后只读取可能匹配的文件
+        self.index_checkbox = QCheckBox("使用索引加速查找（首次查找时建立）")
+
         # 编码格式选择
         self.encoding_label = QLabel("选择编码格式:")
         self.encoding_combo = QComboBox()
-        self.encoding_combo.addItems(['utf-8', 'gbk', 'gb2312', 'ascii', 'latin1'])
+        # auto：读取每个文件开头几 KB 检测编码
+        self.encoding_combo.addItems([AUTO_ENCODING, 'utf-8', 'gbk', 'gb2312', 'ascii', 'latin1'])
 
         # 文件过滤输入框
         self.file_filter_label = QLabel("文件过滤（使用分号分隔，支持通配符，例如 *.txt;*.docx）:")
         self.file_filter_input = QLineEdit("*.txt;*.docx")
 
+        # 排除规则：匹配的目录整棵跳过，不再进入
+        self.exclude_label = QLabel("排除（使用分号分隔，匹配文件名或目录名，含 / 时匹配相对路径）:")
+        self.exclude_input = QLineEdit(";".join(DEFAULT_EXCLUDES))
+
+        # 遍历深度、文件大小上限和符号链接
+        self.max_depth_label = QLabel("最大深度（0 为不限）:")
+        self.max_depth_spin = QSpinBox()
+        self.max_depth_spin.setRange(0, 1000)
+        self.max_size_label = QLabel("最大文件大小 MB（0 为不限）:")
+        self.max_size_spin = QSpinBox()
+        self.max_size_spin.setRange(0, 1024 * 1024)
+        self.follow_symlinks_checkbox = QCheckBox("进入符号链接目录")
+        # 压缩包中的文件只能查找和预览，不能替换和编辑
+        self.archive_depth_label = QLabel("压缩包层数（0 为不查找压缩包）:")
+        self.archive_depth_spin = QSpinBox()
+        self.archive_depth_spin.setRange(0, 10)
+
+        # Office 文件解析进程数和每批文件数
+        self.workers_label = QLabel("解析进程数:")
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, 256)
+        self.workers_spin.setValue(default_workers())
+        self.chunk_size_label = QLabel("每批文件数:")
+        self.chunk_size_spin = QSpinBox()
+        self.chunk_size_spin.setRange(1, 1000)
+        self.chunk_size_spin.setValue(DEFAULT_CHUNK_SIZE)
+
+        # 匹配方式：只需要知道哪些文件包含关键字时，找到第一个匹配就不再读取这个文件
+        self.match_mode_label = QLabel("匹配方式:")
+        self.match_mode_combo = QComboBox()
+        for mode, name in MATCH_MODE_NAMES:
+            self.match_mode_combo.addItem(name, mode)
+        self.match_mode_combo.currentIndexChanged.connect(self.on_match_mode_changed)
+        self.max_per_file_label = QLabel("每个文件 N:")
+        self.max_per_file_spin = QSpinBox()
+        self.max_per_file_spin.setRange(1, 1000000)
+        self.max_per_file_spin.setValue(10)
+        self.max_per_file_spin.setEnabled(False)
+        self.max_results_label = QLabel("最多结果文件数（0 为不限）:")
+        self.max_results_spin = QSpinBox()
+        self.max_results_spin.setRange(0, 10000000)
+
         # 显示拖放区域
         self.drop_label = QLabel("将文件夹拖放到此处")
         self.drop_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.drop_label.setStyleSheet("border: 2px dashed gray; padding: 20px;")
         self.drop_label.setAcceptDrops(True)
 
-        # 结果列表框
-        self.result_list = QListWidget()
+        # 结果列表：数据保存在 ResultModel 中，只绘制可见的行
+        self.thread_pool = QThreadPool.globalInstance()
+        self.result_model = ResultModel(self.thread_pool)
+        self.result_view = QListView()
+        self.result_view.setModel(self.result_model)
+        self.result_view.setUniformItemSizes(True)
+
+        # 结果筛选和排序
+        self.result_filter_input = QLineEdit()
+        self.result_filter_input.setPlaceholderText("按路径筛选结果")
+        self.result_filter_input.textChanged.connect(self.apply_result_view)
+        self.result_min_count_label = QLabel("最少匹配数:")
+        self.result_min_count_spin = QSpinBox()
+        self.result_min_count_spin.setRange(0, 1000000000)
+        self.result_min_count_spin.valueChanged.connect(self.apply_result_view)
+        self.result_format_combo = QComboBox()
+        self.result_format_combo.addItem("全部格式", None)
+        for file_type in FORMATS:
+            self.result_format_combo.addItem(file_type, file_type)
+        self.result_format_combo.currentIndexChanged.connect(self.apply_result_view)
+        self.result_sort_combo = QComboBox()
+        for sort, name in SORT_NAMES:
+            self.result_sort_combo.addItem(name, sort)
+        self.result_sort_combo.currentIndexChanged.connect(self.apply_result_view)
 
         # 文件预览框
         self.file_preview = QTextEdit()
         self.file_preview.setReadOnly(False)  # 设置为可编辑
         self.file_preview.document().setUndoRedoEnabled(True)
 
+        # 滚动时重新计算可见区域内的高亮
+        self.file_preview.verticalScrollBar().valueChanged.connect(self.update_visible_highlights)
+        self.file_preview.horizontalScrollBar().valueChanged.connect(self.update_visible_highlights)
+
+        # 编辑后重新计算匹配位置
+        self.rematch_timer = QTimer()
+        self.rematch_timer.setSingleShot(True)
+        self.rematch_timer.timeout.connect(self.rematch_preview)
+
+        # 分页预览的页码
+        self.preview_page_label = QLabel("")
+
+        # 自动保存的耗时
+        self.save_status_label = QLabel("")
+
         # 实时保存定时器
         self.save_timer = QTimer()
         self.save_timer.setSingleShot(True)
@@ -68,6 +479,24 @@ class TextSearchApp(QMainWindow):
         self.search_button = QPushButton("开始查找")
         self.search_button.clicked.connect(self.search_files)
 
+        # 自动刷新：定时增量查找，只重新读取改动过的文件
+        self.auto_refresh_checkbox = QCheckBox("文件改动时自动刷新结果")
+        self.auto_refresh_checkbox.toggled.connect(self.on_auto_refresh_toggled)
+        self.refresh_timer = QTimer()
+        self.refresh_timer.timeout.connect(self.refresh_results)
+
+        # "取消查找" 按钮
+        self.cancel_button = QPushButton("取消查找")
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_search)
+
+        # 查找进度
+        self.progress_label = QLabel("")
+
+        # "性能分析" 按钮：上一次查找或替换中每个文件各阶段的耗时
+        self.profile_button = QPushButton("性能分析")
+        self.profile_button.clicked.connect(self.show_profile_report)
+
         # "下一个匹配项" 按钮
         self.next_match_button = QPushButton("下一个匹配项")
         self.next_match_button.clicked.connect(self.go_to_next_match)
@@ -95,13 +524,60 @@ class TextSearchApp(QMainWindow):
         layout.addWidget(self.replace_label)
         layout.addWidget(self.replace_input)
         layout.addWidget(self.regex_checkbox)
+        terms_layout = QHBoxLayout()
+        terms_layout.addWidget(self.multi_term_checkbox)
+        terms_layout.addWidget(self.load_terms_button)
+        layout.addLayout(terms_layout)
+        layout.addWidget(self.index_checkbox)
         layout.addWidget(self.encoding_label)
         layout.addWidget(self.encoding_combo)
         layout.addWidget(self.file_filter_label)
         layout.addWidget(self.file_filter_input)
+        layout.addWidget(self.exclude_label)
+        layout.addWidget(self.exclude_input)
+
+        walk_layout = QHBoxLayout()
+        walk_layout.addWidget(self.max_depth_label)
+        walk_layout.addWidget(self.max_depth_spin)
+        walk_layout.addWidget(self.max_size_label)
+        walk_layout.addWidget(self.max_size_spin)
+        walk_layout.addWidget(self.follow_symlinks_checkbox)
+        walk_layout.addWidget(self.archive_depth_label)
+        walk_layout.addWidget(self.archive_depth_spin)
+        layout.addLayout(walk_layout)
+
+        pool_layout = QHBoxLayout()
+        pool_layout.addWidget(self.workers_label)
+        pool_layout.addWidget(self.workers_spin)
+        pool_layout.addWidget(self.chunk_size_label)
+        pool_layout.addWidget(self.chunk_size_spin)
+        layout.addLayout(pool_layout)
+
+        match_layout = QHBoxLayout()
+        match_layout.addWidget(self.match_mode_label)
+        match_layout.addWidget(self.match_mode_combo)
+        match_layout.addWidget(self.max_per_file_label)
+        match_layout.addWidget(self.max_per_file_spin)
+        match_layout.addWidget(self.max_results_label)
+        match_layout.addWidget(self.max_results_spin)
+        layout.addLayout(match_layout)
         layout.addWidget(self.drop_label)
-        layout.addWidget(self.search_button)
-        layout.addWidget(self.result_list)
+
+        search_layout = QHBoxLayout()
+        search_layout.addWidget(self.search_button)
+        search_layout.addWidget(self.cancel_button)
+        search_layout.addWidget(self.auto_refresh_checkbox)
+        search_layout.addWidget(self.profile_button)
+        layout.addLayout(search_layout)
+        layout.addWidget(self.progress_label)
+        result_view_layout = QHBoxLayout()
+        result_view_layout.addWidget(self.result_filter_input)
+        result_view_layout.addWidget(self.result_min_count_label)
+        result_view_layout.addWidget(self.result_min_count_spin)
+        result_view_layout.addWidget(self.result_format_combo)
+        result_view_layout.addWidget(self.result_sort_combo)
+        layout.addLayout(result_view_layout)
+        layout.addWidget(self.result_view)
 
         button_layout = QHBoxLayout()
         button_layout.addWidget(self.next_match_button)
@@ -111,7 +587,9 @@ class TextSearchApp(QMainWindow):
         button_layout.addWidget(self.undo_button)
         layout.addLayout(button_layout)
 
+        layout.addWidget(self.preview_page_label)
         layout.addWidget(self.file_preview)
+        layout.addWidget(self.save_status_label)
 
         # 主窗口设置
         container = QWidget()
@@ -124,13 +602,51 @@ class TextSearchApp(QMainWindow):
         # 设置拖放功能
         self.setAcceptDrops(True)
         self.folder_path = ""
-        self.matches = []  # 保存所有匹配项的位置
+        self.preview = None  # 预览文件的匹配位置，大文件按页加载
+        self.preview_pattern = None
+        self.preview_window = (0, 0)  # 编辑框中显示的内容在文件中的范围
+        self.preview_pages = (0, 0)  # 分页预览当前显示的页范围
+        self.preview_scan = None  # 在后台查找大文件预览的 PreviewScanWorker
+        self.preview_generation = 0
         self.current_match_index = -1  # 当前的匹配项索引
-
-        self.undo_stack = []  # 撤销栈
+        self.current_file_path = None
+        self.current_file_type = None
+        self.current_file_encoding = None
+        self.preview_read_only = False  # 分页预览和压缩包中的文件不能编辑和保存
+        self.preview_locations = None  # Office 文件中文本位置到段落、单元格的 OffsetMap
+        self.loading_preview = False  # 正在把文件内容放入编辑框，这时的 textChanged 不是编辑
+
+        # 编辑内容在后台线程中保存，内容没有变化时不写文件
+        self.autosave_signals = AutoSaveSignals()
+        self.autosave_signals.saved.connect(self.on_autosaved)
+        self.autosaver = AutoSaver(self.autosave_signals.saved.emit)
+
+        # 撤销栈，修改前的文件保存在磁盘上
+        self.undo_journal = UndoJournal()
+
+        # 后台查找
+        self.search_worker = None
+        self.search_generation = 0
+        self.extract_pool = ExtractPool(self.workers_spin.value(), self.chunk_size_spin.value())
+
+        # Office 文件提取文本的磁盘缓存
+        self.text_cache = TextCache()
+
+        # 当前文件夹的三元组索引
+        self.search_index = None
+
+        # 上一次查找的快照，再次查找时只重新读取改动过的文件
+        self.search_snapshot = SearchSnapshot()
+        self.last_search = None
+        self.search_match_options = MatchOptions()
+        self.refreshing = False
+        self.refresh_items = []
+
+        # 上一次查找或替换的计时
+        self.profiler = None
 
         # 结果点击事件
-        self.result_list.itemClicked.connect(self.preview_file)
+        self.result_view.clicked.connect(self.preview_file)
 
     def create_info_icon(self):
         """在右上角显示 i 信息图标"""
@@ -156,20 +672,44 @@ class TextSearchApp(QMainWindow):
         dialog.exec()
 
     def get_search_pattern(self, text):
-        if self.regex_checkbox.isChecked():
+        if self.multi_term_checkbox.isChecked():
             try:
-                pattern = re.compile(text)
-            except re.error:
-                self.show_error_message("无效的正则表达式！")
+                return MultiPattern(parse_terms(text))
+            except ValueError:
+                self.show_error_message("请输入至少一个关键字！")
                 return None
-        else:
-            pattern = re.compile(re.escape(text))
-        return pattern
+        try:
+            return compile_pattern(text, self.regex_checkbox.isChecked())
+        except re.error:
+            self.show_error_message("无效的正则表达式！")
+            return None
+
+    def on_multi_term_toggled(self, checked):
+        # 多个关键字总是按字面匹配
+        self.regex_checkbox.setEnabled(not checked)
+
+    def load_terms_file(self):
+        path, _ = QFileDialog.getOpenFileName(self, "加载关键字", "", "文本文件 (*.txt);;所有文件 (*)")
+        if not path:
+            return
+        try:
+            terms = load_terms(path)
+        except Exception as e:
+            self.show_error_message(f"无法读取文件: {path}\n错误信息: {e}")
+            return
+        self.multi_term_checkbox.setChecked(True)
+        self.search_input.setText(';'.join(terms))
 
     def search_files(self):
-        self.result_list.clear()
+        self.cancel_search()
+        self.result_model.reset(self.search_result_text)
+        # 先保存尚未保存的编辑并等待写完，清空预览不算作编辑，查找时读到的是编辑后的内容
+        self.flush_autosave(wait=True)
+        self.cancel_preview_scan()
+        self.current_file_path = None
         self.file_preview.clear()
-        self.matches.clear()
+        self.preview = None
+        self.preview_page_label.setText("")
         self.current_match_index = -1
 
         search_term = self.search_input.text()
@@ -177,133 +717,360 @@ class TextSearchApp(QMainWindow):
             self.show_error_message("请输入关键字并拖放文件夹！")
             return
 
-        file_filters = self.file_filter_input.text().split(';')
-        file_filters = [f.strip() for f in file_filters if f.strip()]
+        file_filters = parse_file_filters(self.file_filter_input.text())
         encoding = self.encoding_combo.currentText()
 
         pattern = self.get_search_pattern(search_term)
         if not pattern:
             return
 
-        # 遍历文件夹中的所有文件
-        for root, dirs, files in os.walk(self.folder_path):
-            for file_name in files:
-                # 文件过滤
-                matched = False
-                for file_filter in file_filters:
-                    if fnmatch.fnmatch(file_name, file_filter):
-                        matched = True
-                        break
-                if not matched:
-                    continue
+        self.last_search = (self.folder_path, pattern, file_filters, encoding)
+        self.start_search_worker(refreshing=False)
+        self.progress_label.setText("正在查找...")
+
+    def start_search_worker(self, refreshing):
+        # 在线程池中遍历文件，结果分批追加到列表
+        folder_path, pattern, file_filters, encoding = self.last_search
+        self.search_generation += 1
+        self.refreshing = refreshing
+        self.refresh_items = []
+        # 每 5 秒一次的自动刷新不做性能分析，不替换上一次查找的分析结果
+        profiler = None if refreshing else Profiler()
+        if profiler is not None:
+            self.profiler = profiler
+        self.search_match_options = self.match_options()
+        if not refreshing:
+            self.result_model.reset(self.search_result_text, (pattern, encoding, self.text_cache))
+        worker = SearchWorker(self.search_generation, folder_path, pattern, file_filters, encoding,
+                              self.configured_pool(), self.text_cache, self.folder_index(),
+                              self.walk_options(), self.search_snapshot, profiler, self.search_match_options)
+        worker.signals.results.connect(self.on_search_results)
+        worker.signals.progress.connect(self.on_search_progress)
+        worker.signals.finished.connect(self.on_search_finished)
+        self.search_worker = worker
+        self.cancel_button.setEnabled(True)
+        self.thread_pool.start(worker)
+
+    def on_auto_refresh_toggled(self, checked):
+        if checked:
+            self.refresh_timer.start(REFRESH_INTERVAL_MS)
+        else:
+            self.refresh_timer.stop()
 
-                file_path = os.path.join(root, file_name)
-                try:
-                    if file_name.endswith('.docx'):
-                        content = self.read_docx(file_path)
-                    elif file_name.endswith('.xlsx'):
-                        content = self.read_xlsx(file_path)
-                    else:
-                        with open(file_path, 'r', encoding=encoding, errors='ignore') as file:
-                            content = file.read()
-
-                    matches = list(pattern.finditer(content))
-
-                    if matches:
-                        self.result_list.addItem(f"{file_path} - {len(matches)} 处匹配")
-                except Exception as e:
-                    self.show_error_message(f"无法读取文件: {file_path}\n错误信息: {e}")
+    def refresh_results(self):
+        """按上一次查找的条件增量查找，结果有变化时整体替换列表"""
+        if self.search_worker is not None or self.last_search is None:
+            return
+        if self.last_search[0] != self.folder_path:
+            return
+        self.start_search_worker(refreshing=True)
+
+    def configured_pool(self):
+        self.extract_pool.configure(self.workers_spin.value(), self.chunk_size_spin.value())
+        return self.extract_pool
+
+    def match_options(self):
+        max_results = self.max_results_spin.value()
+        return MatchOptions(self.match_mode_combo.currentData(), self.max_per_file_spin.value(),
+                            max_results or None)
+
+    def on_match_mode_changed(self, index):
+        self.max_per_file_spin.setEnabled(self.match_mode_combo.currentData() == MATCH_TOP)
+
+    def walk_options(self):
+        # 界面上的最大深度从 1 开始计数，1 表示只查找文件夹本身
+        max_depth = self.max_depth_spin.value()
+        max_size = self.max_size_spin.value()
+        return WalkOptions(parse_file_filters(self.exclude_input.text()),
+                           max_depth - 1 if max_depth else None,
+                           max_size * 1024 * 1024 if max_size else None,
+                           self.follow_symlinks_checkbox.isChecked(),
+                           self.archive_depth_spin.value())
+
+    def folder_index(self):
+        if not self.index_checkbox.isChecked():
+            return None
+        if self.search_index is None or self.search_index.folder_path != self.folder_path:
+            if self.search_index is not None:
+                self.search_index.close()
+            self.search_index = TrigramIndex(self.folder_path)
+        return self.search_index
+
+    def cancel_search(self):
+        if self.search_worker is not None:
+            self.search_worker.cancel()
+            self.search_worker = None
+            self.search_generation += 1
+            self.cancel_button.setEnabled(False)
+            if not self.refreshing:
+                self.progress_label.setText(self.progress_label.text() + "（已取消）")
+            self.refreshing = False
+
+    def on_search_results(self, generation, batch):
+        if generation != self.search_generation:
+            return
+        if self.refreshing:
+            self.refresh_items.extend(batch)
+        else:
+            self.result_model.append(batch)
+
+    def on_search_progress(self, generation, summary):
+        if generation == self.search_generation:
+            self.progress_label.setText(summary)
+            if not self.refreshing:
+                self.statusBar().showMessage(self.profiler.summary())
+
+    def on_search_finished(self, generation, cancelled, errors):
+        if generation != self.search_generation:
+            return
+        self.search_worker = None
+        self.cancel_button.setEnabled(False)
+        self.progress_label.setText(f"{self.progress_label.text()}，{self.text_cache.summary()}")
+        self.result_model.update_view()
+        if self.refreshing:
+            # 自动刷新不弹出错误对话框，只在结果变化时更新列表
+            self.refreshing = False
+            if not cancelled:
+                self.replace_result_items(self.refresh_items)
+            return
+        if errors:
+            # 只列出前几个出错的文件，避免弹出过多对话框
+            details = "\n".join(f"{path}\n错误信息: {e}" for path, e in errors[:10])
+            more = f"\n……共 {len(errors)} 个文件" if len(errors) > 10 else ""
+            self.show_error_message(f"无法读取文件:\n{details}{more}")
+
+    def replace_result_items(self, items):
+        current = self.result_model.store.entries()
+        # Office 文件由进程池处理，结果顺序每次可能不同
+        if sorted((path, int(count)) for path, count in items) == sorted(current):
+            return
+        selected = self.result_model.path(self.result_view.currentIndex())
+        pattern, encoding = self.last_search[1], self.last_search[3]
+        self.result_model.reset(self.search_result_text, (pattern, encoding, self.text_cache))
+        self.result_model.append(items)
+        self.result_model.update_view()
+        if selected is not None:
+            self.result_view.setCurrentIndex(self.result_model.index_of_path(selected))
+
+    def search_result_text(self, store, row):
+        return result_text(store.path(row), store.count(row), self.search_match_options)
+
+    def apply_result_view(self):
+        self.result_model.configure_view(self.result_filter_input.text(), self.result_min_count_spin.value(),
+                                         self.result_format_combo.currentData(),
+                                         self.result_sort_combo.currentData())
 
     def read_docx(self, file_path):
-        doc = docx.Document(file_path)
-        full_text = []
-        for para in doc.paragraphs:
-            full_text.append(para.text)
-        return '\n'.join(full_text)
+        return extractors.read_docx(file_path)
 
     def read_xlsx(self, file_path):
-        wb = load_workbook(file_path)
-        full_text = []
-        for sheet in wb:
-            for row in sheet.iter_rows(values_only=True):
-                full_text.append(' '.join([str(cell) if cell is not None else '' for cell in row]))
-        return '\n'.join(full_text)
-
-    def preview_file(self, item):
-        file_info = item.text().split(" - ")[0]
+        return extractors.read_xlsx(file_path)
+
+    def preview_file(self, index):
+        file_info = self.result_model.path(index)
+        if file_info is None:
+            return
+        self.preview_path(file_info)
+
+    def preview_path(self, file_info):
         search_term = self.search_input.text()
         encoding = self.encoding_combo.currentText()
 
+        # 切换文件之前保存上一个文件尚未保存的编辑，并等待写完再从磁盘读取，
+        # 否则再次点击同一个文件时读到的是编辑前的内容，mark_saved 还会丢掉排队中的保存
+        self.flush_autosave(wait=True)
+        self.cancel_preview_scan()
+
         try:
-            if file_info.endswith('.docx'):
-                content = self.read_docx(file_info)
-                self.current_file_type = 'docx'
-            elif file_info.endswith('.xlsx'):
-                content = self.read_xlsx(file_info)
-                self.current_file_type = 'xlsx'
-            else:
-                with open(file_info, 'r', encoding=encoding, errors='ignore') as file:
-                    content = file.read()
+            pattern = self.get_search_pattern(search_term) if search_term else None
+            # 压缩包中的文件直接从压缩包中读取，只读
+            in_archive = is_virtual(file_info)
+            if file_type_of(file_info) == 'text' and not in_archive:
+                # 预览和之后的保存都使用这个文件检测到的编码
+                encoding = file_encoding(file_info, encoding)
+
+            # 大的纯文本文件先显示第一页，匹配和分页位置在后台边读边记录，不整个读入
+            if file_type_of(file_info) == 'text' and not in_archive and \
+                    os.path.getsize(file_info) > PAGED_PREVIEW_BYTES:
+                preview = PreviewText.open_text_file(file_info, encoding)
                 self.current_file_type = 'text'
+                self.preview_locations = None
+            elif file_type_of(file_info) != 'text':
+                # Office 文件同时记录每段文本来自哪个段落或单元格，跳转到匹配时显示
+                content, self.preview_locations = load_text_map(file_info, cache=self.text_cache)
+                self.current_file_type = file_type_of(file_info)
+                preview = PreviewText.from_string(content, pattern)
+            else:
+                self.preview_locations = None
+                content, self.current_file_type = extractors.read_file(file_info, encoding, cache=self.text_cache)
+                preview = PreviewText.from_string(content, pattern)
 
-            self.file_preview.setPlainText(content)
             self.current_file_path = file_info  # 保存当前文件路径
-
-            self.matches.clear()
+            self.current_file_encoding = encoding
+            self.preview_read_only = preview.paged or in_archive
+            self.preview = preview
+            self.preview_pattern = pattern
             self.current_match_index = -1
 
-            pattern = self.get_search_pattern(search_term)
-            if not pattern:
-                return
-
-            self.file_preview.moveCursor(QTextCursor.MoveOperation.Start)
-            highlight_format = QTextCharFormat()
-            highlight_format.setBackground(QColor("yellow"))
-            highlight_format.setForeground(QColor("black"))
-
-            # 移除之前的高亮
-            self.file_preview.setExtraSelections([])
-
-            extraSelections = []
+            # 分页预览只显示一部分内容，压缩包中的文件不能写回，都不能编辑和自动保存
+            self.file_preview.setReadOnly(self.preview_read_only)
+            self.show_preview_pages(0, 0)
+            if not self.preview_read_only:
+                # 记录编辑框中的内容而不是读出的内容：toPlainText 会把 U+00A0 换成空格、U+2028/2029 换成换行，
+                # 只是查看文件时不能因此写回
+                self.autosaver.mark_saved(file_info, self.file_preview.toPlainText())
 
-            for match in pattern.finditer(content):
-                start_pos = match.start()
-                end_pos = match.end()
-                selection = QTextEdit.ExtraSelection()
-                selection.cursor = self.file_preview.textCursor()
-                selection.cursor.setPosition(start_pos)
-                selection.cursor.setPosition(end_pos, QTextCursor.MoveMode.KeepAnchor)
-                selection.format = highlight_format
-                extraSelections.append(selection)
-
-                self.matches.append((start_pos, end_pos))
-
-            self.file_preview.setExtraSelections(extraSelections)
-
-            if self.matches:
+            if len(preview.starts):
                 self.current_match_index = 0
                 self.go_to_match(self.current_match_index)
+            if not preview.complete:
+                self.start_preview_scan(file_info, encoding, pattern)
 
         except Exception as e:
             self.show_error_message(f"无法预览文件: {file_info}\n错误信息: {e}")
 
+    def start_preview_scan(self, file_path, encoding, pattern):
+        self.preview_generation += 1
+        worker = PreviewScanWorker(self.preview_generation, file_path, encoding, pattern)
+        worker.signals.batch.connect(self.on_preview_scan_batch)
+        worker.signals.failed.connect(self.on_preview_scan_failed)
+        self.preview_scan = worker
+        self.thread_pool.start(worker)
+
+    def cancel_preview_scan(self):
+        if self.preview_scan is not None:
+            self.preview_scan.cancel()
+            self.preview_scan = None
+            self.preview_generation += 1
+
+    def on_preview_scan_batch(self, generation, batch):
+        if generation != self.preview_generation or self.preview is None:
+            return
+        self.preview.add_scan(*batch)
+        if self.preview.complete:
+            self.preview_scan = None
+        if self.current_match_index < 0 and len(self.preview.starts):
+            # 找到第一个匹配时跳过去，之后只更新页数和高亮，不打断用户翻看
+            self.current_match_index = 0
+            self.go_to_match(self.current_match_index)
+        else:
+            self.update_preview_page_label()
+            self.update_visible_highlights()
+
+    def on_preview_scan_failed(self, generation, error):
+        if generation != self.preview_generation:
+            return
+        self.preview_scan = None
+        self.show_error_message(f"无法预览文件: {self.current_file_path}\n错误信息: {error}")
+
+    def update_preview_page_label(self):
+        preview = self.preview
+        if preview.paged:
+            first, last = self.preview_pages
+            if preview.complete:
+                pages = f"共 {preview.page_count()} 页"
+            else:
+                pages = f"正在查找，已读 {preview.page_count()} 页"
+            self.preview_page_label.setText(
+                f"大文件分页预览（只读）：第 {first + 1}-{last + 1} 页，{pages}，{len(preview.starts)} 处匹配")
+        else:
+            self.preview_page_label.setText("压缩包中的文件（只读）" if self.preview_read_only else "")
+
+    def show_preview_pages(self, first, last):
+        preview = self.preview
+        if preview.paged:
+            start, text = preview.load_pages(first, last)
+        else:
+            start, text = 0, preview.content
+        self.preview_pages = (first, last)
+        self.update_preview_page_label()
+        self.preview_window = (start, start + len(text))
+        self.file_preview.setExtraSelections([])
+        self.loading_preview = True
+        try:
+            self.file_preview.setPlainText(text)
+        finally:
+            self.loading_preview = False
+        self.file_preview.moveCursor(QTextCursor.MoveOperation.Start)
+        self.update_visible_highlights()
+
+    def update_visible_highlights(self):
+        """只为可见区域内的匹配项创建高亮"""
+        if self.preview is None:
+            return
+        window_start, window_end = self.preview_window
+        viewport = self.file_preview.viewport()
+        first = self.file_preview.cursorForPosition(QPoint(0, 0)).position()
+        last = self.file_preview.cursorForPosition(QPoint(viewport.width(), viewport.height())).position()
+
+        highlight_format = QTextCharFormat()
+        highlight_format.setBackground(QColor("yellow"))
+        highlight_format.setForeground(QColor("black"))
+
+        extra_selections = []
+        starts, ends = self.preview.starts, self.preview.ends
+        for i in self.preview.matches_between(window_start + first, window_start + last + 1,
+                                              MAX_VISIBLE_HIGHLIGHTS):
+            selection = QTextEdit.ExtraSelection()
+            selection.cursor = self.file_preview.textCursor()
+            selection.cursor.setPosition(max(starts[i], window_start) - window_start)
+            selection.cursor.setPosition(min(ends[i], window_end) - window_start, QTextCursor.MoveMode.KeepAnchor)
+            selection.format = highlight_format
+            extra_selections.append(selection)
+        self.file_preview.setExtraSelections(extra_selections)
+
+    def rematch_preview(self):
+        """编辑预览内容后重新计算匹配位置"""
+        if self.preview is None or self.preview.paged:
+            return
+        content = self.file_preview.toPlainText()
+        if content == self.preview.content:
+            return
+        self.preview = PreviewText.from_string(content, self.preview_pattern)
+        # 编辑后文本的位置已经移动，不再显示段落和单元格
+        self.preview_locations = None
+        self.preview_window = (0, self.preview.length)
+        if self.current_match_index >= len(self.preview.starts):
+            self.current_match_index = len(self.preview.starts) - 1
+        self.update_visible_highlights()
+
     def go_to_match(self, index):
-        if index < 0 or index >= len(self.matches):
+        if self.preview is None or index < 0 or index >= len(self.preview.starts):
             return
 
-        start_pos, end_pos = self.matches[index]
+        start_pos, end_pos = self.preview.starts[index], self.preview.ends[index]
+        window_start, window_end = self.preview_window
+        if start_pos < window_start or end_pos > window_end:
+            self.show_preview_pages(*self.preview.window_for(start_pos, end_pos))
+            window_start, window_end = self.preview_window
         cursor = self.file_preview.textCursor()
-        cursor.setPosition(start_pos)
-        cursor.setPosition(end_pos, QTextCursor.MoveMode.KeepAnchor)
+        cursor.setPosition(start_pos - window_start)
+        cursor.setPosition(end_pos - window_start, QTextCursor.MoveMode.KeepAnchor)
         self.file_preview.setTextCursor(cursor)
         self.file_preview.ensureCursorVisible()
+        self.update_visible_highlights()
+        if self.preview_locations is not None:
+            location = self.preview_locations.describe(start_pos)
+            self.statusBar().showMessage(f"第 {index + 1}/{len(self.preview.starts)} 处匹配"
+                                         + (f"：{location}" if location else ""))
 
     def go_to_next_match(self):
-        if self.matches:
-            self.current_match_index = (self.current_match_index + 1) % len(self.matches)
+        if self.preview is not None and len(self.preview.starts):
+            self.current_match_index = (self.current_match_index + 1) % len(self.preview.starts)
             self.go_to_match(self.current_match_index)
 
+    def is_read_only_preview(self):
+        if self.preview is not None and self.preview.paged:
+            self.show_info_message("大文件预览为只读，请使用“替换所有文件匹配项”。")
+            return True
+        if self.preview is not None and self.preview_read_only:
+            self.show_info_message("压缩包中的文件为只读，不能替换。")
+            return True
+        return False
+
     def replace_current_selection(self):
+        if self.is_read_only_preview():
+            return
         cursor = self.file_preview.textCursor()
         if cursor.hasSelection():
             selected_text = cursor.selectedText()
@@ -316,12 +1083,12 @@ class TextSearchApp(QMainWindow):
             cursor.insertText(replaced_text)
 
     def replace_current_file(self):
-        if not self.matches:
+        if self.preview is None or not len(self.preview.starts) or self.is_read_only_preview():
             return
+        self.flush_autosave(wait=True)
 
         replace_term = self.replace_input.text()
         search_term = self.search_input.text()
-        encoding = self.encoding_combo.currentText()
 
         content = self.file_preview.toPlainText()
 
@@ -329,24 +1096,53 @@ class TextSearchApp(QMainWindow):
         if not pattern:
             return
 
-        # 保存原始内容以便撤销
-        original_content = content
+        if self.current_file_type != 'text':
+            self.replace_office_file(pattern, replace_term)
+            return
 
         new_content, num_subs = pattern.subn(replace_term, content)
 
         if num_subs > 0:
-            # 将操作信息压入撤销栈
-            self.undo_stack.append({
-                'type': 'replace_current_file',
-                'file_path': self.current_file_path,
-                'original_content': original_content,
-                'num_replacements': num_subs,
-                'file_type': self.current_file_type
-            })
+            # 保存原文件以便撤销
+            operation = self.undo_journal.begin('replace_current_file')
+            try:
+                operation.snapshot(self.current_file_path, num_subs)
+            except Exception as e:
+                operation.discard()
+                self.show_error_message(f"无法保存撤销信息: {self.current_file_path}\n错误信息: {e}")
+                return
+            self.undo_journal.commit(operation)
 
             self.file_preview.setPlainText(new_content)
-            self.save_file(self.current_file_path, new_content, encoding, self.current_file_type)
-            self.preview_file(self.result_list.currentItem())
+            self.save_file(self.current_file_path, new_content, self.current_file_encoding, self.current_file_type)
+            self.autosaver.mark_saved(self.current_file_path, new_content)
+            self.preview_file(self.result_view.currentIndex())
+
+    def replace_office_file(self, pattern, replace_term):
+        """只修改当前 Office 文件中有匹配的 w:t 或单元格，其余内容和格式保持不变"""
+        from textsearch.ooxml_replace import replace_office
+        file_path = self.current_file_path
+        try:
+            temp_path, num_subs = replace_office(file_path, pattern, replace_term)
+        except Exception as e:
+            self.show_error_message(f"无法替换文件: {file_path}\n错误信息: {e}")
+            return
+        if num_subs == 0:
+            self.show_info_message("匹配跨越段落或单元格，或落在数字、公式上，无法替换。")
+            return
+
+        # 保存原文件以便撤销
+        operation = self.undo_journal.begin('replace_current_file')
+        try:
+            operation.snapshot(file_path, num_subs)
+            commit_replace(file_path, temp_path)
+        except Exception as e:
+            os.remove(temp_path)
+            operation.discard()
+            self.show_error_message(f"无法保存文件: {file_path}\n错误信息: {e}")
+            return
+        self.undo_journal.commit(operation)
+        self.preview_file(self.result_view.currentIndex())
 
     def replace_all_files(self):
         search_term = self.search_input.text()
@@ -357,144 +1153,158 @@ class TextSearchApp(QMainWindow):
             self.show_error_message("请输入关键字并拖放文件夹！")
             return
 
-        file_filters = self.file_filter_input.text().split(';')
-        file_filters = [f.strip() for f in file_filters if f.strip()]
+        file_filters = parse_file_filters(self.file_filter_input.text())
 
         pattern = self.get_search_pattern(search_term)
         if not pattern:
             return
+        self.flush_autosave(wait=True)
 
-        # 存储被修改的文件信息以便撤销
-        modified_files = []
+        # 被修改的文件保存在撤销日志中
+        operation = self.undo_journal.begin('replace_all_files')
+        self.profiler = Profiler()
 
-        # 遍历文件夹中的所有文件
-        for root, dirs, files in os.walk(self.folder_path):
-            for file_name in files:
-                # 文件过滤
-                matched = False
-                for file_filter in file_filters:
-                    if fnmatch.fnmatch(file_name, file_filter):
-                        matched = True
-                        break
-                if not matched:
+        # 所有文件都先替换到同目录的临时文件（Office 文件在进程池中直接修改 XML），这里只负责改名写回
+        try:
+            for file_path, file_type, temp_path, num_subs, error in replace_tree(
+                    self.folder_path, pattern, replace_term, file_filters, encoding, self.configured_pool(),
+                    self.text_cache, self.walk_options(), self.profiler):
+                if error is not None:
+                    self.show_error_message(f"无法读取或替换文件: {file_path}\n错误信息: {error}")
                     continue
-
-                file_path = os.path.join(root, file_name)
+                # 原文件保存到撤销日志中
+                backup_path = operation.backup_path(file_path)
                 try:
-                    if file_name.endswith('.docx'):
-                        content = self.read_docx(file_path)
-                        file_type = 'docx'
-                    elif file_name.endswith('.xlsx'):
-                        content = self.read_xlsx(file_path)
-                        file_type = 'xlsx'
-                    else:
-                        with open(file_path, 'r', encoding=encoding, errors='ignore') as file:
-                            content = file.read()
-                        file_type = 'text'
-
-                    new_content, num_subs = pattern.subn(replace_term, content)
-
-                    if num_subs > 0:
-                        # 保存原始内容
-                        modified_files.append({
-                            'file_path': file_path,
-                            'original_content': content,
-                            'num_replacements': num_subs,
-                            'file_type': file_type
-                        })
-                        self.save_file(file_path, new_content, encoding, file_type)
+                    commit_replace(file_path, temp_path, backup_path)
                 except Exception as e:
-                    self.show_error_message(f"无法读取或替换文件: {file_path}\n错误信息: {e}")
-
-        if modified_files:
-            # 将操作信息压入撤销栈
-            self.undo_stack.append({
-                'type': 'replace_all_files',
-                'modified_files': modified_files
-            })
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+                    if os.path.exists(backup_path):
+                        # 已经保存的备份照样记入撤销日志，不随日志目录一起丢弃
+                        operation.add_moved(file_path, backup_path, 0)
+                    self.show_error_message(f"无法保存文件: {file_path}\n错误信息: {e}")
+                    continue
+                operation.add_moved(file_path, backup_path, num_subs)
+        except Exception as e:
+            self.show_error_message(f"替换中断: {e}")
+        finally:
+            # 中途出错时已经替换的文件也要能撤销
+            self.undo_journal.commit(operation)
+
+        self.statusBar().showMessage(self.profiler.summary())
+        if operation.records:
             self.show_info_message("替换完成！")
 
     def undo_last_operation(self):
-        if not self.undo_stack:
+        self.flush_autosave(wait=True)
+        operation = self.undo_journal.pop()
+        if operation is None:
             self.show_info_message("没有可以撤销的操作！")
             return
 
-        last_operation = self.undo_stack.pop()
-
-        encoding = self.encoding_combo.currentText()
-
-        if last_operation['type'] == 'replace_current_file':
-            file_path = last_operation['file_path']
-            original_content = last_operation['original_content']
-            num_replacements = last_operation['num_replacements']
-            file_type = last_operation['file_type']
-
-            # 还原文件内容
-            self.save_file(file_path, original_content, encoding, file_type)
-            self.show_info_message(f"已撤销对文件 {file_path} 的替换，撤销了 {num_replacements} 处替换。")
+        # 按字节还原修改前的文件
+        records = operation.records
+        errors = operation.restore()
+        for file_path, e in errors:
+            self.show_error_message(f"无法还原文件: {file_path}\n错误信息: {e}")
 
-            # 更新结果列表框
-            self.result_list.clear()
-            self.result_list.addItem(f"{file_path} - 撤销了 {num_replacements} 处替换")
+        # 在结果列表框中显示撤销信息
+        self.result_model.reset(lambda store, row: f"{store.path(row)} - 撤销了 {store.counts[row]} 处替换")
+        self.result_model.append([(record.file_path, record.num_replacements) for record in records])
 
+        if operation.type == 'replace_current_file':
+            record = records[0]
+            self.show_info_message(f"已撤销对文件 {record.file_path} 的替换，撤销了 {record.num_replacements} 处替换。")
             # 重新预览文件
-            self.preview_file(self.result_list.currentItem())
-
-        elif last_operation['type'] == 'replace_all_files':
-            modified_files = last_operation['modified_files']
-            self.result_list.clear()
-
-            for file_info in modified_files:
-                file_path = file_info['file_path']
-                original_content = file_info['original_content']
-                num_replacements = file_info['num_replacements']
-                file_type = file_info['file_type']
-
-                # 还原文件内容
-                self.save_file(file_path, original_content, encoding, file_type)
-
-                # 在结果列表框中显示撤销信息
-                self.result_list.addItem(f"{file_path} - 撤销了 {num_replacements} 处替换")
-
+            self.result_view.setCurrentIndex(self.result_model.index_of_path(record.file_path))
+            self.preview_file(self.result_view.currentIndex())
+        else:
             self.show_info_message("已撤销替换所有文件的操作。")
 
     def save_file(self, file_path, content, encoding, file_type):
         try:
-            if file_type == 'docx':
-                self.write_docx(file_path, content)
-            elif file_type == 'xlsx':
-                self.write_xlsx(file_path, content)
-            else:
-                with open(file_path, 'w', encoding=encoding, errors='ignore') as file:
-                    file.write(content)
+            write_content(file_path, content, encoding, file_type)
         except Exception as e:
             self.show_error_message(f"无法保存文件: {file_path}\n错误信息: {e}")
 
-    def write_docx(self, file_path, content):
-        # 由于文本内容已经被修改为纯文本，需要将其写回到 docx 文件中
-        doc = docx.Document()
-        for line in content.split('\n'):
-            doc.add_paragraph(line)
-        doc.save(file_path)
-
-    def write_xlsx(self, file_path, content):
-        # 由于文本内容已经被修改为纯文本，需要将其写回到 xlsx 文件中
-        wb = load_workbook(file_path)
-        sheet = wb.active
-        for idx, line in enumerate(content.split('\n')):
-            # 简单处理，只修改第一列的数据
-            sheet.cell(row=idx+1, column=1, value=line)
-        wb.save(file_path)
-
     def on_text_changed(self):
+        if self.loading_preview or (self.preview is not None and self.preview_read_only):
+            return
         # 重启定时器，每次文本改变后等待1秒再保存
         self.save_timer.start(1000)
+        self.rematch_timer.start(300)
 
     def save_current_content(self):
-        if hasattr(self, 'current_file_path'):
-            current_content = self.file_preview.toPlainText()
-            encoding = self.encoding_combo.currentText()
-            self.save_file(self.current_file_path, current_content, encoding, self.current_file_type)
+        if self.current_file_path is None or (self.preview is not None and self.preview_read_only):
+            return
+        # 只在内容变化时保存，写文件在后台线程中进行
+        self.autosaver.submit(self.current_file_path, self.file_preview.toPlainText(),
+                              self.current_file_encoding, self.current_file_type)
+
+    def flush_autosave(self, wait=False):
+        """立即保存尚未保存的编辑；wait 为 True 时等待后台保存完成后再返回"""
+        if self.save_timer.isActive():
+            self.save_timer.stop()
+            self.save_current_content()
+        if wait:
+            self.autosaver.wait()
+
+    def on_autosaved(self, file_path, elapsed, error):
+        if error is not None:
+            self.show_error_message(f"无法保存文件: {file_path}\n错误信息: {error}")
+            return
+        self.save_status_label.setText(f"已保存 {os.path.basename(file_path)}：{self.autosaver.stats.summary()}")
+
+    def show_profile_report(self):
+        """显示最慢的文件和按格式的耗时，可以导出为 JSON 或 Chrome trace"""
+        if self.profiler is None:
+            self.show_info_message("还没有查找或替换过文件！")
+            return
+        profiler = self.profiler
+        dialog = QDialog(self)
+        dialog.setWindowTitle("性能分析")
+        dialog.resize(800, 500)
+
+        report = QTextEdit()
+        report.setReadOnly(True)
+        report.setLineWrapMode(QTextEdit.LineWrapMode.NoWrap)
+        report.setPlainText(profiler.report(SLOWEST_FILES))
+
+        json_button = QPushButton("导出 JSON")
+        json_button.clicked.connect(lambda: self.export_profile(profiler, 'json'))
+        trace_button = QPushButton("导出 Chrome trace")
+        trace_button.clicked.connect(lambda: self.export_profile(profiler, 'chrome'))
+
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(json_button)
+        button_layout.addWidget(trace_button)
+        layout = QVBoxLayout()
+        layout.addWidget(report)
+        layout.addLayout(button_layout)
+        dialog.setLayout(layout)
+        dialog.exec()
+
+    def export_profile(self, profiler, fmt):
+        # Chrome trace 可以在 chrome://tracing 或 Perfetto 中打开
+        name = 'textsearch-trace.json' if fmt == 'chrome' else 'textsearch-profile.json'
+        path, _ = QFileDialog.getSaveFileName(self, "导出计时", name, "JSON 文件 (*.json)")
+        if not path:
+            return
+        try:
+            profiler.export(path, fmt)
+        except Exception as e:
+            self.show_error_message(f"无法导出计时: {path}\n错误信息: {e}")
+
+    def closeEvent(self, event):
+        self.flush_autosave(wait=True)
+        self.cancel_search()
+        self.cancel_preview_scan()
+        self.extract_pool.shutdown()
+        self.text_cache.close()
+        self.undo_journal.close()
+        if self.search_index is not None:
+            self.search_index.close()
+        super().closeEvent(event)
 
     def show_error_message(self, message):
         msg_box = QMessageBox(self)
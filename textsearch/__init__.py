@@ -0,0 +1 @@
+"""与界面无关的查找引擎，供 main.py 中的 TextSearchApp 和命令行（python -m textsearch）调用"""
@@ -0,0 +1,7 @@
+"""python -m textsearch：命令行查找和替换"""
+import sys
+
+from .cli import main
+
+if __name__ == '__main__':
+    sys.exit(main())
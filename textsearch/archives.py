@@ -0,0 +1,271 @@
+"""不解压到磁盘，直接查找 .zip、.tar（含 .tar.gz 等）和 .gz 压缩包中的文件
+
+压缩包中的文件使用虚拟路径，例如 archive.zip!/dir/file.docx，嵌套的压缩包继续用 !/ 连接。
+查找时按压缩包中的顺序逐个读取成员，.tar 以流的方式读取，不需要先读完整个压缩包；
+成员文件使用与文件夹中的文件相同的过滤规则和提取器。
+.docx/.xlsx 和嵌套的 .zip 需要随机访问，先读入内存中的临时文件，超过 SPOOL_SIZE 时才写到磁盘。
+"""
+import io
+import os
+import gzip
+import time
+import shutil
+import tarfile
+import zipfile
+import tempfile
+from contextlib import ExitStack, contextmanager
+
+from .extractors import ARCHIVE_SEP, READ_CHUNK_SIZE, file_type_of, is_cancelled, iter_office_text
+from .sniff import AUTO_ENCODING, SNIFF_SIZE, _FALLBACK, sniff_bytes
+from .streaming import IterReader, count_office_matches, count_text_matches
+
+# 需要随机访问的成员在内存中最多保存的字节数
+SPOOL_SIZE = 32 * 1024 * 1024
+
+_TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+
+def archive_kind(file_path):
+    """根据扩展名返回 'zip'、'tar'、'gzip'，不是压缩包时返回 None"""
+    name = file_path.lower()
+    if name.endswith('.zip'):
+        return 'zip'
+    if name.endswith(_TAR_SUFFIXES):
+        return 'tar'
+    if name.endswith('.gz'):
+        return 'gzip'
+    return None
+
+
+def is_virtual(file_path):
+    """是否为压缩包中的文件"""
+    return ARCHIVE_SEP in file_path
+
+
+class MemberFilter:
+    """压缩包中的文件使用的过滤规则：include 为编译好的文件过滤规则，options 为 WalkOptions"""
+
+    def __init__(self, include, options):
+        self.include = include
+        self.options = options
+
+    @property
+    def depth(self):
+        return self.options.archive_depth
+
+    def is_excluded(self, name):
+        parts = name.split('/')
+        return any(self.options.is_excluded(part, '/'.join(parts[:i + 1])) for i, part in enumerate(parts) if part)
+
+    def accepts(self, name, size):
+        if self.is_excluded(name):
+            return False
+        if not self.include.match(os.path.normcase(name.rsplit('/', 1)[-1])):
+            return False
+        max_size = self.options.max_file_size
+        return max_size is None or size is None or size <= max_size
+
+
+def _gzip_member_name(file_path):
+    name = os.path.basename(file_path.rsplit(ARCHIVE_SEP, 1)[-1])
+    return name[:-3] if name.lower().endswith('.gz') else name
+
+
+def _open_tar(source):
+    # 流模式只向前读取，不需要随机访问，也不会先扫描整个压缩包
+    if isinstance(source, str):
+        return tarfile.open(source, 'r|*')
+    return tarfile.open(fileobj=source, mode='r|*')
+
+
+def _iter_entries(source, kind, file_path):
+    """依次返回压缩包中文件的 (成员名, 大小, 打开函数)；大小未知时为 None，打开的流只在下一次迭代之前有效"""
+    if kind == 'zip':
+        with zipfile.ZipFile(source) as zf:
+            for info in zf.infolist():
+                if not info.is_dir():
+                    yield info.filename, info.file_size, lambda info=info: zf.open(info)
+    elif kind == 'tar':
+        with _open_tar(source) as tf:
+            for info in tf:
+                if info.isfile():
+                    yield info.name, info.size, lambda info=info: tf.extractfile(info)
+    else:
+        with gzip.open(source) as stream:
+            yield _gzip_member_name(file_path), None, lambda: stream
+
+
+@contextmanager
+def _spooled(stream):
+    """把流复制到可以随机访问的临时文件中"""
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as file:
+        shutil.copyfileobj(stream, file, READ_CHUNK_SIZE)
+        file.seek(0)
+        yield file
+
+
+def iter_archive(archive_path, members, cancel_event=None):
+    """依次返回压缩包中符合过滤规则的文件 (虚拟路径, 大小, 二进制流, error)
+
+    嵌套的压缩包最多进入 members.depth 层。流只在下一次迭代之前有效；
+    读取失败时流为 None，error 为异常，整个压缩包无法读取时虚拟路径为压缩包本身的路径。
+    """
+    yield from _walk(archive_path, archive_path, members.depth, members, cancel_event)
+
+
+def _walk(source, file_path, depth, members, cancel_event):
+    try:
+        for name, size, open_entry in _iter_entries(source, archive_kind(file_path), file_path):
+            if is_cancelled(cancel_event):
+                return
+            member_path = file_path + ARCHIVE_SEP + name
+            nested = depth > 1 and archive_kind(name) is not None
+            if nested:
+                if members.is_excluded(name):
+                    continue
+            elif not members.accepts(name, size):
+                continue
+            try:
+                with open_entry() as stream:
+                    if not nested:
+                        yield member_path, size, stream, None
+                    elif archive_kind(name) == 'zip':
+                        with _spooled(stream) as file:
+                            yield from _walk(file, member_path, depth - 1, members, cancel_event)
+                    else:
+                        yield from _walk(stream, member_path, depth - 1, members, cancel_event)
+            except Exception as e:
+                yield member_path, size, None, e
+    except Exception as e:
+        yield file_path, 0, None, e
+
+
+@contextmanager
+def _open_entry(source, kind, file_path, name):
+    if kind == 'zip':
+        with zipfile.ZipFile(source) as zf, zf.open(name) as stream:
+            yield stream
+    elif kind == 'tar':
+        with _open_tar(source) as tf:
+            for info in tf:
+                if info.name == name and info.isfile():
+                    with tf.extractfile(info) as stream:
+                        yield stream
+                    return
+        raise FileNotFoundError(f"压缩包中没有文件: {name}")
+    else:
+        with gzip.open(source) as stream:
+            yield stream
+
+
+@contextmanager
+def open_member(virtual_path):
+    """打开压缩包中的文件，返回只读的二进制流"""
+    parts = virtual_path.split(ARCHIVE_SEP)
+    with ExitStack() as stack:
+        file_path = source = parts[0]
+        for name in parts[1:]:
+            kind = archive_kind(file_path)
+            if kind is None:
+                raise FileNotFoundError(f"不是压缩包: {file_path}")
+            if kind == 'zip' and not isinstance(source, str):
+                source = stack.enter_context(_spooled(source))
+            source = stack.enter_context(_open_entry(source, kind, file_path, name))
+            file_path += ARCHIVE_SEP + name
+        yield source
+
+
+class _HeadReader(io.RawIOBase):
+    """先返回已经读出的开头几 KB，再继续读取原来的流"""
+
+    def __init__(self, head, stream):
+        self.head = head
+        self.stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.head:
+            data, self.head = self.head[:len(buffer)], self.head[len(buffer):]
+        else:
+            data = self.stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def open_text(stream, encoding):
+    """把二进制流包装成文本流，返回 (text_file, binary)
+
+    与文件夹中的文件一样先读取开头几 KB 判断二进制文件，encoding 为 AUTO_ENCODING 时使用检测到的编码。
+    """
+    head = stream.read(SNIFF_SIZE + 1)
+    detected = sniff_bytes(head[:SNIFF_SIZE], len(head) <= SNIFF_SIZE)
+    if encoding == AUTO_ENCODING:
+        encoding = detected or _FALLBACK
+    text = io.TextIOWrapper(io.BufferedReader(_HeadReader(head, stream)), encoding=encoding, errors='ignore')
+    return text, detected is None
+
+
+@contextmanager
+def open_member_file(virtual_path):
+    """打开压缩包中的文件，返回可以随机访问的二进制文件对象，供解析 .docx/.xlsx"""
+    with open_member(virtual_path) as stream, _spooled(stream) as file:
+        yield file
+
+
+@contextmanager
+def open_member_source(virtual_path, encoding, cancel_event=None):
+    """打开压缩包中的文件，返回有 read(size) 的文本来源；Office 文件边解析边返回"""
+    if file_type_of(virtual_path) == 'text':
+        with open_member(virtual_path) as stream:
+            text, _ = open_text(stream, encoding)
+            yield text
+        return
+    with open_member_file(virtual_path) as file:
+        pieces = iter_office_text(virtual_path, cancel_event, file)
+        try:
+            yield IterReader(pieces)
+        finally:
+            pieces.close()
+
+
+def read_member(virtual_path, encoding, cancel_event=None):
+    """读取压缩包中文件的全部文本"""
+    parts = []
+    with open_member_source(virtual_path, encoding, cancel_event) as source:
+        while not is_cancelled(cancel_event):
+            chunk = source.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            parts.append(chunk)
+    return ''.join(parts)
+
+
+def count_member(virtual_path, stream, pattern, encoding, cancel_event=None, timings=None, limit=None):
+    """统计 iter_archive 返回的一个文件中的匹配数，二进制文件返回 0"""
+    if file_type_of(virtual_path) == 'text':
+        text, binary = open_text(stream, encoding)
+        if binary:
+            return 0
+        return count_text_matches(text, pattern, cancel_event, timings, limit)
+    started = time.perf_counter()
+    with _spooled(stream) as file:
+        if timings is not None:
+            timings['read'] = timings.get('read', 0.0) + time.perf_counter() - started
+        return count_office_matches(virtual_path, pattern, cancel_event, timings, limit, file)
+
+
+def count_archive(archive_path, pattern, encoding, members, cancel_event=None, limit=None):
+    """逐个统计压缩包中文件的匹配数，依次返回 (虚拟路径, count, size, error, timings)，与 count_chunk 相同"""
+    for virtual_path, size, stream, error in iter_archive(archive_path, members, cancel_event):
+        timings = {'start': time.time(), 'pid': os.getpid()}
+        if error is None:
+            try:
+                count = count_member(virtual_path, stream, pattern, encoding, cancel_event, timings, limit)
+            except Exception as e:
+                error = e
+        if error is not None:
+            yield virtual_path, 0, size or 0, error, timings
+        else:
+            yield virtual_path, count, size or 0, None, timings
@@ -0,0 +1,114 @@
+"""编辑内容的后台自动保存
+
+用内容的哈希记录每个文件最近一次保存（或已排队保存）的版本，内容没有变化时不写文件。
+保存在后台线程中进行，同一时间只有一次保存；排队中的同一文件只保留最新的内容。
+"""
+import time
+import hashlib
+import threading
+
+
+def content_hash(content):
+    return hashlib.blake2b(content.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+def write_content(file_path, content, encoding, file_type):
+    """把编辑后的纯文本写回文件
+
+    .docx/.xlsx 与文件当前的文本比较，只修改有变化的 w:t 或单元格，其余内容和格式保持不变。
+    """
+    if file_type in ('docx', 'xlsx'):
+        from .ooxml_replace import write_office_text
+        write_office_text(file_path, content)
+    else:
+        with open(file_path, 'w', encoding=encoding, errors='ignore') as file:
+            file.write(content)
+
+
+class SaveStats:
+    """自动保存的次数和耗时"""
+
+    def __init__(self):
+        self.saves = 0
+        self.skipped = 0
+        self.total_seconds = 0.0
+        self.last_seconds = 0.0
+
+    def record(self, elapsed):
+        self.saves += 1
+        self.total_seconds += elapsed
+        self.last_seconds = elapsed
+
+    def summary(self):
+        average = self.total_seconds / self.saves if self.saves else 0.0
+        return (f"自动保存 {self.saves} 次（内容未变跳过 {self.skipped} 次），"
+                f"本次 {self.last_seconds * 1000:.0f} ms，平均 {average * 1000:.0f} ms")
+
+
+class AutoSaver:
+    """后台保存编辑内容
+
+    on_saved(file_path, elapsed, error) 在后台线程中调用，error 为 None 表示保存成功。
+    """
+
+    def __init__(self, on_saved=None):
+        self.on_saved = on_saved
+        self.stats = SaveStats()
+        # path -> 最近一次已保存或已排队保存的内容哈希
+        self.hashes = {}
+        # path -> (content, encoding, file_type, digest)，按提交顺序保存
+        self.pending = {}
+        self.busy = False
+        self.condition = threading.Condition()
+
+    def mark_saved(self, file_path, content):
+        """记录文件当前的内容，例如刚从磁盘读出或刚由其他操作写入"""
+        with self.condition:
+            self.hashes[file_path] = content_hash(content)
+            self.pending.pop(file_path, None)
+
+    def submit(self, file_path, content, encoding, file_type):
+        """内容有变化时排队保存，返回是否需要保存"""
+        digest = content_hash(content)
+        with self.condition:
+            if self.hashes.get(file_path) == digest:
+                self.stats.skipped += 1
+                return False
+            self.hashes[file_path] = digest
+            self.pending[file_path] = (content, encoding, file_type, digest)
+            if not self.busy:
+                self.busy = True
+                threading.Thread(target=self._run, daemon=True).start()
+        return True
+
+    def _run(self):
+        while True:
+            with self.condition:
+                if not self.pending:
+                    self.busy = False
+                    self.condition.notify_all()
+                    return
+                file_path = next(iter(self.pending))
+                content, encoding, file_type, digest = self.pending.pop(file_path)
+            started = time.perf_counter()
+            error = None
+            try:
+                write_content(file_path, content, encoding, file_type)
+            except Exception as e:
+                error = e
+                with self.condition:
+                    # 保存失败，下次编辑时重新保存
+                    if self.hashes.get(file_path) == digest:
+                        del self.hashes[file_path]
+            elapsed = time.perf_counter() - started
+            if error is None:
+                with self.condition:
+                    self.stats.record(elapsed)
+            if self.on_saved is not None:
+                self.on_saved(file_path, elapsed, error)
+
+    def wait(self):
+        """等待排队的保存全部完成"""
+        with self.condition:
+            while self.busy:
+                self.condition.wait()
@@ -0,0 +1,199 @@
+"""Office 文件提取文本的磁盘缓存
+
+以 (路径, 大小, mtime_ns) 为键，把 zlib 压缩后的文本存进用户缓存目录下的 SQLite 文件，
+文件未改动时不必再调用 docx.Document 或 load_workbook。提取时顺带记录的段落、单元格位置
+（locations.OffsetMap）与文本存在同一行中。超过容量上限时按最近使用时间淘汰；
+总大小记在 totals 表中，随写入和淘汰在同一个事务中更新，写入时不必每次都汇总整个表。
+缓存只是加速手段：缓存目录不可写、数据库损坏或被锁、磁盘已满时记录一次警告，之后读取都当作未命中，写入直接跳过。
+"""
+import os
+import sys
+import time
+import zlib
+import logging
+import sqlite3
+import threading
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# 淘汰时一直删到容量上限的这个比例，避免每次写入都触发淘汰
+EVICT_TO_RATIO = 0.9
+
+
+def default_cache_dir():
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser(r'~\AppData\Local')
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'textsearch')
+
+
+def default_cache_path():
+    return os.path.join(default_cache_dir(), 'extracted_text.sqlite3')
+
+
+def cache_key(file_path):
+    """返回 (规范化路径, 大小, mtime_ns)"""
+    st = os.stat(file_path)
+    return os.path.normcase(os.path.abspath(file_path)), st.st_size, st.st_mtime_ns
+
+
+class TextCache:
+    """可在多个线程和多个进程中共用的提取文本缓存"""
+
+    def __init__(self, db_path=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.db_path = db_path or default_cache_path()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # 缓存无法使用的原因，不为 None 时不再访问数据库
+        self.error = None
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _disable(self, error):
+        """记录一次警告并停用缓存"""
+        with self._lock:
+            if self.error is None:
+                self.error = error
+                logging.getLogger(__name__).warning("文本缓存不可用，不再使用: %s: %s", self.db_path, error)
+            if self._conn is not None:
+                try:
+                    self._conn.close()
+                except sqlite3.Error:
+                    pass
+                self._conn = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+            # 界面线程和查找线程共用一个连接，由 _lock 串行化；多个进程之间靠 WAL 和忙等待
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS entries ('
+                         'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, '
+                         'data BLOB, stored_size INTEGER, last_used REAL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)')
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(entries)')}
+            if 'locations' not in columns:
+                # 旧版本创建的缓存没有位置这一列
+                conn.execute('ALTER TABLE entries ADD COLUMN locations BLOB')
+            conn.execute('CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), stored_size INTEGER)')
+            # 旧版本创建的缓存没有 totals 表，只在第一次打开时汇总一次
+            conn.execute('INSERT OR IGNORE INTO totals SELECT 0, COALESCE(SUM(stored_size), 0) FROM entries')
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, file_path):
+        """返回缓存的文本；文件已改动或不在缓存中时返回 None"""
+        entry = self.get_entry(file_path)
+        return entry[0] if entry is not None else None
+
+    def get_entry(self, file_path):
+        """返回 (文本, OffsetMap.to_bytes() 的结果或 None)；文件已改动、不在缓存中或缓存不可用时返回 None"""
+        if self.error is not None:
+            return None
+        try:
+            path, size, mtime_ns = cache_key(file_path)
+        except OSError:
+            return None
+        try:
+            with self._lock:
+                row = self.conn.execute('SELECT data, locations FROM entries '
+                                        'WHERE path = ? AND size = ? AND mtime_ns = ?',
+                                        (path, size, mtime_ns)).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                self.hits += 1
+                with self.conn:
+                    self.conn.execute('UPDATE entries SET last_used = ? WHERE path = ?', (time.time(), path))
+        except (sqlite3.Error, OSError) as e:
+            self._disable(e)
+            return None
+        try:
+            return zlib.decompress(row[0]).decode('utf-8', errors='surrogatepass'), row[1]
+        except zlib.error:
+            # 单个条目损坏时当作未命中，重新提取后会覆盖它
+            return None
+
+    def put(self, file_path, text, key=None, locations=None):
+        """保存文本；key 应为读取文件之前取得的 cache_key，防止读取期间文件被改动
+
+        locations 为 OffsetMap.to_bytes() 的结果，没有时为 None。缓存不可用时什么也不做。
+        """
+        if self.error is not None:
+            return
+        if key is None:
+            try:
+                key = cache_key(file_path)
+            except OSError:
+                return
+        path, size, mtime_ns = key
+        data = zlib.compress(text.encode('utf-8', errors='surrogatepass'))
+        stored_size = len(data) + (len(locations) if locations is not None else 0)
+        try:
+            self._put(path, size, mtime_ns, data, stored_size, locations)
+        except (sqlite3.Error, OSError) as e:
+            self._disable(e)
+
+    def _put(self, path, size, mtime_ns, data, stored_size, locations):
+        with self._lock, self.conn:
+            # 立即加写锁，替换掉的旧条目大小和总大小在多个进程之间保持一致
+            self.conn.execute('BEGIN IMMEDIATE')
+            old = self.conn.execute('SELECT stored_size FROM entries WHERE path = ?', (path,)).fetchone()
+            self.conn.execute('INSERT OR REPLACE INTO entries (path, size, mtime_ns, data, stored_size, last_used, '
+                              'locations) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                              (path, size, mtime_ns, data, stored_size, time.time(), locations))
+            self.conn.execute('UPDATE totals SET stored_size = stored_size + ?',
+                              (stored_size - (old[0] if old is not None else 0),))
+            self._evict()
+
+    def _evict(self):
+        total = self.conn.execute('SELECT stored_size FROM totals').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * EVICT_TO_RATIO
+        stale = []
+        for path, stored_size in self.conn.execute('SELECT path, stored_size FROM entries ORDER BY last_used'):
+            if total <= target:
+                break
+            stale.append((path,))
+            total -= stored_size
+        self.conn.executemany('DELETE FROM entries WHERE path = ?', stale)
+        self.conn.execute('UPDATE totals SET stored_size = ?', (total,))
+
+    def clear(self):
+        if self.error is None:
+            try:
+                with self._lock, self.conn:
+                    self.conn.execute('DELETE FROM entries')
+                    self.conn.execute('UPDATE totals SET stored_size = 0')
+            except (sqlite3.Error, OSError) as e:
+                self._disable(e)
+        self.hits = 0
+        self.misses = 0
+
+    def summary(self):
+        if self.error is not None:
+            return f"文本缓存不可用（{self.error}）"
+        return f"文本缓存命中 {self.hits} 次，未命中 {self.misses} 次"
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def __getstate__(self):
+        # 传给子进程时只带上路径、容量和是否已经停用，子进程自己打开连接
+        return {'db_path': self.db_path, 'max_bytes': self.max_bytes,
+                'error': str(self.error) if self.error is not None else None}
+
+    def __setstate__(self, state):
+        self.__init__(state['db_path'], state['max_bytes'])
+        self.error = state.get('error')
@@ -0,0 +1,187 @@
+"""命令行查找和替换，不依赖界面库：python -m textsearch 文件夹 关键字 [选项]
+
+每个文件输出一行 JSON。查找时为 {"path", "count", "offsets"}，offsets 为 [[起始, 结束], ...]，
+是提取出的文本中的字符位置；.docx/.xlsx 另有 "locations"，为每个匹配所在的段落和文本块或单元格，
+例如 "第 3 段第 2 个文本块"、"Sheet1!B7"，落在段落或单元格之间的匹配为空字符串。
+多关键字查找时另有 "terms": {关键字: 匹配数}，
+count 达到 --mode 的上限（文件中可能还有更多匹配）时另有 "capped": true；
+替换时为 {"path", "replacements"}；出错的文件为 {"path", "error"}。
+统计信息输出到标准错误。有匹配时退出码为 0，没有匹配为 1，参数错误为 2。
+"""
+import re
+import sys
+import json
+import argparse
+
+from .engine import (SearchStats, MatchOptions, MATCH_COUNT, MATCH_MODES, compile_pattern, parse_file_filters,
+                     search_tree, replace_tree, match_offsets)
+from .extractors import file_type_of
+from .locations import OffsetMap
+from .multiterm import MultiPattern, TermCounts, load_terms, parse_terms
+from .parallel import ExtractPool, default_workers
+from .profiling import Profiler
+from .sniff import AUTO_ENCODING
+from .streaming import commit_replace
+from .walker import WalkOptions, DEFAULT_EXCLUDES
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m textsearch', description='在文件夹中查找或替换文本（.txt、.docx、.xlsx 等）')
+    parser.add_argument('folder', help='要查找的文件夹')
+    parser.add_argument('pattern', nargs='?', help='要查找的关键字；使用 --terms-file 时可以省略')
+    parser.add_argument('-e', '--regex', action='store_true', help='把关键字作为正则表达式')
+    parser.add_argument('-m', '--multi', action='store_true', help='多个关键字，用分号分隔，按字面一次扫描同时查找')
+    parser.add_argument('--terms-file', metavar='PATH', help='从文件加载多个关键字，每行一个（可与 --multi 的关键字合并）')
+    parser.add_argument('-f', '--filter', default='*.txt;*.docx', help='文件过滤，分号分隔，支持通配符（默认 %(default)s）')
+    parser.add_argument('--encoding', default=AUTO_ENCODING, help='纯文本文件的编码，auto 为按文件检测（默认 %(default)s）')
+    parser.add_argument('-r', '--replace', metavar='TEXT', help='把匹配项替换为 TEXT')
+    parser.add_argument('-n', '--dry-run', action='store_true', help='与 --replace 一起使用：只统计替换数，不修改文件')
+    parser.add_argument('--no-offsets', action='store_true', help='只输出匹配数，不再读取文件计算匹配位置')
+    parser.add_argument('--mode', choices=MATCH_MODES, default=MATCH_COUNT,
+                        help='count 统计所有匹配，exists 每个文件找到第一个匹配即停止，'
+                             'top 每个文件最多统计 --max-per-file 个匹配（默认 %(default)s）')
+    parser.add_argument('--max-per-file', type=int, default=10, help='--mode top 时每个文件最多统计的匹配数（默认 %(default)s）')
+    parser.add_argument('--max-results', type=int, default=0, help='列出这么多个有匹配的文件后结束，0 表示不限')
+    parser.add_argument('--exclude', default=';'.join(DEFAULT_EXCLUDES), help='排除的文件或目录，分号分隔（默认 %(default)s）')
+    parser.add_argument('--max-depth', type=int, default=0, help='最大深度，1 表示只查找文件夹本身，0 表示不限')
+    parser.add_argument('--max-size', type=int, default=0, help='跳过大于这么多 MB 的文件，0 表示不限')
+    parser.add_argument('--follow-symlinks', action='store_true', help='进入指向目录的符号链接')
+    parser.add_argument('--archive-depth', type=int, default=0,
+                        help='查找 .zip/.tar/.gz 压缩包中的文件，最多进入这么多层嵌套的压缩包，0 表示不查找（只用于查找）')
+    parser.add_argument('--workers', type=int, default=default_workers(), help='解析 Office 文件的进程数（默认 %(default)s）')
+    parser.add_argument('--cache', action='store_true', help='使用与界面共用的 Office 文本磁盘缓存')
+    parser.add_argument('--index', action='store_true', help='使用与界面共用的三元组索引')
+    parser.add_argument('--profile', metavar='PATH', help='把每个文件各阶段的耗时写到 PATH，并在标准错误中输出汇总')
+    parser.add_argument('--profile-format', choices=('json', 'chrome'), default='json',
+                        help='--profile 的格式：json 或 Chrome trace（默认 %(default)s）')
+    return parser
+
+
+def walk_options(args):
+    return WalkOptions(parse_file_filters(args.exclude),
+                       args.max_depth - 1 if args.max_depth > 0 else None,
+                       args.max_size * 1024 * 1024 if args.max_size > 0 else None,
+                       args.follow_symlinks, max(args.archive_depth, 0))
+
+
+def emit(record):
+    print(json.dumps(record, ensure_ascii=False), flush=True)
+
+
+def run_search(args, pattern, file_filters, pool, cache, index, profiler=None):
+    stats = SearchStats()
+    found = False
+    term_totals = {}
+    match_options = MatchOptions(args.mode, args.max_per_file, args.max_results or None)
+    for file_path, count, error in search_tree(args.folder, pattern, file_filters, args.encoding, stats=stats,
+                                               pool=pool, cache=cache, index=index,
+                                               walk_options=walk_options(args), profiler=profiler,
+                                               match_options=match_options):
+        if error is not None:
+            emit({'path': file_path, 'error': str(error)})
+            continue
+        if not count:
+            continue
+        found = True
+        record = {'path': file_path, 'count': count}
+        if match_options.is_capped(count):
+            record['capped'] = True
+        if isinstance(count, TermCounts):
+            record['terms'] = count.counts
+            for term, n in count.counts.items():
+                term_totals[term] = term_totals.get(term, 0) + n
+        if not args.no_offsets:
+            try:
+                file_type = file_type_of(file_path)
+                offset_map = OffsetMap(file_type) if file_type != 'text' else None
+                starts, ends = match_offsets(file_path, pattern, args.encoding, cache=cache,
+                                             limit=match_options.file_limit(), offset_map=offset_map)
+                record['offsets'] = [[s, e] for s, e in zip(starts, ends)]
+                if offset_map is not None:
+                    record['locations'] = [offset_map.describe(start) for start in starts]
+            except Exception as e:
+                record['error'] = str(e)
+        emit(record)
+    print(stats.summary(), file=sys.stderr)
+    if term_totals:
+        print(f"各关键字的匹配数：{TermCounts(term_totals).summary(limit=len(term_totals))}", file=sys.stderr)
+    return found
+
+
+def run_replace(args, pattern, file_filters, pool, cache, profiler=None):
+    files = total = 0
+    for file_path, _, temp_path, num_subs, error in replace_tree(args.folder, pattern, args.replace, file_filters,
+                                                                 args.encoding, pool, cache, walk_options(args),
+                                                                 profiler, args.dry_run):
+        if error is not None:
+            emit({'path': file_path, 'error': str(error)})
+            continue
+        if not args.dry_run:
+            try:
+                commit_replace(file_path, temp_path)
+            except Exception as e:
+                emit({'path': file_path, 'error': str(e)})
+                continue
+        files += 1
+        total += num_subs
+        record = {'path': file_path, 'replacements': num_subs}
+        if args.dry_run:
+            record['dry_run'] = True
+        emit(record)
+    action = '将替换' if args.dry_run else '已替换'
+    print(f"{action} {files} 个文件中的 {total} 处匹配", file=sys.stderr)
+    return files > 0
+
+
+def build_pattern(args):
+    if not (args.multi or args.terms_file):
+        return compile_pattern(args.pattern, args.regex)
+    terms = parse_terms(args.pattern) if args.pattern else []
+    if args.terms_file:
+        terms += load_terms(args.terms_file)
+    return MultiPattern(terms)
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_intermixed_args(argv)
+    if args.pattern is None and not args.terms_file:
+        parser.error('需要关键字或 --terms-file')
+    if args.max_per_file < 1:
+        parser.error('--max-per-file 至少为 1')
+    try:
+        pattern = build_pattern(args)
+    except re.error as e:
+        print(f"无效的正则表达式: {e}", file=sys.stderr)
+        return 2
+    except (OSError, ValueError) as e:
+        print(f"无法加载关键字: {e}", file=sys.stderr)
+        return 2
+    file_filters = parse_file_filters(args.filter)
+
+    # 进程池在遇到 Office 文件时才启动
+    pool = ExtractPool(args.workers) if args.workers > 0 else None
+    cache = index = None
+    profiler = Profiler() if args.profile else None
+    if args.cache:
+        from .cache import TextCache
+        cache = TextCache()
+    if args.index and args.replace is None:
+        from .index import TrigramIndex
+        index = TrigramIndex(args.folder)
+    try:
+        if args.replace is not None:
+            found = run_replace(args, pattern, file_filters, pool, cache, profiler)
+        else:
+            found = run_search(args, pattern, file_filters, pool, cache, index, profiler)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        if cache is not None:
+            cache.close()
+        if index is not None:
+            index.close()
+    if profiler is not None:
+        profiler.export(args.profile, args.profile_format)
+        print(profiler.summary(), file=sys.stderr)
+    return 0 if found else 1
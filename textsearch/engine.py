@@ -0,0 +1,398 @@
+"""文件遍历、读取和匹配，可在后台线程中运行并随时取消"""
+import os
+import re
+import time
+from contextlib import nullcontext
+
+from .archives import MemberFilter, archive_kind, count_archive, is_virtual, open_member_source
+from .extractors import read_file, file_type_of, is_cancelled, iter_office_text
+from .locations import cached_text_map, load_text_map, open_located_text
+from .sniff import file_encoding, sniff
+from .multiterm import match_counter
+from .parallel import count_chunk, count_chunk_failed, replace_chunk, replace_chunk_failed
+from .streaming import IterReader, count_office_matches, count_stream_matches, stream_replace
+from .walker import compile_globs, walk_files
+from .preview import PreviewText, find_match_offsets, find_stream_offsets
+
+# 每统计这么多个匹配项检查一次取消标志
+CANCEL_CHECK_INTERVAL = 1024
+
+# 匹配方式：统计全部匹配、找到第一个匹配即停止、每个文件最多统计前 N 个匹配
+MATCH_COUNT = 'count'
+MATCH_EXISTS = 'exists'
+MATCH_TOP = 'top'
+MATCH_MODES = (MATCH_COUNT, MATCH_EXISTS, MATCH_TOP)
+
+
+class MatchOptions:
+    """匹配方式；max_results 为最多列出的有匹配的文件数，None 表示不限"""
+
+    def __init__(self, mode=MATCH_COUNT, max_per_file=None, max_results=None):
+        self.mode = mode
+        self.max_per_file = max_per_file
+        self.max_results = max_results
+
+    def file_limit(self):
+        """每个文件最多统计的匹配数，None 表示全部统计"""
+        if self.mode == MATCH_EXISTS:
+            return 1
+        if self.mode == MATCH_TOP:
+            return self.max_per_file
+        return None
+
+    def is_capped(self, count):
+        """count 是否已经达到上限（文件中可能还有更多匹配）"""
+        limit = self.file_limit()
+        return limit is not None and count >= limit
+
+
+class SearchStats:
+    """查找进度：已扫描文件数、已读取字节数和速度"""
+
+    def __init__(self):
+        self.files_scanned = 0
+        self.bytes_read = 0
+        self.files_matched = 0
+        self.files_reused = 0
+        self.files_binary = 0
+        # 有匹配的文件数达到 MatchOptions.max_results 后提前结束
+        self.results_capped = False
+        self.started_at = time.monotonic()
+
+    def elapsed(self):
+        return time.monotonic() - self.started_at
+
+    def files_per_second(self):
+        elapsed = self.elapsed()
+        return self.files_scanned / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        reused = f"（另有 {self.files_reused} 个未改动文件沿用上次结果）" if self.files_reused else ""
+        binary = f"跳过 {self.files_binary} 个二进制文件，" if self.files_binary else ""
+        capped = "，结果数已达上限，提前结束" if self.results_capped else ""
+        return (f"已扫描 {self.files_scanned} 个文件{reused}，{binary}"
+                f"读取 {self.bytes_read / (1024 * 1024):.1f} MB，"
+                f"{self.files_per_second():.0f} 个文件/秒{capped}")
+
+
+def compile_pattern(text, use_regex=False):
+    """把关键字编译成正则；不使用正则表达式时按字面匹配。无效的正则抛出 re.error"""
+    return re.compile(text if use_regex else re.escape(text))
+
+
+def parse_file_filters(text):
+    """把分号分隔的过滤规则拆成列表"""
+    return [f.strip() for f in text.split(';') if f.strip()]
+
+
+def iter_files(folder_path, file_filters, cancel_event=None, walk_options=None):
+    """遍历文件夹，返回符合过滤规则的文件路径"""
+    return walk_files(folder_path, file_filters, cancel_event, walk_options)
+
+
+def count_matches(pattern, content, cancel_event=None, limit=None):
+    """统计匹配数量，不保留 Match 对象，数到 limit 个时停止；多关键字时返回 TermCounts"""
+    counter = match_counter(pattern)
+    for match in pattern.finditer(content):
+        counter.add(match)
+        if counter.total == limit:
+            break
+        if counter.total % CANCEL_CHECK_INTERVAL == 0 and is_cancelled(cancel_event):
+            break
+    return counter.result()
+
+
+def match_offsets(file_path, pattern, encoding, cancel_event=None, cache=None, limit=None, offset_map=None):
+    """返回文件中匹配的 (starts, ends)，为提取出的文本中的字符位置；给出 limit 时只返回前 limit 个
+
+    给出空的 locations.OffsetMap 时，Office 文件在同一遍解析中把各段的位置记入其中。
+    """
+    if offset_map is not None and file_type_of(file_path) != 'text':
+        if limit is None:
+            text_map = load_text_map(file_path, cancel_event, cache)
+        else:
+            text_map = cached_text_map(file_path, cache)
+        if text_map is not None:
+            content, cached_map = text_map
+            offset_map.copy_from(cached_map)
+            return find_match_offsets(pattern, content, cancel_event, limit)
+        # 边解析边查找，找够了就不再解析
+        with open_located_text(file_path, offset_map, cancel_event) as source:
+            return find_stream_offsets(source, pattern, cancel_event, limit)
+    if is_virtual(file_path):
+        with open_member_source(file_path, encoding, cancel_event) as source:
+            return find_stream_offsets(source, pattern, cancel_event, limit)
+    if file_type_of(file_path) == 'text':
+        encoding = file_encoding(file_path, encoding)
+        if limit is None:
+            preview = PreviewText.from_text_file(file_path, encoding, pattern, cancel_event)
+            return preview.starts, preview.ends
+        with open(file_path, 'r', encoding=encoding, errors='ignore') as file:
+            return find_stream_offsets(file, pattern, cancel_event, limit)
+    content = cache.get(file_path) if cache is not None else None
+    if content is None and limit is not None:
+        # 边解析边查找，找够了就不再解析
+        pieces = iter_office_text(file_path, cancel_event)
+        try:
+            return find_stream_offsets(IterReader(pieces), pattern, cancel_event, limit)
+        finally:
+            pieces.close()
+    if content is None:
+        content, _ = read_file(file_path, encoding, cancel_event, cache)
+    return find_match_offsets(pattern, content, cancel_event, limit)
+
+
+def filter_candidates(file_paths, index, pattern):
+    """去掉索引中确定不可能匹配的文件；不在索引中的文件（如读取失败的文件、压缩包）照常查找"""
+    candidates = index.candidates(pattern)
+    if candidates is None:
+        return file_paths
+    indexed = index.indexed()
+    return [p for p in file_paths if p in candidates or p not in indexed or archive_kind(p)]
+
+
+def search_tree(folder_path, pattern, file_filters, encoding, cancel_event=None, stats=None, pool=None,
+                cache=None, index=None, walk_options=None, snapshot=None, profiler=None, match_options=None):
+    """逐个查找文件，每处理完一个文件返回 (file_path, count, error)
+
+    count 为 0 表示没有匹配；读取失败时 error 为异常或错误信息。
+    给出 match_options 时每个文件最多统计 file_limit() 个匹配，数够了就不再读取或解析这个文件，
+    有匹配的文件达到 max_results 个时结束查找并设置 stats.results_capped。
+    纯文本文件先读取开头几 KB，二进制文件直接跳过；encoding 为 AUTO_ENCODING 时按文件检测编码。
+    给出 pool 时 Office 文件交给进程池解析，纯文本文件仍在当前线程处理；
+    给出 cache 时已缓存的 Office 文件直接在当前线程查找，不再解析；
+    给出 index 时先增量更新索引，再只读取索引给出的候选文件；
+    给出 snapshot 时未改动文件直接使用上次记录的匹配数；
+    给出 profiler（profiling.Profiler）时记录每个文件各阶段的耗时，沿用上次结果的文件不计入。
+    walk_options.archive_depth 大于 0 时逐个查找压缩包中符合过滤规则的文件，返回虚拟路径（见 archives）。
+    """
+    if stats is None:
+        stats = SearchStats()
+    limit = max_results = None
+    if match_options is not None:
+        limit = match_options.file_limit()
+        max_results = match_options.max_results
+    results = _search_tree(folder_path, pattern, file_filters, encoding, cancel_event, stats, pool, cache, index,
+                           walk_options, snapshot, profiler, limit)
+    matched = 0
+    for file_path, count, error in results:
+        yield file_path, count, error
+        if count:
+            matched += 1
+            if max_results is not None and matched >= max_results:
+                stats.results_capped = True
+                results.close()
+                return
+
+
+def _search_tree(folder_path, pattern, file_filters, encoding, cancel_event, stats, pool, cache, index,
+                 walk_options, snapshot, profiler, limit):
+    file_paths = iter_files(folder_path, file_filters, cancel_event, walk_options)
+    if profiler is not None:
+        file_paths = profiler.walk(file_paths)
+    members = None
+    if walk_options is not None and walk_options.archive_depth:
+        members = MemberFilter(compile_globs(file_filters), walk_options)
+    walked = None
+    if index is not None or snapshot is not None:
+        file_paths = walked = list(file_paths)
+    if index is not None:
+        index.update(file_paths, encoding, cancel_event, pool, cache)
+        file_paths = filter_candidates(file_paths, index, pattern)
+    if snapshot is None:
+        yield from _scan_files(file_paths, pattern, encoding, cancel_event, stats, pool, cache,
+                               profiler=profiler, limit=limit, members=members)
+        return
+
+    run = snapshot.begin(pattern, encoding, limit)
+    for file_path, count, error in _scan_files(file_paths, pattern, encoding, cancel_event, stats, pool, cache,
+                                               run, profiler, limit, members):
+        if error is None:
+            run.record(file_path, count)
+        yield file_path, count, error
+    if not is_cancelled(cancel_event):
+        run.finish(walked)
+
+
+def _scan_files(file_paths, pattern, encoding, cancel_event, stats, pool, cache, run=None, profiler=None,
+                limit=None, members=None):
+    office_tasks = None
+    if pool is not None:
+        office_tasks = pool.tasks(count_chunk, pattern, encoding, cache, limit, members, cancel_event=cancel_event,
+                                  failed=count_chunk_failed)
+    try:
+        yield from _scan(file_paths, pattern, encoding, cancel_event, stats, cache, run, profiler, limit,
+                         office_tasks, members)
+    finally:
+        # 提前结束（取消或结果数达到上限）时放弃进程池中尚未完成的文件
+        if office_tasks is not None:
+            office_tasks.cancel()
+
+
+def _scan(file_paths, pattern, encoding, cancel_event, stats, cache, run, profiler, limit, office_tasks, members):
+    def task_results(results):
+        for file_path, count, size, error, timings in results:
+            stats.files_scanned += 1
+            stats.bytes_read += size
+            if count:
+                stats.files_matched += 1
+            if profiler is not None:
+                profiler.record(file_path, file_type_of(file_path), timings, size, error)
+            yield file_path, count, error
+
+    for file_path in file_paths:
+        if is_cancelled(cancel_event):
+            break
+        if members is not None and archive_kind(file_path):
+            # 压缩包与 Office 文件一样交给进程池，没有进程池时在当前线程中逐个读取其中的文件
+            if office_tasks is not None:
+                yield from task_results(office_tasks.add(file_path))
+            else:
+                yield from task_results(count_archive(file_path, pattern, encoding, members, cancel_event, limit))
+            continue
+        if run is not None:
+            count = run.reuse(file_path)
+            if count is not None:
+                stats.files_reused += 1
+                if count:
+                    stats.files_matched += 1
+                yield file_path, count, None
+                continue
+        file_type = file_type_of(file_path)
+        profile = profiler.file(file_path, file_type) if profiler is not None else None
+        content = None
+        if office_tasks is not None and file_type != 'text':
+            with _phase(profile, 'extract'):
+                content = cache.get(file_path) if cache is not None else None
+            if content is None:
+                yield from task_results(office_tasks.add(file_path))
+                continue
+        size = 0
+        try:
+            if file_type == 'text':
+                with _phase(profile, 'stat'):
+                    file_enc, size = sniff(file_path, encoding)
+                if file_enc is None:
+                    # 只读取了开头几 KB 就判断为二进制文件，不再查找
+                    stats.files_scanned += 1
+                    stats.files_binary += 1
+                    if profile is not None:
+                        profile.finish()
+                    yield file_path, 0, None
+                    continue
+                # 纯文本文件分块查找，不把整个文件读入内存
+                timings = {} if profile is not None else None
+                count = count_stream_matches(file_path, pattern, file_enc, cancel_event, timings, limit)
+                if profile is not None:
+                    profile.add_timings(timings)
+            else:
+                if content is None and limit is not None:
+                    with _phase(profile, 'extract'):
+                        content = cache.get(file_path) if cache is not None else None
+                if content is None and limit is not None:
+                    # 边解析边查找，数够了就不再解析；只解析了一部分，不写入缓存
+                    timings = {} if profile is not None else None
+                    count = count_office_matches(file_path, pattern, cancel_event, timings, limit)
+                    if profile is not None:
+                        profile.add_timings(timings)
+                else:
+                    if content is None:
+                        with _phase(profile, 'extract'):
+                            content, _ = read_file(file_path, encoding, cancel_event, cache)
+                    if is_cancelled(cancel_event):
+                        break
+                    with _phase(profile, 'match'):
+                        count = count_matches(pattern, content, cancel_event, limit)
+            if is_cancelled(cancel_event):
+                break
+            if file_type != 'text':
+                size = os.path.getsize(file_path)
+            stats.bytes_read += size
+        except Exception as e:
+            stats.files_scanned += 1
+            if profile is not None:
+                profile.finish(size, e)
+            yield file_path, 0, e
+            continue
+        stats.files_scanned += 1
+        if count:
+            stats.files_matched += 1
+        if profile is not None:
+            profile.finish(size)
+        yield file_path, count, None
+
+    if office_tasks is not None:
+        if is_cancelled(cancel_event):
+            office_tasks.cancel()
+        else:
+            yield from task_results(office_tasks.finish())
+
+
+def _phase(profile, name):
+    """profile 为 None 时不计时"""
+    return profile.phase(name) if profile is not None else nullcontext()
+
+
+def replace_tree(folder_path, pattern, replace_term, file_filters, encoding, pool=None, cache=None,
+                 walk_options=None, profiler=None, dry_run=False):
+    """对文件夹中的文件做替换，但不写回原文件
+
+    对有替换的文件返回 (file_path, file_type, temp_path, num_subs, None)，
+    读取失败的文件返回 (file_path, None, None, 0, error)。
+    替换结果写在原文件所在目录的临时文件 temp_path 中，由调用方用 commit_replace 写回：
+    纯文本文件分块替换，Office 文件直接修改压缩包中的 XML，不经过提取的纯文本。
+    .zip、.tar、.gz 等压缩包中的文件只读，不做替换。给出 profiler 时记录每个文件各阶段的耗时。
+    dry_run 为 True 时只统计替换数，不写临时文件，temp_path 总是 None。
+    """
+    office_tasks = pool.tasks(replace_chunk, pattern, replace_term, cache, dry_run,
+                              failed=replace_chunk_failed) if pool else None
+
+    def office_results(results):
+        for file_path, file_type, temp_path, num_subs, error, timings in results:
+            if profiler is not None:
+                profiler.record(file_path, file_type_of(file_path), timings, error=error)
+            if error is not None or num_subs > 0:
+                yield file_path, file_type, temp_path, num_subs, error
+
+    file_paths = iter_files(folder_path, file_filters, walk_options=walk_options)
+    if profiler is not None:
+        file_paths = profiler.walk(file_paths)
+    for file_path in file_paths:
+        if archive_kind(file_path):
+            continue
+        file_type = file_type_of(file_path)
+        if office_tasks is not None and file_type != 'text':
+            yield from office_results(office_tasks.add(file_path))
+            continue
+        profile = profiler.file(file_path, file_type) if profiler is not None else None
+        timings = {} if profile is not None else None
+        try:
+            if file_type == 'text':
+                with _phase(profile, 'stat'):
+                    file_enc, _ = sniff(file_path, encoding)
+                if file_enc is None:
+                    if profile is not None:
+                        profile.finish()
+                    continue
+                if dry_run:
+                    # 分块替换与分块统计按同样的方式切分，替换数就是匹配数
+                    temp_path = None
+                    num_subs = int(count_stream_matches(file_path, pattern, file_enc, timings=timings))
+                else:
+                    temp_path, num_subs = stream_replace(file_path, pattern, replace_term, file_enc, timings=timings)
+            else:
+                from .ooxml_replace import replace_office
+                temp_path, num_subs = replace_office(file_path, pattern, replace_term, cache, timings, dry_run)
+        except Exception as e:
+            if profile is not None:
+                profile.finish(error=e)
+            yield file_path, None, None, 0, e
+            continue
+        if profile is not None:
+            profile.add_timings(timings)
+            profile.finish()
+        if num_subs > 0:
+            yield file_path, file_type, temp_path, num_subs, None
+
+    if office_tasks is not None:
+        yield from office_results(office_tasks.finish())
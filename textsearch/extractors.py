@@ -0,0 +1,93 @@
+"""各种文件格式的文本提取
+
+Office 格式的解析模块（依赖 openpyxl）在第一次用到时才导入，只查找纯文本文件时不加载。
+"""
+from .cache import cache_key
+from .sniff import file_encoding
+
+# 虚拟路径中压缩包与成员名之间的分隔符，见 archives
+ARCHIVE_SEP = '!/'
+# 文本文件分块读取的大小，两次读取之间检查取消标志
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+def is_cancelled(cancel_event):
+    return cancel_event is not None and cancel_event.is_set()
+
+
+def read_docx(file_path, cancel_event=None):
+    from .ooxml import iter_docx_paragraphs
+    return '\n'.join(iter_docx_paragraphs(file_path, cancel_event))
+
+
+def read_xlsx(file_path, cancel_event=None):
+    from .ooxml import iter_xlsx_lines
+    return '\n'.join(iter_xlsx_lines(file_path, cancel_event))
+
+
+def iter_office_text(file_path, cancel_event=None, file=None):
+    """逐段返回 .docx/.xlsx 的文本，依次拼起来与 read_file 的结果相同；停止迭代时不再解析后面的内容
+
+    给出 file 时从这个可以随机访问的二进制文件对象中读取，file_path 只用于判断格式。
+    """
+    from .ooxml import iter_docx_paragraphs, iter_xlsx_lines
+    source = file_path if file is None else file
+    if file_type_of(file_path) == 'docx':
+        pieces = iter_docx_paragraphs(source, cancel_event)
+    else:
+        pieces = iter_xlsx_lines(source, cancel_event)
+    for i, piece in enumerate(pieces):
+        if i:
+            yield '\n'
+        yield piece
+
+
+def read_text(file_path, encoding, cancel_event=None):
+    parts = []
+    with open(file_path, 'r', encoding=encoding, errors='ignore') as file:
+        while not is_cancelled(cancel_event):
+            chunk = file.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            parts.append(chunk)
+    return ''.join(parts)
+
+
+def file_type_of(file_path):
+    """根据扩展名返回 'docx'、'xlsx' 或 'text'"""
+    if file_path.endswith('.docx'):
+        return 'docx'
+    if file_path.endswith('.xlsx'):
+        return 'xlsx'
+    return 'text'
+
+
+def read_file(file_path, encoding, cancel_event=None, cache=None):
+    """读取文件文本内容，返回 (content, file_type)
+
+    encoding 为 AUTO_ENCODING 时纯文本文件使用检测到的编码；给出 cache 时 Office 文件优先使用缓存的提取文本，未命中时提取后写入缓存。
+    压缩包中的文件（虚拟路径）直接从压缩包中读取，不使用缓存。
+    """
+    file_type = file_type_of(file_path)
+    if ARCHIVE_SEP in file_path:
+        from .archives import read_member
+        return read_member(file_path, encoding, cancel_event), file_type
+    if cache is not None and file_type != 'text':
+        content = cache.get(file_path)
+        if content is not None:
+            return content, file_type
+        key = cache_key(file_path)
+        # 提取时顺带记录段落、单元格的位置，与文本一起缓存，预览和上下文片段不必再解析
+        from .locations import office_text_map
+        content, offset_map = office_text_map(file_path, cancel_event)
+        # 取消时得到的是不完整的文本，不能写入缓存
+        if not is_cancelled(cancel_event):
+            cache.put(file_path, content, key, offset_map.to_bytes())
+        return content, file_type
+    if file_type == 'docx':
+        content = read_docx(file_path, cancel_event)
+    elif file_type == 'xlsx':
+        content = read_xlsx(file_path, cancel_event)
+    else:
+        content = read_text(file_path, file_encoding(file_path, encoding), cancel_event)
+    return content, file_type
@@ -0,0 +1,377 @@
+"""文件夹的三元组（trigram）倒排索引
+
+对每个文件提取文本中出现过的所有三字符片段，查询时把正则表达式转换成
+由三元组组成的与/或条件，只读取并用 finditer 验证满足条件的候选文件。
+索引保存在用户缓存目录下的 SQLite 文件中，按 (大小, mtime_ns) 增量更新。
+"""
+import os
+import re
+import hashlib
+import sqlite3
+import threading
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python 3.10 及更早版本
+    import sre_parse
+
+from .archives import archive_kind
+from .cache import default_cache_dir
+from .extractors import read_file, file_type_of, is_cancelled
+from .streaming import stream_trigrams
+from .sniff import sniff
+
+# 精确字符串集合超过这么多个就放弃精确匹配，只保留三元组条件
+MAX_EXACT_SET = 16
+# 字符类中最多展开这么多个字符
+MAX_CLASS_CHARS = 8
+
+# 查询条件：('all',) 表示不做限制，('tri', s) 要求出现三元组 s，
+# ('and', [...]) 与 ('or', [...]) 组合子条件
+ALL = ('all',)
+
+
+def text_trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def default_index_path(folder_path):
+    folder = os.path.normcase(os.path.abspath(folder_path))
+    digest = hashlib.sha1(folder.encode('utf-8', errors='surrogatepass')).hexdigest()
+    return os.path.join(default_cache_dir(), 'index', f'{digest}.sqlite3')
+
+
+def and_query(*queries):
+    parts = []
+    for query in queries:
+        if query[0] == 'and':
+            parts.extend(query[1])
+        elif query != ALL:
+            parts.append(query)
+    if not parts:
+        return ALL
+    return parts[0] if len(parts) == 1 else ('and', parts)
+
+
+def or_query(*queries):
+    parts = []
+    for query in queries:
+        if query == ALL:
+            return ALL
+        if query[0] == 'or':
+            parts.extend(query[1])
+        else:
+            parts.append(query)
+    return parts[0] if len(parts) == 1 else ('or', parts)
+
+
+def string_query(s):
+    """匹配中必须完整出现字符串 s 时的条件"""
+    return and_query(*[('tri', t) for t in sorted(text_trigrams(s))])
+
+
+def exact_query(exact):
+    """匹配为 exact 中某个字符串时的条件"""
+    return or_query(*[string_query(s) for s in sorted(exact)])
+
+
+class _Info:
+    """正则子表达式的分析结果
+
+    exact 为子表达式可能匹配的全部字符串（未知时为 None），
+    query 为 exact 之外已经确定必须满足的条件。
+    """
+
+    def __init__(self, exact=None, query=ALL):
+        self.exact = exact
+        self.query = query
+
+    def to_query(self):
+        if self.exact is None:
+            return self.query
+        return and_query(self.query, exact_query(self.exact))
+
+
+UNKNOWN = _Info()
+
+
+def _class_chars(items):
+    chars = set()
+    for op, av in items:
+        if op == sre_parse.LITERAL:
+            chars.add(chr(av))
+        elif op == sre_parse.RANGE and av[1] - av[0] < MAX_CLASS_CHARS:
+            chars.update(chr(c) for c in range(av[0], av[1] + 1))
+        else:
+            return None
+        if len(chars) > MAX_CLASS_CHARS:
+            return None
+    return chars
+
+
+def _analyze(subpattern):
+    exact = {''}
+    query = ALL
+    broken = False
+    for op, av in subpattern:
+        node = _analyze_node(op, av)
+        if node.exact is not None and len(exact) * len(node.exact) <= MAX_EXACT_SET:
+            exact = {a + b for a in exact for b in node.exact}
+            continue
+        # 精确集合无法继续拼接：把已拼好的部分转换成条件，从下一个节点重新开始
+        broken = True
+        query = and_query(query, exact_query(exact), node.query)
+        exact = node.exact if node.exact is not None else {''}
+    if broken:
+        return _Info(None, and_query(query, exact_query(exact)))
+    return _Info(exact)
+
+
+def _analyze_node(op, av):
+    if op == sre_parse.LITERAL:
+        return _Info({chr(av)})
+    if op == sre_parse.IN:
+        chars = _class_chars(av)
+        return _Info(chars) if chars else UNKNOWN
+    if op == sre_parse.SUBPATTERN:
+        _, add_flags, _, p = av
+        if add_flags & re.IGNORECASE:
+            return UNKNOWN
+        return _analyze(p)
+    if op == sre_parse.BRANCH:
+        infos = [_analyze(alt) for alt in av[1]]
+        if all(i.exact is not None for i in infos):
+            exact = set().union(*(i.exact for i in infos))
+            if len(exact) <= MAX_EXACT_SET:
+                return _Info(exact)
+        return _Info(None, or_query(*(i.to_query() for i in infos)))
+    if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, 'POSSESSIVE_REPEAT', None)):
+        min_count, max_count, p = av
+        sub = _analyze(p)
+        if sub.exact is not None and min_count == max_count and len(sub.exact) ** min_count <= MAX_EXACT_SET:
+            return _analyze([(sre_parse.SUBPATTERN, (None, 0, 0, p))] * min_count)
+        if min_count == 0:
+            if max_count == 1 and sub.exact is not None:
+                return _Info(sub.exact | {''})
+            # 可能匹配空串，也可能匹配任意长的字符串
+            return UNKNOWN
+        # 至少重复一次：子表达式的条件仍然成立
+        return _Info(None, sub.to_query())
+    if op in (sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+        # 不消耗字符
+        return _Info({''})
+    return UNKNOWN
+
+
+def _parse(pattern):
+    """解析正则表达式；忽略大小写或无法解析时返回 None"""
+    if pattern.flags & re.IGNORECASE:
+        return None
+    try:
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    except Exception:
+        return None
+    if parsed.state.flags & re.IGNORECASE:
+        return None
+    return parsed
+
+
+def pattern_query(pattern):
+    """把编译好的正则表达式转换成三元组查询条件"""
+    parsed = _parse(pattern)
+    if parsed is None:
+        return ALL
+    return _analyze(parsed).to_query()
+
+
+def pattern_exact(pattern):
+    """返回每个匹配必然是其中之一的字符串集合；无法确定时返回 None"""
+    parsed = _parse(pattern)
+    if parsed is None:
+        return None
+    return _analyze(parsed).exact
+
+
+def pattern_literal(pattern):
+    """pattern 只匹配一个固定字符串（没有断言）时返回该字符串，否则返回 None"""
+    parsed = _parse(pattern)
+    if parsed is None or any(op != sre_parse.LITERAL for op, _ in parsed):
+        return None
+    return ''.join(chr(av) for _, av in parsed)
+
+
+class TrigramIndex:
+    """单个文件夹的三元组索引"""
+
+    def __init__(self, folder_path, db_path=None):
+        self.folder_path = folder_path
+        self.db_path = db_path or default_index_path(folder_path)
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            conn.execute('CREATE TABLE IF NOT EXISTS files ('
+                         'id INTEGER PRIMARY KEY, path TEXT UNIQUE, size INTEGER, mtime_ns INTEGER)')
+            conn.execute('CREATE TABLE IF NOT EXISTS postings ('
+                         'trigram TEXT, file_id INTEGER, PRIMARY KEY (trigram, file_id)) WITHOUT ROWID')
+            conn.execute('CREATE INDEX IF NOT EXISTS postings_file ON postings (file_id)')
+            self._conn = conn
+        return self._conn
+
+    def _check_encoding(self, encoding):
+        """纯文本文件的三元组取决于编码，编码变化时清空索引"""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'encoding'").fetchone()
+        if row is not None and row[0] == encoding:
+            return
+        with self.conn:
+            self.conn.execute('DELETE FROM postings')
+            self.conn.execute('DELETE FROM files')
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('encoding', ?)", (encoding,))
+
+    def _store(self, file_path, size, mtime_ns, trigrams):
+        with self._lock, self.conn:
+            self._remove(file_path)
+            cur = self.conn.execute('INSERT INTO files (path, size, mtime_ns) VALUES (?, ?, ?)',
+                                    (file_path, size, mtime_ns))
+            file_id = cur.lastrowid
+            self.conn.executemany('INSERT INTO postings VALUES (?, ?)', ((t, file_id) for t in trigrams))
+
+    def _remove(self, file_path):
+        row = self.conn.execute('SELECT id FROM files WHERE path = ?', (file_path,)).fetchone()
+        if row is not None:
+            self.conn.execute('DELETE FROM postings WHERE file_id = ?', (row[0],))
+            self.conn.execute('DELETE FROM files WHERE id = ?', (row[0],))
+
+    def update(self, file_paths, encoding, cancel_event=None, pool=None, cache=None):
+        """增量更新：只重新提取新增或改动过的文件，并删除已不存在的文件
+
+        返回重新索引的文件数。给出 pool 时 Office 文件在进程池中提取三元组。
+        """
+        with self._lock:
+            self._check_encoding(encoding)
+            known = {path: (size, mtime_ns) for path, size, mtime_ns
+                     in self.conn.execute('SELECT path, size, mtime_ns FROM files')}
+        office_tasks = pool.tasks(trigram_chunk, encoding, cache, cancel_event=cancel_event,
+                                  failed=trigram_chunk_failed) if pool else None
+        updated = 0
+
+        def store_results(results):
+            nonlocal updated
+            for file_path, size, mtime_ns, trigrams, error in results:
+                if error is None:
+                    self._store(file_path, size, mtime_ns, trigrams)
+                    updated += 1
+
+        for file_path in file_paths:
+            if is_cancelled(cancel_event):
+                break
+            # 压缩包中的文件不进索引，查找时照常读取
+            if archive_kind(file_path):
+                continue
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                continue
+            if known.get(file_path) == (st.st_size, st.st_mtime_ns):
+                continue
+            if office_tasks is not None and file_type_of(file_path) != 'text':
+                store_results(office_tasks.add(file_path))
+                continue
+            try:
+                if file_type_of(file_path) == 'text':
+                    # 二进制文件没有三元组，之后不会成为候选文件
+                    file_enc, _ = sniff(file_path, encoding)
+                    trigrams = set() if file_enc is None else stream_trigrams(file_path, file_enc, cancel_event)
+                else:
+                    content, _ = read_file(file_path, encoding, cancel_event, cache)
+                    trigrams = text_trigrams(content)
+            except Exception:
+                # 读取失败的文件不进索引，查找时会照常读取并报告错误
+                continue
+            if is_cancelled(cancel_event):
+                break
+            self._store(file_path, st.st_size, st.st_mtime_ns, trigrams)
+            updated += 1
+
+        if office_tasks is not None:
+            if is_cancelled(cancel_event):
+                office_tasks.cancel()
+            else:
+                store_results(office_tasks.finish())
+
+        if not is_cancelled(cancel_event):
+            with self._lock, self.conn:
+                for file_path in known:
+                    if not os.path.exists(file_path):
+                        self._remove(file_path)
+        return updated
+
+    def indexed(self):
+        """返回 {path: (size, mtime_ns)}"""
+        with self._lock:
+            return {path: (size, mtime_ns) for path, size, mtime_ns
+                    in self.conn.execute('SELECT path, size, mtime_ns FROM files')}
+
+    def candidates(self, pattern):
+        """返回可能匹配 pattern 的文件路径集合；无法缩小范围时返回 None"""
+        with self._lock:
+            ids = self._evaluate(pattern_query(pattern))
+            if ids is None:
+                return None
+            return {path for file_id, path in self.conn.execute('SELECT id, path FROM files') if file_id in ids}
+
+    def _evaluate(self, query):
+        kind = query[0]
+        if kind == 'all':
+            return None
+        if kind == 'tri':
+            return {row[0] for row in
+                    self.conn.execute('SELECT file_id FROM postings WHERE trigram = ?', (query[1],))}
+        if kind == 'and':
+            result = None
+            for sub in query[1]:
+                ids = self._evaluate(sub)
+                if ids is None:
+                    continue
+                result = ids if result is None else result & ids
+                if not result:
+                    break
+            return result
+        result = set()
+        for sub in query[1]:
+            ids = self._evaluate(sub)
+            if ids is None:
+                return None
+            result |= ids
+        return result
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def trigram_chunk(file_paths, encoding, cache=None):
+    """子进程：提取一组文件的三元组，返回 [(file_path, size, mtime_ns, trigrams, error)]"""
+    results = []
+    for file_path in file_paths:
+        try:
+            st = os.stat(file_path)
+            content, _ = read_file(file_path, encoding, cache=cache)
+            results.append((file_path, st.st_size, st.st_mtime_ns, text_trigrams(content), None))
+        except Exception as e:
+            results.append((file_path, 0, 0, None, str(e)))
+    return results
+
+
+def trigram_chunk_failed(file_path, error):
+    """整块失败时 trigram_chunk 中一个文件的结果"""
+    return file_path, 0, 0, None, error
@@ -0,0 +1,140 @@
+"""磁盘上的撤销日志
+
+每次替换操作在日志目录下占一个子目录，修改文件之前把原文件的字节压缩保存进去；
+替换所有文件时已经写好了临时文件，把原文件硬链接（或复制）进去后再用临时文件替换。撤销时按字节还原，Office 文件的格式也不会丢失。
+日志的总大小和操作数都有上限，超过时丢弃最早的操作。
+"""
+import os
+import gzip
+import shutil
+import tempfile
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_MAX_DEPTH = 20
+
+
+class JournalRecord:
+    """一个被修改的文件：file_path 的原始内容保存在 stored_path"""
+
+    def __init__(self, file_path, stored_path, compressed, num_replacements):
+        self.file_path = file_path
+        self.stored_path = stored_path
+        self.compressed = compressed
+        self.num_replacements = num_replacements
+
+    def size(self):
+        try:
+            return os.path.getsize(self.stored_path)
+        except OSError:
+            return 0
+
+    def restore(self):
+        # file_path 是符号链接时还原链接指向的文件，链接本身保持不变
+        target = os.path.realpath(self.file_path)
+        if not self.compressed:
+            shutil.move(self.stored_path, target)
+            return
+        # 先解压到同一目录的临时文件，再替换原文件，避免还原到一半
+        directory, name = os.path.split(target)
+        fd, temp_path = tempfile.mkstemp(prefix=f'.{name}.', suffix='.tmp', dir=directory)
+        try:
+            with gzip.open(self.stored_path, 'rb') as src, open(fd, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            if os.path.exists(target):
+                shutil.copymode(target, temp_path)
+            os.replace(temp_path, target)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+class JournalEntry:
+    """一次替换操作"""
+
+    def __init__(self, journal, op_type, entry_dir):
+        self.journal = journal
+        self.type = op_type
+        self.entry_dir = entry_dir
+        self.records = []
+
+    def _stored_path(self, file_path, suffix):
+        return os.path.join(self.entry_dir, f'{len(self.records)}-{os.path.basename(file_path)}{suffix}')
+
+    def snapshot(self, file_path, num_replacements):
+        """在修改 file_path 之前调用，压缩保存原文件的字节"""
+        stored_path = self._stored_path(file_path, '.gz')
+        with open(file_path, 'rb') as src, gzip.open(stored_path, 'wb', compresslevel=1) as dst:
+            shutil.copyfileobj(src, dst)
+        self.records.append(JournalRecord(file_path, stored_path, True, num_replacements))
+
+    def backup_path(self, file_path):
+        """返回可以存放原文件的路径，调用方用 commit_replace 把原文件保存过去后再调用 add_moved"""
+        return self._stored_path(file_path, '')
+
+    def add_moved(self, file_path, stored_path, num_replacements):
+        self.records.append(JournalRecord(file_path, stored_path, False, num_replacements))
+
+    def size(self):
+        return sum(record.size() for record in self.records)
+
+    def restore(self):
+        """还原所有文件，返回还原失败的 [(file_path, error)]"""
+        errors = []
+        for record in reversed(self.records):
+            try:
+                record.restore()
+            except Exception as e:
+                errors.append((record.file_path, e))
+        self.discard()
+        return errors
+
+    def discard(self):
+        shutil.rmtree(self.entry_dir, ignore_errors=True)
+
+
+class UndoJournal:
+    """撤销栈，内容保存在临时目录中，关闭时删除"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_depth=DEFAULT_MAX_DEPTH, root_dir=None):
+        self.max_bytes = max_bytes
+        self.max_depth = max_depth
+        self.root_dir = root_dir
+        self.entries = []
+        self._counter = 0
+
+    def begin(self, op_type):
+        if self.root_dir is None:
+            self.root_dir = tempfile.mkdtemp(prefix='textsearch-undo-')
+        self._counter += 1
+        entry_dir = os.path.join(self.root_dir, str(self._counter))
+        os.makedirs(entry_dir, exist_ok=True)
+        return JournalEntry(self, op_type, entry_dir)
+
+    def commit(self, entry):
+        """把操作压入撤销栈；没有修改任何文件时直接丢弃"""
+        if not entry.records:
+            entry.discard()
+            return
+        self.entries.append(entry)
+        self._trim()
+
+    def _trim(self):
+        total = sum(entry.size() for entry in self.entries)
+        # 最新的操作总是保留
+        while len(self.entries) > 1 and (len(self.entries) > self.max_depth or total > self.max_bytes):
+            oldest = self.entries.pop(0)
+            total -= oldest.size()
+            oldest.discard()
+
+    def pop(self):
+        return self.entries.pop() if self.entries else None
+
+    def __bool__(self):
+        return bool(self.entries)
+
+    def close(self):
+        self.entries = []
+        if self.root_dir is not None:
+            shutil.rmtree(self.root_dir, ignore_errors=True)
+            self.root_dir = None
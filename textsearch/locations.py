@@ -0,0 +1,180 @@
+"""Office 文件中匹配的结构位置：docx 的段落和文本块（w:r），xlsx 的工作表和单元格
+
+提取出的全文中，来自同一个文本块或单元格的文本记为一段，各段按列保存在几个 array 中，
+用二分查找把全文中的位置映射回段落和文本块、工作表和单元格。
+段落或行之间的换行符、单元格之间的空格不属于任何一段。
+映射可以转成字节与提取的文本一起存进 TextCache，见 load_text_map。
+"""
+import json
+import zlib
+from array import array
+from bisect import bisect_right
+from contextlib import contextmanager, nullcontext
+
+from .archives import is_virtual, open_member_file
+from .cache import cache_key
+from .extractors import file_type_of, is_cancelled
+from .streaming import IterReader
+
+
+class OffsetMap:
+    """全文中的位置到结构位置的映射
+
+    docx 中 section 为段落编号，item 为段落中的第几个 w:r（包括超链接中的），column 为 0；
+    xlsx 中 section 为工作表编号（名称见 sheet_names），item 为行号，column 为列号。
+    编号从 0 开始，行号和列号与 Excel 一样从 1 开始。
+    """
+
+    def __init__(self, file_type):
+        self.file_type = file_type
+        self.starts = array('q')
+        self.lengths = array('l')
+        self.sections = array('l')
+        self.items = array('l')
+        self.columns = array('l')
+        self.sheet_names = []
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _arrays(self):
+        return self.starts, self.lengths, self.sections, self.items, self.columns
+
+    def copy_from(self, other):
+        """把另一个映射（例如缓存中的）的内容复制到这个空映射中"""
+        for column, other_column in zip(self._arrays(), other._arrays()):
+            column.extend(other_column)
+        self.sheet_names.extend(other.sheet_names)
+
+    def to_bytes(self):
+        """压缩后的字节：头部为 JSON（工作表名和段数），后面依次是各列 array 的内容"""
+        header = json.dumps({'sheets': self.sheet_names, 'count': len(self)}, ensure_ascii=False).encode('utf-8')
+        body = b''.join(column.tobytes() for column in self._arrays())
+        return zlib.compress(len(header).to_bytes(4, 'little') + header + body)
+
+    @classmethod
+    def from_bytes(cls, file_type, data):
+        data = zlib.decompress(data)
+        size = int.from_bytes(data[:4], 'little')
+        header = json.loads(data[4:4 + size].decode('utf-8'))
+        offset_map = cls(file_type)
+        offset_map.sheet_names = header['sheets']
+        pos = 4 + size
+        for column in offset_map._arrays():
+            end = pos + header['count'] * column.itemsize
+            column.frombytes(data[pos:end])
+            pos = end
+        return offset_map
+
+    def add(self, start, length, section, item, column=0):
+        self.starts.append(start)
+        self.lengths.append(length)
+        self.sections.append(section)
+        self.items.append(item)
+        self.columns.append(column)
+
+    def locate(self, offset):
+        """返回 (section, item, column, 在这一段中的位置)，位置不属于任何一段时返回 None"""
+        i = bisect_right(self.starts, offset) - 1
+        if i < 0 or offset >= self.starts[i] + self.lengths[i]:
+            return None
+        return self.sections[i], self.items[i], self.columns[i], offset - self.starts[i]
+
+    def describe(self, offset):
+        """位置的说明，例如 "第 3 段第 2 个文本块" 或 "Sheet1!B7"；不属于任何一段时返回空字符串"""
+        location = self.locate(offset)
+        if location is None:
+            return ''
+        section, item, column, _ = location
+        if self.file_type == 'xlsx':
+            from openpyxl.utils.cell import get_column_letter
+            return f"{self.sheet_names[section]}!{get_column_letter(column)}{item}"
+        return f"第 {section + 1} 段第 {item + 1} 个文本块"
+
+
+def iter_located_text(file_path, offset_map, cancel_event=None, file=None):
+    """与 extractors.iter_office_text 一样逐段返回 .docx/.xlsx 的文本，同时把各段的位置记入 offset_map
+
+    给出 file 时从这个可以随机访问的二进制文件对象中读取，file_path 只用于判断格式。
+    """
+    from .ooxml import iter_docx_runs, iter_xlsx_rows
+    source = file_path if file is None else file
+    offset = 0
+    if file_type_of(file_path) == 'docx':
+        for index, runs in enumerate(iter_docx_runs(source, cancel_event)):
+            if index:
+                yield '\n'
+                offset += 1
+            for item, text in enumerate(runs):
+                if text:
+                    offset_map.add(offset, len(text), index, item)
+                    offset += len(text)
+            yield ''.join(runs)
+        return
+
+    sheet_ids = {}
+    first = True
+    for name, row, values, max_col in iter_xlsx_rows(source, cancel_event):
+        section = sheet_ids.get(name)
+        if section is None:
+            section = sheet_ids[name] = len(offset_map.sheet_names)
+            offset_map.sheet_names.append(name)
+        if not first:
+            yield '\n'
+            offset += 1
+        first = False
+        parts = []
+        for col in range(1, max_col + 1):
+            if col > 1:
+                parts.append(' ')
+                offset += 1
+            text = values.get(col, '')
+            if text:
+                offset_map.add(offset, len(text), section, row, col)
+                offset += len(text)
+            parts.append(text)
+        yield ''.join(parts)
+
+
+@contextmanager
+def open_located_text(file_path, offset_map, cancel_event=None):
+    """打开 .docx/.xlsx（也可以是压缩包中的文件），返回有 read(size) 的文本来源，读到哪里位置就记到哪里"""
+    with (open_member_file(file_path) if is_virtual(file_path) else nullcontext()) as file:
+        pieces = iter_located_text(file_path, offset_map, cancel_event, file)
+        try:
+            yield IterReader(pieces)
+        finally:
+            pieces.close()
+
+
+def office_text_map(file_path, cancel_event=None):
+    """返回 .docx/.xlsx 的 (全文, OffsetMap)，全文与 read_file 的结果相同"""
+    offset_map = OffsetMap(file_type_of(file_path))
+    with (open_member_file(file_path) if is_virtual(file_path) else nullcontext()) as file:
+        content = ''.join(iter_located_text(file_path, offset_map, cancel_event, file))
+    return content, offset_map
+
+
+def cached_text_map(file_path, cache):
+    """返回缓存中的 (全文, OffsetMap)；没有缓存、文件已改动或缓存中没有位置时返回 None"""
+    if cache is None or is_virtual(file_path):
+        return None
+    entry = cache.get_entry(file_path)
+    if entry is None or entry[1] is None:
+        return None
+    return entry[0], OffsetMap.from_bytes(file_type_of(file_path), entry[1])
+
+
+def load_text_map(file_path, cancel_event=None, cache=None):
+    """与 office_text_map 相同；给出 cache 时优先使用缓存，未命中时解析后把全文和位置一起写入缓存"""
+    cached = cached_text_map(file_path, cache)
+    if cached is not None:
+        return cached
+    if cache is None or is_virtual(file_path):
+        return office_text_map(file_path, cancel_event)
+    key = cache_key(file_path)
+    content, offset_map = office_text_map(file_path, cancel_event)
+    # 取消时得到的是不完整的文本，不能写入缓存
+    if not is_cancelled(cancel_event):
+        cache.put(file_path, content, key, offset_map.to_bytes())
+    return content, offset_map
@@ -0,0 +1,143 @@
+"""多关键字查找：一次扫描同时查找成百上千个关键字，并按关键字统计匹配数
+
+关键字先建成一棵字典树，再把字典树编译成一个正则表达式：同一位置的各个分支首字符互不相同，
+正则引擎不会在分支之间回溯，每个位置最多沿着树走关键字长度那么多步，扫描由 C 代码完成。
+直接把关键字拼成 "a|b|c" 时每个位置都要逐个尝试所有关键字，关键字多时慢得多。
+同一位置有多个关键字匹配时取最长的一个，匹配之间不重叠，与按长度排序的 "a|b|c" 结果相同。
+"""
+import re
+
+from .sniff import AUTO_ENCODING, file_encoding
+
+
+def parse_terms(text):
+    """把分号分隔的关键字拆成列表"""
+    return [t.strip() for t in text.split(';') if t.strip()]
+
+
+def load_terms(path):
+    """从文件加载关键字，每行一个，忽略空行；文件编码自动检测"""
+    with open(path, 'r', encoding=file_encoding(path, AUTO_ENCODING), errors='ignore') as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+def trie_pattern(terms):
+    """把关键字编译成等价于按长度排序的 "a|b|c" 的正则表达式文本"""
+    trie = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+    return _node_pattern(trie)
+
+
+def _node_pattern(node):
+    alternatives = []
+    for ch, child in sorted(node.items()):
+        if not ch:
+            continue
+        # 只有一个分支、也不是关键字结尾的一串节点直接连起来，不加括号，也不递归
+        chars = [ch]
+        while len(child) == 1 and '' not in child:
+            (ch, child), = child.items()
+            chars.append(ch)
+        alternatives.append(re.escape(''.join(chars)) + _node_pattern(child))
+    if not alternatives:
+        return ''
+    body = alternatives[0] if len(alternatives) == 1 else '(?:' + '|'.join(alternatives) + ')'
+    if '' in node:
+        # 这里已经是一个关键字的结尾：贪婪地先尝试更长的关键字
+        return '(?:' + body + ')?'
+    return body
+
+
+class MultiPattern:
+    """一组按字面匹配的关键字，用法与编译好的正则表达式相同
+
+    finditer、search、sub、subn 以及 pattern、flags 都交给编译出的正则表达式，
+    查找、替换、索引和快照不需要区分单个关键字和多个关键字。
+    """
+
+    def __init__(self, terms):
+        self.terms = tuple(dict.fromkeys(t for t in terms if t))
+        if not self.terms:
+            raise ValueError("没有关键字")
+        self.regex = re.compile(trie_pattern(self.terms))
+
+    @property
+    def pattern(self):
+        return self.regex.pattern
+
+    @property
+    def flags(self):
+        return self.regex.flags
+
+    def finditer(self, string, *args):
+        return self.regex.finditer(string, *args)
+
+    def search(self, string, *args):
+        return self.regex.search(string, *args)
+
+    def sub(self, repl, string, count=0):
+        return self.regex.sub(repl, string, count)
+
+    def subn(self, repl, string, count=0):
+        return self.regex.subn(repl, string, count)
+
+    def term_counts(self, text):
+        counter = TermCounter()
+        for match in self.regex.finditer(text):
+            counter.add(match)
+        return counter.result()
+
+
+class TermCounts(int):
+    """匹配总数，另外在 counts 中按关键字记录 {关键字: 匹配数}"""
+
+    def __new__(cls, counts):
+        self = super().__new__(cls, sum(counts.values()))
+        self.counts = counts
+        return self
+
+    def __reduce__(self):
+        return TermCounts, (self.counts,)
+
+    def summary(self, limit=5):
+        """匹配最多的几个关键字，例如 "a 3，b 2 等 5 个关键字" """
+        ranked = sorted(self.counts.items(), key=lambda item: -item[1])
+        text = '，'.join(f"{term} {count}" for term, count in ranked[:limit])
+        return text + (f" 等 {len(ranked)} 个关键字" if len(ranked) > limit else '')
+
+
+class MatchCounter:
+    """只统计匹配总数"""
+
+    def __init__(self):
+        self.total = 0
+
+    def add(self, match):
+        self.total += 1
+
+    def result(self):
+        return self.total
+
+
+class TermCounter(MatchCounter):
+    """按关键字统计匹配数；每个匹配的文本就是关键字本身"""
+
+    def __init__(self):
+        super().__init__()
+        self.counts = {}
+
+    def add(self, match):
+        self.total += 1
+        term = match.group()
+        self.counts[term] = self.counts.get(term, 0) + 1
+
+    def result(self):
+        return TermCounts(self.counts)
+
+
+def match_counter(pattern):
+    return TermCounter() if isinstance(pattern, MultiPattern) else MatchCounter()
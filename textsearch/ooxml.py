@@ -0,0 +1,431 @@
+"""直接读取 .docx/.xlsx 压缩包中 XML 的轻量提取器
+
+不构建 python-docx 和 openpyxl 的完整对象模型，用 iterparse 边解析边释放元素。
+输出的文本与 python-docx 的 paragraph.text、openpyxl 的 iter_rows(values_only=True)
+保持一致，因此匹配数和预览中的位置不变。
+"""
+import re
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+
+from openpyxl.formula.translate import Translator
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+from openpyxl.utils.cell import get_column_letter
+from openpyxl.utils.datetime import from_excel, from_ISO8601
+
+try:
+    from openpyxl.utils.datetime import WINDOWS_EPOCH, MAC_EPOCH
+except ImportError:  # openpyxl 3.0
+    from openpyxl.utils.datetime import CALENDAR_WINDOWS_1900 as WINDOWS_EPOCH, CALENDAR_MAC_1904 as MAC_EPOCH
+
+W_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+S_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+R_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PKG_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+# python-docx 中 run.text 对各子元素的处理
+_RUN_TEXT = {
+    W_NS + 'tab': '\t',
+    W_NS + 'ptab': '\t',
+    W_NS + 'cr': '\n',
+    W_NS + 'noBreakHyphen': '-',
+}
+
+_CELL_REF = re.compile(r'([A-Z]+)(\d+)')
+
+
+def _is_cancelled(cancel_event):
+    return cancel_event is not None and cancel_event.is_set()
+
+
+def _read_rels(zf, part_path):
+    """返回部件的 {关系 Id: (类型, 目标路径)}"""
+    directory, name = posixpath.split(part_path)
+    rels_path = posixpath.join(directory, '_rels', name + '.rels')
+    try:
+        root = ET.fromstring(zf.read(rels_path))
+    except KeyError:
+        return {}
+    rels = {}
+    for rel in root.iter(PKG_REL_NS + 'Relationship'):
+        target = rel.get('Target', '')
+        if rel.get('TargetMode') == 'External':
+            continue
+        if target.startswith('/'):
+            target = target[1:]
+        else:
+            target = posixpath.normpath(posixpath.join(directory, target))
+        rels[rel.get('Id')] = (rel.get('Type', ''), target)
+    return rels
+
+
+def _main_part(zf, default):
+    for rel_type, target in _read_rels(zf, '').values():
+        if rel_type.endswith('/officeDocument'):
+            return target
+    return default
+
+
+def _run_text(r):
+    parts = []
+    for child in r:
+        tag = child.tag
+        if tag == W_NS + 't':
+            parts.append(child.text or '')
+        elif tag == W_NS + 'br':
+            # 只有换行符类型的 br 算作换行，分页符和分栏符不输出
+            if child.get(W_NS + 'type', 'textWrapping') == 'textWrapping':
+                parts.append('\n')
+        elif tag in _RUN_TEXT:
+            parts.append(_RUN_TEXT[tag])
+    return ''.join(parts)
+
+
+def _paragraph_runs(p):
+    """段落中每个 w:r（包括超链接中的）的文本"""
+    runs = []
+    for child in p:
+        if child.tag == W_NS + 'r':
+            runs.append(_run_text(child))
+        elif child.tag == W_NS + 'hyperlink':
+            runs.extend(_run_text(r) for r in child if r.tag == W_NS + 'r')
+    return runs
+
+
+def _paragraph_text(p):
+    return ''.join(_paragraph_runs(p))
+
+
+def iter_docx_paragraphs(file_path, cancel_event=None):
+    """依次返回正文中每个段落的文本（与 python-docx 的 doc.paragraphs 相同，不含表格）"""
+    for p in _iter_body_paragraphs(file_path, cancel_event):
+        yield _paragraph_text(p)
+
+
+def iter_docx_runs(file_path, cancel_event=None):
+    """依次返回正文中每个段落的 [各个 w:r 的文本]，拼起来与 iter_docx_paragraphs 相同"""
+    for p in _iter_body_paragraphs(file_path, cancel_event):
+        yield _paragraph_runs(p)
+
+
+def _iter_body_paragraphs(file_path, cancel_event):
+    """依次返回正文中的 w:p 元素，调用方处理完后元素即被释放"""
+    with zipfile.ZipFile(file_path) as zf:
+        with zf.open(_main_part(zf, 'word/document.xml')) as source:
+            depth = 0
+            body = None
+            for event, elem in ET.iterparse(source, events=('start', 'end')):
+                if event == 'start':
+                    depth += 1
+                    if depth == 2 and elem.tag == W_NS + 'body':
+                        body = elem
+                    continue
+                depth -= 1
+                if depth == 2 and body is not None:
+                    # 正文的直接子元素处理完后立即释放
+                    if elem.tag == W_NS + 'p':
+                        yield elem
+                    elem.clear()
+                    body.remove(elem)
+                    if _is_cancelled(cancel_event):
+                        return
+
+
+def _read_shared_strings(zf, path):
+    strings = []
+    if path is None:
+        return strings
+    with zf.open(path) as source:
+        for _, elem in ET.iterparse(source):
+            if elem.tag == S_NS + 'si':
+                strings.append(_rich_text(elem).replace('x005F_', ''))
+                elem.clear()
+    return strings
+
+
+def _rich_text(elem):
+    """与 openpyxl 的 Text.content 相同：直接的 t 加上各个 r 中的 t，不含注音"""
+    parts = []
+    for child in elem:
+        if child.tag == S_NS + 't':
+            parts.append(child.text or '')
+        elif child.tag == S_NS + 'r':
+            t = child.find(S_NS + 't')
+            if t is not None and t.text is not None:
+                parts.append(t.text)
+    return ''.join(parts)
+
+
+def _read_styles(zf, path):
+    """返回 (日期格式的样式编号集合, 时间间隔格式的样式编号集合)"""
+    date_styles, timedelta_styles = set(), set()
+    if path is None:
+        return date_styles, timedelta_styles
+    root = ET.fromstring(zf.read(path))
+    formats = dict(BUILTIN_FORMATS)
+    num_fmts = root.find(S_NS + 'numFmts')
+    if num_fmts is not None:
+        for fmt in num_fmts.iter(S_NS + 'numFmt'):
+            formats[int(fmt.get('numFmtId'))] = fmt.get('formatCode')
+    cell_xfs = root.find(S_NS + 'cellXfs')
+    if cell_xfs is not None:
+        for idx, xf in enumerate(cell_xfs.iter(S_NS + 'xf')):
+            code = formats.get(int(xf.get('numFmtId', 0)))
+            if code is None:
+                continue
+            if is_date_format(code):
+                date_styles.add(idx)
+            if is_timedelta_format(code):
+                timedelta_styles.add(idx)
+    return date_styles, timedelta_styles
+
+
+def _cast_number(value):
+    if '.' in value or 'E' in value or 'e' in value:
+        return float(value)
+    return int(value)
+
+
+class _SheetReader:
+    """按 openpyxl 的规则解析一个工作表中单元格的值"""
+
+    def __init__(self, shared_strings, date_styles, timedelta_styles, epoch):
+        self.shared_strings = shared_strings
+        self.date_styles = date_styles
+        self.timedelta_styles = timedelta_styles
+        self.epoch = epoch
+        self.shared_formulae = {}
+
+    def cell_value(self, c, coordinate):
+        data_type = c.get('t', 'n')
+        style_id = int(c.get('s', 0))
+        formula = c.find(S_NS + 'f')
+        if formula is not None:
+            return self.formula_value(formula, coordinate)
+        if data_type == 'inlineStr':
+            inline = c.find(S_NS + 'is')
+            return _rich_text(inline) if inline is not None else None
+        value = c.findtext(S_NS + 'v') or None
+        if value is None:
+            return None
+        if data_type == 'n':
+            value = _cast_number(value)
+            if style_id in self.date_styles:
+                try:
+                    value = from_excel(value, self.epoch, timedelta=style_id in self.timedelta_styles)
+                except (OverflowError, ValueError):
+                    value = '#VALUE!'
+        elif data_type == 's':
+            value = self.shared_strings[int(value)]
+        elif data_type == 'b':
+            value = bool(int(value))
+        elif data_type == 'd':
+            value = from_ISO8601(value)
+        return value
+
+    def formula_value(self, formula, coordinate):
+        value = '=' + (formula.text or '')
+        if formula.get('t') == 'shared':
+            idx = formula.get('si')
+            if idx in self.shared_formulae:
+                return self.shared_formulae[idx].translate_formula(coordinate)
+            if formula.text is not None:
+                self.shared_formulae[idx] = Translator(value, coordinate)
+        return value
+
+
+def _column_index(letters):
+    index = 0
+    for ch in letters:
+        index = index * 26 + ord(ch) - 64
+    return index
+
+
+def _cell_position(ref):
+    match = _CELL_REF.fullmatch(ref)
+    return int(match.group(2)), _column_index(match.group(1))
+
+
+def _row_cells(row_elem, row_counter):
+    """返回 (行号, [(行号, 列号, 坐标, c 元素)])，row_counter 为上一行的行号"""
+    row_counter = int(row_elem.get('r')) if row_elem.get('r') else row_counter + 1
+    col_counter = 0
+    cells = []
+    for c in row_elem.iterfind(S_NS + 'c'):
+        ref = c.get('r')
+        if ref:
+            row, col = _cell_position(ref)
+            col_counter = col
+        else:
+            col_counter += 1
+            row, col = row_counter, col_counter
+            ref = f'{get_column_letter(col)}{row}'
+        cells.append((row, col, ref, c))
+    return row_counter, cells
+
+
+def _merge_extent(merge_cell):
+    """返回合并区域右下角的 (行号, 列号)，单个单元格的合并区域返回 None"""
+    first, _, last = merge_cell.get('ref', '').partition(':')
+    if last and last != first:
+        return _cell_position(last)
+    return None
+
+
+def _iter_sheet_lines(zf, path, reader, cancel_event):
+    """解析一个工作表，返回每行的文本"""
+    for _, values, max_col in _iter_sheet_rows(zf, path, reader, cancel_event):
+        yield ' '.join(values.get(col, '') for col in range(1, max_col + 1))
+
+
+def _iter_sheet_rows(zf, path, reader, cancel_event):
+    """解析一个工作表，依次返回每行的 (行号, {列号: 文本}, 列数)
+
+    openpyxl 按行号 1..max_row、列号 1..max_column 输出，没有值的单元格（只有样式的单元格、
+    合并区域）也会撑大范围。列数取自 <dimension ref>，没有时先只解析一遍单元格位置；
+    之后每读完一个 </row> 就输出，取消或找够匹配时不必解析完整个工作表。
+    """
+    columns = _dimension_columns(zf, path)
+    if columns is None:
+        columns = _sheet_columns(_iter_sheet_items(zf, path, cancel_event))
+        if _is_cancelled(cancel_event):
+            return
+    for row, values, max_col in _layout_rows(_iter_sheet_items(zf, path, cancel_event), reader, columns):
+        yield row, {col: text for col, (text, _) in values.items()}, max_col
+
+
+def _iter_sheet_items(zf, path, cancel_event):
+    """依次返回工作表中的 ('row', row 元素) 和 ('merge', mergeCell 元素)，row 元素在处理下一项时释放"""
+    sheet_data = None
+    with zf.open(path) as source:
+        for event, elem in ET.iterparse(source, events=('start', 'end')):
+            tag = elem.tag
+            if event == 'start':
+                if tag == S_NS + 'sheetData':
+                    sheet_data = elem
+                continue
+            if tag == S_NS + 'row':
+                yield 'row', elem
+                elem.clear()
+                if sheet_data is not None:
+                    sheet_data.remove(elem)
+                if _is_cancelled(cancel_event):
+                    return
+            elif tag == S_NS + 'mergeCell':
+                yield 'merge', elem
+
+
+def _dimension_ref_columns(ref):
+    """<dimension ref="A1:F100"> 给出的列数；只有一个单元格时（有的程序总是写 A1）不可信，返回 None"""
+    _, _, last = (ref or '').partition(':')
+    match = _CELL_REF.fullmatch(last)
+    return _column_index(match.group(1)) if match else None
+
+
+def _dimension_columns(zf, path):
+    """只读取工作表开头 sheetData 之前的部分，返回 <dimension ref> 给出的列数"""
+    with zf.open(path) as source:
+        for _, elem in ET.iterparse(source, events=('start',)):
+            if elem.tag == S_NS + 'dimension':
+                return _dimension_ref_columns(elem.get('ref'))
+            if elem.tag == S_NS + 'sheetData':
+                return None
+    return None
+
+
+def _sheet_columns(items):
+    """不计算单元格的值，只根据单元格位置和合并区域返回列数"""
+    max_col = 0
+    row_counter = 0
+    for kind, elem in items:
+        if kind == 'row':
+            row_counter, cells = _row_cells(elem, row_counter)
+            for _, col, _, _ in cells:
+                max_col = max(max_col, col)
+        else:
+            extent = _merge_extent(elem)
+            if extent is not None:
+                max_col = max(max_col, extent[1])
+    return max_col
+
+
+def _layout_rows(items, reader, columns):
+    """按 openpyxl 的布局依次返回 (行号, {列号: (文本, c 元素)}, 列数)
+
+    items 为 _iter_sheet_items 返回的各项，columns 为事先得到的列数。空行在遇到下一个有单元格的行时补上，
+    合并区域撑大的行在最后补上。dimension 与实际范围不符时列数与 openpyxl 不同：比实际范围小时
+    列数随读到的单元格增大，不丢掉任何单元格。行号不按顺序时按文件中的顺序输出。
+    """
+    next_row = 1
+    max_row = 0
+    max_col = columns
+    row_counter = 0
+    for kind, elem in items:
+        if kind == 'merge':
+            extent = _merge_extent(elem)
+            if extent is not None:
+                max_row = max(max_row, extent[0])
+                max_col = max(max_col, extent[1])
+            continue
+        row_counter, cells = _row_cells(elem, row_counter)
+        if not cells:
+            continue
+        values = {}
+        for _, col, ref, c in cells:
+            max_col = max(max_col, col)
+            value = reader.cell_value(c, ref)
+            if value is not None:
+                values[col] = (str(value), c)
+        row = cells[-1][0]
+        for empty_row in range(next_row, row):
+            yield empty_row, {}, max_col
+        yield row, values, max_col
+        next_row = max(next_row, row + 1)
+    # openpyxl 对没有单元格的工作表不输出任何行
+    for empty_row in range(next_row, max_row + 1):
+        yield empty_row, {}, max_col
+
+
+def _workbook_sheets(zf):
+    """返回 ([(工作表名称, 路径)], 创建 _SheetReader 的函数)，与 openpyxl 的 wb.worksheets 一样跳过图表工作表"""
+    workbook_path = _main_part(zf, 'xl/workbook.xml')
+    rels = _read_rels(zf, workbook_path)
+    root = ET.fromstring(zf.read(workbook_path))
+
+    workbook_pr = root.find(S_NS + 'workbookPr')
+    date1904 = workbook_pr is not None and workbook_pr.get('date1904') in ('1', 'true')
+    epoch = MAC_EPOCH if date1904 else WINDOWS_EPOCH
+
+    parts = {rel_type.rsplit('/', 1)[-1]: target for rel_type, target in rels.values()}
+    shared_strings = _read_shared_strings(zf, parts.get('sharedStrings'))
+    date_styles, timedelta_styles = _read_styles(zf, parts.get('styles'))
+
+    sheet_entries = []
+    sheets = root.find(S_NS + 'sheets')
+    for sheet in (sheets if sheets is not None else []):
+        rel_type, target = rels.get(sheet.get(R_NS + 'id'), ('', ''))
+        if rel_type.endswith('/worksheet'):
+            sheet_entries.append((sheet.get('name', ''), target))
+    return sheet_entries, lambda: _SheetReader(shared_strings, date_styles, timedelta_styles, epoch)
+
+
+def iter_xlsx_lines(file_path, cancel_event=None):
+    """依次返回每个工作表每一行的文本，单元格之间用空格分隔"""
+    with zipfile.ZipFile(file_path) as zf:
+        sheet_entries, new_reader = _workbook_sheets(zf)
+        for _, path in sheet_entries:
+            yield from _iter_sheet_lines(zf, path, new_reader(), cancel_event)
+            if _is_cancelled(cancel_event):
+                return
+
+
+def iter_xlsx_rows(file_path, cancel_event=None):
+    """依次返回每个工作表每一行的 (工作表名称, 行号, {列号: 文本}, 列数)，与 iter_xlsx_lines 的各行对应"""
+    with zipfile.ZipFile(file_path) as zf:
+        sheet_entries, new_reader = _workbook_sheets(zf)
+        for name, path in sheet_entries:
+            for row, values, max_col in _iter_sheet_rows(zf, path, new_reader(), cancel_event):
+                yield name, row, values, max_col
+            if _is_cancelled(cancel_event):
+                return
@@ -0,0 +1,347 @@
+"""直接修改 .docx/.xlsx 压缩包中 XML 的替换和写回
+
+按 ooxml 中提取器的规则拼出与查找时相同的全文并查找匹配，再把每个匹配映射回产生这段文本的
+节点：docx 中修改 w:t 的文本，xlsx 中把字符串单元格改为内联字符串。跨越段落或单元格的匹配、
+落在数字和公式上的匹配无法对应到可修改的节点，不做替换。
+预览中编辑后的全文也按同样的方式写回：与文件当前的全文比较，只修改有变化的 w:t 或单元格。
+使用 lxml（python-docx 的依赖）读写，保留原有的命名空间前缀和声明。
+没有修改的压缩包成员直接复制压缩后的数据，不解压再压缩；修改过的成员按原来的压缩方式重新压缩，
+压缩级别为 zlib 的默认值，不一定与原来的相同。
+"""
+import os
+import copy
+import shutil
+import struct
+import difflib
+import zipfile
+from bisect import bisect_right
+
+from lxml import etree
+
+from .extractors import READ_CHUNK_SIZE, file_type_of
+from .profiling import PhaseClock
+from .streaming import commit_replace, make_temp_beside
+from .ooxml import (W_NS, S_NS, _RUN_TEXT, _main_part, _dimension_ref_columns, _layout_rows, _sheet_columns,
+                    _workbook_sheets)
+
+XML_SPACE = '{http://www.w3.org/XML/1998/namespace}space'
+
+_PARSER = etree.XMLParser(resolve_entities=False, huge_tree=True)
+
+
+class _TextNode:
+    """docx 中的 w:t，可以放入替换文本"""
+    holds_text = True
+
+    def __init__(self, elem):
+        self.elem = elem
+
+    def replace(self, start, end, replacement):
+        text = self.elem.text or ''
+        self.elem.text = text[:start] + replacement + text[end:]
+        self.elem.set(XML_SPACE, 'preserve')
+
+
+class _CharNode:
+    """docx 中代表一个字符的元素（w:tab、w:br 等），被匹配覆盖时删除"""
+    holds_text = False
+
+    def __init__(self, elem):
+        self.elem = elem
+
+    def replace(self, start, end, replacement):
+        self.elem.getparent().remove(self.elem)
+
+
+class _CellNode:
+    """xlsx 中的字符串单元格，修改后写成内联字符串"""
+    holds_text = True
+
+    def __init__(self, c, value, part):
+        self.c = c
+        self.value = value
+        self.part = part
+        self.changed = False
+
+    def replace(self, start, end, replacement):
+        self.value = self.value[:start] + replacement + self.value[end:]
+        self.changed = True
+
+    def write(self):
+        for child in self.c.findall(S_NS + 'v') + self.c.findall(S_NS + 'is'):
+            self.c.remove(child)
+        self.c.set('t', 'inlineStr')
+        inline = etree.Element(S_NS + 'is')
+        t = etree.SubElement(inline, S_NS + 't')
+        t.text = self.value
+        t.set(XML_SPACE, 'preserve')
+        self.c.insert(0, inline)
+
+
+class _TextMap:
+    """拼接全文，并记录每段文本来自哪个节点；节点为 None 的文本（分隔符、数字等）不能修改"""
+
+    def __init__(self):
+        self.parts = []
+        self.offsets = []
+        self.nodes = []
+        self.length = 0
+
+    def add(self, text, node=None):
+        if not text:
+            return
+        self.parts.append(text)
+        self.offsets.append(self.length)
+        self.nodes.append(node)
+        self.length += len(text)
+
+    def overlapping(self, start, end):
+        """返回与 [start, end) 重叠的段编号；空匹配返回可以插入文本的一段"""
+        i = max(bisect_right(self.offsets, start) - 1, 0)
+        if start == end:
+            for j in (i - 1, i):
+                if 0 <= j < len(self.parts) and self.nodes[j] is not None and self.nodes[j].holds_text \
+                        and self.offsets[j] <= start <= self.offsets[j] + len(self.parts[j]):
+                    return [j]
+            return []
+        indices = []
+        while i < len(self.parts) and self.offsets[i] < end:
+            if self.offsets[i] + len(self.parts[i]) > start:
+                indices.append(i)
+            i += 1
+        return indices
+
+    def text(self):
+        return ''.join(self.parts)
+
+    def apply(self, pattern, replace_term):
+        """在全文中查找并修改对应的节点，返回实际替换的数量"""
+        edits = [(match.start(), match.end(), match.expand(replace_term))
+                 for match in pattern.finditer(self.text())]
+        return self.edit(edits)
+
+    def edit(self, edits):
+        """把全文中的 [start, end) 改为 replacement，edits 按位置排列且互不重叠，返回实际修改的数量"""
+        num_edits = 0
+        # 从后往前修改，前面的修改在节点中的位置不受影响
+        for start, end, replacement in reversed(edits):
+            indices = self.overlapping(start, end)
+            if not indices or any(self.nodes[i] is None for i in indices):
+                continue
+            holder = next((i for i in indices if self.nodes[i].holds_text), None)
+            if holder is None and replacement:
+                continue
+            for i in reversed(indices):
+                offset = self.offsets[i]
+                self.nodes[i].replace(max(start - offset, 0), min(end - offset, len(self.parts[i])),
+                                      replacement if i == holder else '')
+            num_edits += 1
+        return num_edits
+
+
+def _parse(zf, name):
+    return etree.fromstring(zf.read(name), _PARSER).getroottree()
+
+
+def _serialize(tree):
+    docinfo = tree.docinfo
+    return etree.tostring(tree, xml_declaration=True, encoding=docinfo.encoding or 'UTF-8',
+                          standalone=docinfo.standalone)
+
+
+def _add_run(text_map, r):
+    for child in r:
+        tag = child.tag
+        if tag == W_NS + 't':
+            text_map.add(child.text or '', _TextNode(child))
+        elif tag == W_NS + 'br':
+            if child.get(W_NS + 'type', 'textWrapping') == 'textWrapping':
+                text_map.add('\n', _CharNode(child))
+        elif tag in _RUN_TEXT:
+            text_map.add(_RUN_TEXT[tag], _CharNode(child))
+
+
+def _docx_map(zf):
+    """返回 (_TextMap, {成员名: 解析出的 XML})"""
+    name = _main_part(zf, 'word/document.xml')
+    tree = _parse(zf, name)
+    body = tree.getroot().find(W_NS + 'body')
+    text_map = _TextMap()
+    first = True
+    for p in (body.iterfind(W_NS + 'p') if body is not None else ()):
+        if not first:
+            text_map.add('\n')
+        first = False
+        for child in p:
+            if child.tag == W_NS + 'r':
+                _add_run(text_map, child)
+            elif child.tag == W_NS + 'hyperlink':
+                for r in child.iterfind(W_NS + 'r'):
+                    _add_run(text_map, r)
+    return text_map, {name: tree}
+
+
+def _add_sheet(text_map, path, tree, reader, first_line):
+    """按 _iter_sheet_lines 的布局加入一个工作表，first_line 表示还没有输出过任何行，返回新的 first_line"""
+    root = tree.getroot()
+    sheet_data = root.find(S_NS + 'sheetData')
+    merge_cells = root.find(S_NS + 'mergeCells')
+    items = [('row', row_elem) for row_elem in (sheet_data.iterfind(S_NS + 'row') if sheet_data is not None else ())]
+    items += [('merge', merge_cell)
+              for merge_cell in (merge_cells.iterfind(S_NS + 'mergeCell') if merge_cells is not None else ())]
+    dimension = root.find(S_NS + 'dimension')
+    columns = _dimension_ref_columns(dimension.get('ref')) if dimension is not None else None
+    if columns is None:
+        columns = _sheet_columns(items)
+    for _, values, max_col in _layout_rows(items, reader, columns):
+        if not first_line:
+            text_map.add('\n')
+        first_line = False
+        for col in range(1, max_col + 1):
+            if col > 1:
+                text_map.add(' ')
+            value, c = values.get(col, ('', None))
+            # 只有不带公式的字符串单元格可以修改
+            editable = c is not None and c.get('t') in ('s', 'inlineStr') and c.find(S_NS + 'f') is None
+            text_map.add(value, _CellNode(c, value, path) if editable else None)
+    return first_line
+
+
+def _xlsx_map(zf):
+    """返回 (_TextMap, {成员名: 解析出的 XML})"""
+    sheet_entries, new_reader = _workbook_sheets(zf)
+    text_map = _TextMap()
+    trees = {}
+    first_line = True
+    for _, path in sheet_entries:
+        trees[path] = _parse(zf, path)
+        first_line = _add_sheet(text_map, path, trees[path], new_reader(), first_line)
+    return text_map, trees
+
+
+def _text_map(zf, file_type):
+    return _docx_map(zf) if file_type == 'docx' else _xlsx_map(zf)
+
+
+def _changed_parts(text_map, trees, file_type):
+    """返回修改后的 {成员名: 新内容}：docx 写出正文，xlsx 只写出有单元格被修改的工作表"""
+    if file_type == 'docx':
+        return {path: _serialize(tree) for path, tree in trees.items()}
+    changed = set()
+    for node in text_map.nodes:
+        if isinstance(node, _CellNode) and node.changed:
+            node.write()
+            changed.add(node.part)
+    return {path: _serialize(trees[path]) for path in changed}
+
+
+def _text_edits(old, new):
+    """把 old 改为 new 的 [(start, end, replacement)]；先去掉相同的开头和结尾，只逐字比较中间变化的部分"""
+    prefix = len(os.path.commonprefix([old, new]))
+    suffix = min(len(os.path.commonprefix([old[::-1], new[::-1]])), len(old) - prefix, len(new) - prefix)
+    a, b = old[prefix:len(old) - suffix], new[prefix:len(new) - suffix]
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    return [(prefix + i1, prefix + i2, b[j1:j2])
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal']
+
+
+def _copy_raw(source, info, out):
+    """把成员压缩后的数据原样写入 out，返回是否已复制；加密、超过 4 GB 或本地文件头不对时返回 False
+
+    zipfile 没有公开的接口，这里按 ZipFile.writestr 的做法直接写 out.fp 并登记成员信息。
+    """
+    if info.flag_bits & 0x1 or max(info.file_size, info.compress_size) > zipfile.ZIP64_LIMIT:
+        return False
+    source.seek(info.header_offset)
+    header = source.read(zipfile.sizeFileHeader)
+    if len(header) != zipfile.sizeFileHeader:
+        return False
+    fields = struct.unpack(zipfile.structFileHeader, header)
+    if fields[0] != zipfile.stringFileHeader:
+        return False
+    # 跳过本地文件头中的文件名和扩展字段
+    source.seek(fields[10] + fields[11], os.SEEK_CUR)
+    out_info = copy.copy(info)
+    # 大小和 CRC 直接写在本地文件头中，不需要数据描述符
+    out_info.flag_bits &= ~0x08
+    out_info.header_offset = out.fp.tell()
+    out.fp.write(out_info.FileHeader(False))
+    remaining = info.compress_size
+    while remaining:
+        chunk = source.read(min(remaining, READ_CHUNK_SIZE))
+        if not chunk:
+            raise zipfile.BadZipFile(f"压缩包成员不完整: {info.filename}")
+        out.fp.write(chunk)
+        remaining -= len(chunk)
+    out.filelist.append(out_info)
+    out.NameToInfo[out_info.filename] = out_info
+    out.start_dir = out.fp.tell()
+    return True
+
+
+def _write_package(file_path, zf, replaced):
+    """把修改后的压缩包写到同一目录下的临时文件并 fsync，返回临时文件路径"""
+    fd, temp_path = make_temp_beside(file_path)
+    try:
+        with open(fd, 'wb') as raw, open(file_path, 'rb') as source:
+            with zipfile.ZipFile(raw, 'w') as out:
+                for info in zf.infolist():
+                    # 复制 ZipInfo，保留压缩方式、时间和属性，不改动源压缩包的成员信息
+                    out_info = copy.copy(info)
+                    if info.filename in replaced:
+                        out.writestr(out_info, replaced[info.filename])
+                        continue
+                    if _copy_raw(source, info, out):
+                        continue
+                    with zf.open(info) as src, out.open(out_info, 'w') as dst:
+                        shutil.copyfileobj(src, dst)
+            raw.flush()
+            os.fsync(raw.fileno())
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return temp_path
+
+
+def replace_office(file_path, pattern, replace_term, cache=None, timings=None, dry_run=False):
+    """替换 .docx/.xlsx 中的文本，结果写到同一目录下的临时文件，返回 (temp_path, num_subs)
+
+    没有替换时返回 (None, 0)；dry_run 为 True 时只在内存中替换并统计，不写文件，返回 (None, num_subs)。
+    给出 cache 且缓存的文本中没有匹配时不解析文件。
+    给出 timings 时把解析（extract）、查找替换（match）和写出（write）的耗时累加进去。
+    """
+    clock = PhaseClock(timings)
+    if cache is not None:
+        text = cache.get(file_path)
+        if text is not None and pattern.search(text) is None:
+            return None, 0
+    file_type = file_type_of(file_path)
+    with zipfile.ZipFile(file_path) as zf:
+        text_map, trees = _text_map(zf, file_type)
+        clock.lap('extract')
+        num_subs = text_map.apply(pattern, replace_term)
+        clock.lap('match')
+        if num_subs == 0 or dry_run:
+            return None, num_subs
+        temp_path = _write_package(file_path, zf, _changed_parts(text_map, trees, file_type))
+        clock.lap('write')
+        return temp_path, num_subs
+
+
+def write_office_text(file_path, content):
+    """把编辑后的全文写回 .docx/.xlsx，只修改有变化的 w:t 或单元格，返回修改的处数
+
+    有修改无法对应到可修改的节点（跨越段落或单元格、落在数字或公式上）时抛出 ValueError，不修改文件。
+    """
+    file_type = file_type_of(file_path)
+    with zipfile.ZipFile(file_path) as zf:
+        text_map, trees = _text_map(zf, file_type)
+        edits = _text_edits(text_map.text(), content)
+        if not edits:
+            return 0
+        num_edits = text_map.edit(edits)
+        if num_edits < len(edits):
+            raise ValueError(f"有 {len(edits) - num_edits} 处修改跨越段落或单元格，或落在数字、公式上，无法写回")
+        temp_path = _write_package(file_path, zf, _changed_parts(text_map, trees, file_type))
+    commit_replace(file_path, temp_path)
+    return num_edits
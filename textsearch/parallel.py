@@ -0,0 +1,221 @@
+"""Office 文件的多进程解析
+
+python-docx 和 openpyxl 都是纯 Python 实现，受 GIL 限制无法用线程加速，
+因此把 .docx/.xlsx 按块分发到进程池，子进程只把匹配数或文本传回父进程。
+子进程意外退出（例如解析大表格时内存不足）时，这一块中的文件作为读取失败的文件返回，进程池下次使用时重建。
+"""
+import os
+import time
+from concurrent.futures import wait, FIRST_COMPLETED, BrokenExecutor
+
+from .archives import archive_kind, count_archive
+from .extractors import read_file, file_type_of, is_cancelled
+from .multiterm import match_counter
+from .profiling import PhaseClock
+from .streaming import count_office_matches
+
+DEFAULT_CHUNK_SIZE = 4
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def _timings():
+    """子进程中一个文件的计时，带上开始时间和进程号，父进程据此画出 trace"""
+    return {'start': time.time(), 'pid': os.getpid()}
+
+
+def count_chunk(file_paths, pattern, encoding, cache=None, limit=None, members=None):
+    """子进程：统计一组文件的匹配数，返回 [(file_path, count, size, error, timings)]
+
+    给出 limit 时每个文件最多数 limit 个匹配；没有缓存的文件边解析边查找，数够了就不再解析。
+    给出 members（archives.MemberFilter）时压缩包返回其中每个文件的结果，file_path 为虚拟路径。
+    """
+    results = []
+    for file_path in file_paths:
+        if members is not None and archive_kind(file_path):
+            results.extend((path, count, size, None if error is None else str(error), timings)
+                           for path, count, size, error, timings
+                           in count_archive(file_path, pattern, encoding, members, limit=limit))
+            continue
+        timings = _timings()
+        clock = PhaseClock(timings)
+        try:
+            content = cache.get(file_path) if cache is not None else None
+            if content is None and limit is not None:
+                # 只解析了一部分，不写入缓存
+                count = count_office_matches(file_path, pattern, timings=timings, limit=limit)
+            else:
+                if content is None:
+                    content, _ = read_file(file_path, encoding, cache=cache)
+                clock.lap('extract')
+                counter = match_counter(pattern)
+                for match in pattern.finditer(content):
+                    counter.add(match)
+                    if counter.total == limit:
+                        break
+                count = counter.result()
+                clock.lap('match')
+            results.append((file_path, count, os.path.getsize(file_path), None, timings))
+        except Exception as e:
+            # 异常对象不一定能序列化，只传回错误信息
+            results.append((file_path, 0, 0, str(e), timings))
+    return results
+
+
+def count_chunk_failed(file_path, error):
+    """整块失败时 count_chunk 中一个文件的结果"""
+    return file_path, 0, 0, error, _timings()
+
+
+def replace_chunk(file_paths, pattern, replace_term, cache=None, dry_run=False):
+    """子进程：直接修改一组 Office 文件的 XML，只传回有替换的文件
+
+    返回 [(file_path, file_type, temp_path, num_subs, error, timings)]，替换结果在临时文件中。
+    没有替换的文件只传回计时：temp_path 为 None，num_subs 为 0。dry_run 为 True 时只统计，不写临时文件。
+    """
+    from .ooxml_replace import replace_office
+    results = []
+    for file_path in file_paths:
+        timings = _timings()
+        try:
+            temp_path, num_subs = replace_office(file_path, pattern, replace_term, cache, timings, dry_run)
+            results.append((file_path, file_type_of(file_path), temp_path, num_subs, None, timings))
+        except Exception as e:
+            results.append((file_path, None, None, 0, str(e), timings))
+    return results
+
+
+def replace_chunk_failed(file_path, error):
+    """整块失败时 replace_chunk 中一个文件的结果"""
+    return file_path, None, None, 0, error, _timings()
+
+
+class ExtractPool:
+    """可复用的解析进程池，第一次使用时才启动子进程"""
+
+    def __init__(self, max_workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.max_workers = max_workers or default_workers()
+        self.chunk_size = max(1, chunk_size)
+        self._executor = None
+
+    def configure(self, max_workers, chunk_size):
+        """修改进程数和块大小，进程数变化时重建进程池"""
+        max_workers = max_workers or default_workers()
+        if max_workers != self.max_workers:
+            self.shutdown()
+            self.max_workers = max_workers
+        self.chunk_size = max(1, chunk_size)
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            # 第一次提交时才导入，只查找纯文本文件时不加载 multiprocessing
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # 界面进程中有多个线程，使用 spawn 避免 fork 带来的死锁
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def tasks(self, fn, *args, cancel_event=None, failed=None):
+        """failed(file_path, error) 返回整块失败时一个文件的结果，error 为错误信息"""
+        return ChunkedTasks(self, fn, args, cancel_event, failed)
+
+    def discard(self, executor):
+        """丢弃已经损坏（有子进程意外退出）的进程池，下次使用时重建"""
+        if self._executor is executor:
+            self.shutdown()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class ChunkedTasks:
+    """把逐个到来的文件路径攒成块提交到进程池，并限制在途的块数
+
+    add() 和 finish() 返回已经完成的单个文件结果。一块失败（子进程退出、参数无法序列化）时
+    用 failed 为其中每个文件生成读取失败的结果，不把异常抛给调用方。
+    """
+
+    def __init__(self, pool, fn, args, cancel_event=None, failed=None):
+        self.pool = pool
+        self.fn = fn
+        self.args = args
+        self.cancel_event = cancel_event
+        self.failed = failed
+        self.pending_paths = []
+        # future -> (提交到的进程池, 这一块的文件)
+        self.futures = {}
+        self.max_in_flight = pool.max_workers * 2
+
+    def add(self, file_path):
+        self.pending_paths.append(file_path)
+        if len(self.pending_paths) < self.pool.chunk_size:
+            return self.collect(block=False)
+        self.submit()
+        # 在途块过多时等待，避免遍历远远跑在解析前面
+        return self.collect(block=len(self.futures) >= self.max_in_flight)
+
+    def submit(self):
+        if not self.pending_paths:
+            return
+        executor = self.pool.executor
+        try:
+            future = executor.submit(self.fn, self.pending_paths, *self.args)
+        except BrokenExecutor:
+            # 之前的块已经让进程池损坏，换一个新的进程池再提交
+            self.pool.discard(executor)
+            executor = self.pool.executor
+            future = executor.submit(self.fn, self.pending_paths, *self.args)
+        self.futures[future] = (executor, self.pending_paths)
+        self.pending_paths = []
+
+    def _wait(self, timeout):
+        done, _ = wait(self.futures, timeout=timeout, return_when=FIRST_COMPLETED)
+        return done
+
+    def _results(self, future):
+        executor, file_paths = self.futures.pop(future)
+        try:
+            return future.result()
+        except BrokenExecutor as e:
+            self.pool.discard(executor)
+            error = f"解析进程意外退出（可能内存不足）: {e}"
+        except Exception as e:
+            if self.failed is None:
+                raise
+            error = str(e)
+        if self.failed is None:
+            raise RuntimeError(error)
+        return [self.failed(file_path, error) for file_path in file_paths]
+
+    def collect(self, block):
+        if not self.futures:
+            return []
+        done = self._wait(0)
+        while block and not done and not is_cancelled(self.cancel_event):
+            done = self._wait(0.05)
+        results = []
+        for future in done:
+            results.extend(self._results(future))
+        return results
+
+    def finish(self):
+        """提交剩余文件并依次返回全部结果；取消时放弃尚未完成的块"""
+        self.submit()
+        while self.futures:
+            if is_cancelled(self.cancel_event):
+                self.cancel()
+                return
+            for future in self._wait(0.05):
+                yield from self._results(future)
+
+    def cancel(self):
+        for future in self.futures:
+            future.cancel()
+        self.futures = {}
+        self.pending_paths = []
@@ -0,0 +1,180 @@
+"""预览用的匹配位置和大文件分页
+
+匹配位置保存在两个 array('q') 中，不为每个匹配创建对象。超过阈值的文件只把当前匹配
+所在的一页（或跨页时的两页）交给编辑框，纯文本文件按页记录读取位置，翻页时直接定位读取。
+大的纯文本文件可以先用 open_text_file 显示第一页，再由 scan_text_file 在后台分批补上匹配和分页位置。
+"""
+import time
+from array import array
+from bisect import bisect_right
+
+from .extractors import READ_CHUNK_SIZE, is_cancelled
+from .streaming import iter_stream_matches
+
+# 超过这个大小的纯文本文件、超过这么多字符的 Office 文本使用分页预览
+PAGED_PREVIEW_BYTES = 4 * 1024 * 1024
+PAGED_PREVIEW_CHARS = 4 * 1024 * 1024
+# 每页的字符数，纯文本文件按读取块分页
+PAGE_CHARS = READ_CHUNK_SIZE
+
+
+def find_match_offsets(pattern, content, cancel_event=None, limit=None):
+    """返回 (starts, ends) 两个 array('q')；给出 limit 时最多记录 limit 个匹配"""
+    starts, ends = array('q'), array('q')
+    for match in pattern.finditer(content):
+        starts.append(match.start())
+        ends.append(match.end())
+        if len(starts) == limit:
+            break
+        if len(starts) % 1024 == 0 and is_cancelled(cancel_event):
+            break
+    return starts, ends
+
+
+def find_stream_offsets(file, pattern, cancel_event=None, limit=None):
+    """分块查找，返回 (starts, ends)；给出 limit 时找到 limit 个匹配就停止读取"""
+    starts, ends = array('q'), array('q')
+    offset = 0
+    for text, match in iter_stream_matches(file, pattern, cancel_event):
+        offset += len(text)
+        if match is not None:
+            starts.append(offset)
+            offset += match.end() - match.start()
+            ends.append(offset)
+            if len(starts) == limit:
+                break
+    return starts, ends
+
+
+class _CheckpointReader:
+    """记录每次 read 之前的字符位置和 tell()，以便之后按页定位"""
+
+    def __init__(self, file):
+        self.file = file
+        self.chars = 0
+        self.checkpoints = []
+
+    def read(self, size):
+        position = (self.chars, self.file.tell())
+        chunk = self.file.read(size)
+        # 读到文件末尾的那次读取不算一页
+        if chunk:
+            self.checkpoints.append(position)
+        self.chars += len(chunk)
+        return chunk
+
+
+def _read_chunks(reader):
+    while True:
+        chunk = reader.read(PAGE_CHARS)
+        if not chunk:
+            return
+        yield chunk, None
+
+
+def scan_text_file(file_path, encoding, pattern=None, cancel_event=None, batch_seconds=None):
+    """分块查找纯文本文件，分批返回 (starts, ends, checkpoints, 已读字符数, 是否读完)
+
+    每批只包含新找到的匹配和新的分页位置，第一页的位置 (0, 0) 不在其中；
+    给出 batch_seconds 时每读完一块、距上一批超过这么多秒就返回一批，否则只在读完时返回一批。
+    """
+    with open(file_path, 'r', encoding=encoding, errors='ignore') as file:
+        reader = _CheckpointReader(file)
+        pieces = iter_stream_matches(reader, pattern, cancel_event) if pattern is not None else _read_chunks(reader)
+        starts, ends = array('q'), array('q')
+        offset = 0
+        sent = 1
+        last_batch = time.monotonic()
+        for text, match in pieces:
+            offset += len(text)
+            if match is not None:
+                starts.append(offset)
+                offset += match.end() - match.start()
+                ends.append(offset)
+            if batch_seconds is not None and len(reader.checkpoints) > sent:
+                now = time.monotonic()
+                if now - last_batch >= batch_seconds:
+                    yield starts, ends, reader.checkpoints[sent:], reader.chars, False
+                    sent = len(reader.checkpoints)
+                    starts, ends = array('q'), array('q')
+                    last_batch = now
+        yield starts, ends, reader.checkpoints[sent:], reader.chars, True
+
+
+class PreviewText:
+    """预览文本和匹配位置；paged 为 True 时只按页加载"""
+
+    def __init__(self, starts, ends, length, content=None, file_path=None, encoding=None, checkpoints=None):
+        self.starts = starts
+        self.ends = ends
+        self.length = length
+        self.content = content
+        self.file_path = file_path
+        self.encoding = encoding
+        self.checkpoints = checkpoints
+        self.page_offsets = [cp[0] for cp in checkpoints] if checkpoints is not None else None
+        self.paged = checkpoints is not None or length > PAGED_PREVIEW_CHARS
+        # 分页位置和匹配是否已经全部找到，后台查找期间为 False
+        self.complete = True
+
+    @classmethod
+    def from_string(cls, content, pattern=None):
+        starts, ends = find_match_offsets(pattern, content) if pattern else (array('q'), array('q'))
+        return cls(starts, ends, len(content), content=content)
+
+    @classmethod
+    def from_text_file(cls, file_path, encoding, pattern=None, cancel_event=None):
+        """分块查找纯文本文件，同时记录每页的读取位置，不把文件读入内存"""
+        preview = cls.open_text_file(file_path, encoding)
+        for batch in scan_text_file(file_path, encoding, pattern, cancel_event):
+            preview.add_scan(*batch)
+        return preview
+
+    @classmethod
+    def open_text_file(cls, file_path, encoding):
+        """只知道第一页位置的分页预览，之后用 scan_text_file 的结果调用 add_scan 补全"""
+        preview = cls(array('q'), array('q'), 0, file_path=file_path, encoding=encoding, checkpoints=[(0, 0)])
+        preview.complete = False
+        return preview
+
+    def add_scan(self, starts, ends, checkpoints, length, done):
+        """追加 scan_text_file 返回的一批结果"""
+        self.starts.extend(starts)
+        self.ends.extend(ends)
+        self.checkpoints.extend(checkpoints)
+        self.page_offsets.extend(cp[0] for cp in checkpoints)
+        self.length = length
+        self.complete = done
+
+    def page_count(self):
+        if self.checkpoints is not None:
+            return len(self.checkpoints)
+        return max(1, -(-self.length // PAGE_CHARS))
+
+    def page_of(self, offset):
+        if self.checkpoints is not None:
+            return max(0, bisect_right(self.page_offsets, offset) - 1)
+        return min(offset // PAGE_CHARS, self.page_count() - 1)
+
+    def load_pages(self, first, last):
+        """返回 (起始位置, 文本)，包含第 first 到第 last 页"""
+        if self.checkpoints is None:
+            start = first * PAGE_CHARS
+            return start, self.content[start:(last + 1) * PAGE_CHARS]
+        start, cookie = self.checkpoints[first]
+        with open(self.file_path, 'r', encoding=self.encoding, errors='ignore') as file:
+            file.seek(cookie)
+            parts = [file.read(PAGE_CHARS) for _ in range(first, last + 1)]
+        return start, ''.join(parts)
+
+    def window_for(self, start, end):
+        """返回包含 [start, end) 的页范围 (first, last)"""
+        return self.page_of(start), self.page_of(max(start, end - 1))
+
+    def matches_between(self, start, end, limit):
+        """返回与 [start, end) 有重叠的匹配编号范围，最多 limit 个"""
+        first = bisect_right(self.ends, start)
+        last = first
+        while last < len(self.starts) and self.starts[last] < end and last - first < limit:
+            last += 1
+        return range(first, last)
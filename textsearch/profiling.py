@@ -0,0 +1,231 @@
+"""查找和替换的逐文件、逐阶段计时
+
+每个文件记录 stat、read、extract、match、write 各阶段的耗时，以及读取的字节数、格式和错误；
+遍历文件夹的耗时单独累计。
+可以汇总为状态栏中的一行文字、最慢的 N 个文件和按格式的统计，也可以导出为 JSON 或
+Chrome trace（在 chrome://tracing 或 Perfetto 中打开）。
+纯文本文件分块读取时读取和匹配交替进行，各自累计耗时，在 trace 中按先后排列。
+"""
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+PHASES = ('stat', 'read', 'extract', 'match', 'write')
+
+
+class TimedReader:
+    """包装文本文件对象，累计 read() 的耗时（包含解码）"""
+
+    def __init__(self, file):
+        self.file = file
+        self.seconds = 0.0
+
+    def read(self, size):
+        started = time.perf_counter()
+        chunk = self.file.read(size)
+        self.seconds += time.perf_counter() - started
+        return chunk
+
+
+class PhaseClock:
+    """把两次 lap() 之间的耗时累加到 timings[阶段] 中；timings 为 None 时不计时"""
+
+    def __init__(self, timings):
+        self.timings = timings
+        self.last = time.perf_counter() if timings is not None else None
+
+    def lap(self, name):
+        if self.timings is None:
+            return
+        now = time.perf_counter()
+        self.timings[name] = self.timings.get(name, 0.0) + now - self.last
+        self.last = now
+
+
+class FileProfile:
+    """一个文件的计时"""
+
+    def __init__(self, profiler, file_path, file_type, pid=None, tid=None):
+        self.profiler = profiler
+        self.file_path = file_path
+        self.file_type = file_type
+        self.started = time.time()
+        self.pid = pid if pid is not None else os.getpid()
+        self.tid = tid if tid is not None else threading.get_ident()
+        # [(阶段, 开始时间, 秒数)]
+        self.spans = []
+        self.size = 0
+        self.error = None
+        self._cursor = self.started
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        wall = time.time()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started, wall)
+
+    def add(self, name, seconds, start=None):
+        """记录一个阶段；没有给出开始时间时接在上一个阶段之后"""
+        if start is None:
+            start = self._cursor
+        self.spans.append((name, start, seconds))
+        self._cursor = start + seconds
+
+    def add_timings(self, timings):
+        """记录 {阶段: 秒数}，例如子进程或分块读取累计的耗时"""
+        for name in PHASES:
+            if timings.get(name):
+                self.add(name, timings[name])
+
+    def total(self):
+        return sum(seconds for _, _, seconds in self.spans)
+
+    def phase_totals(self):
+        totals = {}
+        for name, _, seconds in self.spans:
+            totals[name] = totals.get(name, 0.0) + seconds
+        return totals
+
+    def finish(self, size=0, error=None):
+        self.size = size
+        self.error = None if error is None else str(error)
+        self.profiler._add(self)
+
+    def to_dict(self):
+        return {
+            'path': self.file_path,
+            'format': self.file_type,
+            'start': self.started,
+            'seconds': round(self.total(), 6),
+            'bytes': self.size,
+            'error': self.error,
+            'phases': {name: round(seconds, 6) for name, seconds in self.phase_totals().items()},
+        }
+
+
+class Profiler:
+    """收集一次查找或替换中所有文件的计时，可以在多个线程中同时使用"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.files = []
+        # 遍历文件夹（取下一个路径）累计的秒数
+        self.walk_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def walk(self, file_paths):
+        """包装遍历文件夹的迭代器，累计其耗时"""
+        iterator = iter(file_paths)
+        while True:
+            started = time.perf_counter()
+            try:
+                file_path = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.walk_seconds += time.perf_counter() - started
+            yield file_path
+
+    def file(self, file_path, file_type, pid=None, tid=None):
+        return FileProfile(self, file_path, file_type, pid, tid)
+
+    def record(self, file_path, file_type, timings, size=0, error=None):
+        """记录子进程传回的计时：timings 为 {阶段: 秒数}，可以带 'start'、'pid'"""
+        profile = self.file(file_path, file_type, timings.get('pid'), timings.get('pid'))
+        if 'start' in timings:
+            profile.started = profile._cursor = timings['start']
+        profile.add_timings(timings)
+        profile.finish(size, error)
+
+    def _add(self, profile):
+        with self._lock:
+            self.files.append(profile)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.files)
+
+    def phase_totals(self):
+        totals = dict.fromkeys(PHASES, 0.0)
+        for profile in self.snapshot():
+            for name, seconds in profile.phase_totals().items():
+                totals[name] = totals.get(name, 0.0) + seconds
+        return totals
+
+    def by_format(self):
+        """返回 {格式: {'files', 'seconds', 'bytes', 'errors', 'phases'}}"""
+        formats = {}
+        for profile in self.snapshot():
+            entry = formats.setdefault(profile.file_type, {'files': 0, 'seconds': 0.0, 'bytes': 0, 'errors': 0,
+                                                           'phases': {}})
+            entry['files'] += 1
+            entry['seconds'] += profile.total()
+            entry['bytes'] += profile.size
+            entry['errors'] += profile.error is not None
+            for name, seconds in profile.phase_totals().items():
+                entry['phases'][name] = entry['phases'].get(name, 0.0) + seconds
+        return formats
+
+    def slowest(self, n=20):
+        return sorted(self.snapshot(), key=lambda p: p.total(), reverse=True)[:n]
+
+    def summary(self):
+        files = self.snapshot()
+        errors = sum(p.error is not None for p in files)
+        phases = '，'.join(f"{name} {seconds:.2f} 秒" for name, seconds in self.phase_totals().items() if seconds)
+        return f"计时：遍历 {self.walk_seconds:.2f} 秒，{len(files)} 个文件，{phases or '无'}，出错 {errors} 个"
+
+    def report(self, n=20):
+        """最慢的 n 个文件和按格式的统计，多行文字"""
+        lines = [self.summary(), '', f'最慢的 {n} 个文件：']
+        for profile in self.slowest(n):
+            phases = '，'.join(f"{name} {seconds * 1000:.0f}" for name, seconds in profile.phase_totals().items())
+            error = f"，出错：{profile.error}" if profile.error is not None else ''
+            lines.append(f"  {profile.total() * 1000:8.0f} ms  {profile.file_path}（{phases}{error}）")
+        lines += ['', '按格式统计：']
+        for file_type, entry in sorted(self.by_format().items(), key=lambda item: -item[1]['seconds']):
+            mb = entry['bytes'] / (1024 * 1024)
+            phases = '，'.join(f"{name} {seconds:.2f} 秒" for name, seconds in entry['phases'].items())
+            lines.append(f"  {file_type}：{entry['files']} 个文件，{entry['seconds']:.2f} 秒，{mb:.1f} MB，"
+                         f"出错 {entry['errors']} 个（{phases}）")
+        return '\n'.join(lines)
+
+    def to_dict(self):
+        return {
+            'started': self.started,
+            'walk_seconds': round(self.walk_seconds, 6),
+            'phases': {name: round(seconds, 6) for name, seconds in self.phase_totals().items()},
+            'formats': self.by_format(),
+            'files': [p.to_dict() for p in self.snapshot()],
+        }
+
+    def chrome_trace(self):
+        """Chrome trace 格式：每个阶段一个完整事件（ph 'X'），时间单位为微秒"""
+        events = []
+        for profile in self.snapshot():
+            args = {'path': profile.file_path, 'format': profile.file_type, 'bytes': profile.size}
+            if profile.error is not None:
+                args['error'] = profile.error
+            for name, start, seconds in profile.spans:
+                events.append({
+                    'name': name,
+                    'cat': profile.file_type,
+                    'ph': 'X',
+                    'ts': round((start - self.started) * 1e6, 1),
+                    'dur': round(seconds * 1e6, 1),
+                    'pid': profile.pid,
+                    'tid': profile.tid,
+                    'args': args,
+                })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export(self, path, fmt='json'):
+        """fmt 为 'json' 或 'chrome'"""
+        data = self.chrome_trace() if fmt == 'chrome' else self.to_dict()
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(data, file, ensure_ascii=False)
@@ -0,0 +1,211 @@
+"""查找结果的紧凑存储、排序筛选和上下文片段
+
+结果按列保存：路径拆成目录表中的编号和文件名，匹配数、格式和第一个匹配的位置各存一个 array，
+几十万条结果也不为每条创建对象。排序和筛选只重排一个行号数组，不复制结果本身。
+上下文片段只在需要显示时生成，见 first_match_context。
+"""
+import io
+from array import array
+
+from .archives import is_virtual, open_member_source
+from .extractors import file_type_of
+from .locations import OffsetMap, cached_text_map, open_located_text
+from .multiterm import TermCounts
+from .sniff import file_encoding
+from .streaming import iter_stream_matches
+
+FORMATS = ('text', 'docx', 'xlsx')
+
+# 排序方式：查找顺序、路径、匹配数（从多到少）、格式
+SORT_NONE = 'none'
+SORT_PATH = 'path'
+SORT_COUNT = 'count'
+SORT_FORMAT = 'format'
+
+# 上下文片段中匹配前后各保留的字符数
+SNIPPET_WIDTH = 40
+
+
+class ResultStore:
+    """按列保存的查找结果，行号即追加的顺序"""
+
+    def __init__(self):
+        self.dirs = []
+        self._dir_ids = {}
+        self.dir_ids = array('l')
+        self.names = []
+        self.counts = array('q')
+        self.formats = array('b')
+        # 第一个匹配在提取出的文本中的位置，-1 表示还没有读取
+        self.first_offsets = array('q')
+        # 多关键字查找时各行的 {关键字: 匹配数}
+        self.terms = {}
+
+    def __len__(self):
+        return len(self.counts)
+
+    def append(self, file_path, count):
+        """追加一行，返回行号"""
+        # 在最后一个分隔符之后切开，目录和文件名拼起来就是原路径
+        cut = max(file_path.rfind('/'), file_path.rfind('\\')) + 1
+        directory, name = file_path[:cut], file_path[cut:]
+        dir_id = self._dir_ids.get(directory)
+        if dir_id is None:
+            dir_id = self._dir_ids[directory] = len(self.dirs)
+            self.dirs.append(directory)
+        row = len(self.counts)
+        self.dir_ids.append(dir_id)
+        self.names.append(name)
+        self.counts.append(count)
+        self.formats.append(FORMATS.index(file_type_of(file_path)))
+        self.first_offsets.append(-1)
+        if isinstance(count, TermCounts):
+            self.terms[row] = count.counts
+        return row
+
+    def path(self, row):
+        return self.dirs[self.dir_ids[row]] + self.names[row]
+
+    def count(self, row):
+        """匹配数；多关键字查找时为 TermCounts"""
+        counts = self.terms.get(row)
+        return TermCounts(counts) if counts is not None else self.counts[row]
+
+    def file_type(self, row):
+        return FORMATS[self.formats[row]]
+
+    def find(self, file_path):
+        """返回路径所在的行号，没有时返回 -1"""
+        for row in range(len(self)):
+            if self.path(row) == file_path:
+                return row
+        return -1
+
+    def entries(self):
+        """所有 (路径, 匹配数)，用于比较两次查找的结果"""
+        return [(self.path(row), self.counts[row]) for row in range(len(self))]
+
+
+class ResultView:
+    """结果的显示顺序：按条件筛选、排序后的行号；没有筛选和排序时不建立行号数组"""
+
+    def __init__(self, store):
+        self.store = store
+        self.text = ''
+        self.min_count = 0
+        self.file_type = None
+        self.sort = SORT_NONE
+        # None 表示按追加顺序显示全部行，shown 为已显示的行数
+        self.order = None
+        self.shown = 0
+
+    def __len__(self):
+        return self.shown if self.order is None else len(self.order)
+
+    def row_at(self, position):
+        return position if self.order is None else self.order[position]
+
+    def position_of(self, row):
+        if self.order is None:
+            return row if row < self.shown else -1
+        for position, r in enumerate(self.order):
+            if r == row:
+                return position
+        return -1
+
+    def accepts(self, row):
+        store = self.store
+        if store.counts[row] < self.min_count:
+            return False
+        if self.file_type is not None and store.formats[row] != FORMATS.index(self.file_type):
+            return False
+        return not self.text or self.text in store.path(row).lower()
+
+    def is_identity(self):
+        return not self.text and not self.min_count and self.file_type is None and self.sort == SORT_NONE
+
+    def accepted(self, rows):
+        """rows 中符合筛选条件、可以追加显示的行"""
+        if self.order is None:
+            return rows
+        return [row for row in rows if self.accepts(row)]
+
+    def show(self, rows):
+        """追加显示新的行；排序时新行先排在末尾，调用 update() 后重新排序"""
+        if self.order is None:
+            self.shown += len(rows)
+        else:
+            self.order.extend(rows)
+
+    def configure(self, text='', min_count=0, file_type=None, sort=SORT_NONE):
+        self.text = text.lower()
+        self.min_count = min_count
+        self.file_type = file_type
+        self.sort = sort
+        self.update()
+
+    def update(self):
+        """按当前条件重新筛选和排序全部行"""
+        store = self.store
+        if self.is_identity():
+            self.order = None
+            self.shown = len(store)
+            return
+        order = array('l', (row for row in range(len(store)) if self.accepts(row)))
+        if self.sort == SORT_PATH:
+            order = array('l', sorted(order, key=store.path))
+        elif self.sort == SORT_COUNT:
+            order = array('l', sorted(order, key=lambda row: -store.counts[row]))
+        elif self.sort == SORT_FORMAT:
+            order = array('l', sorted(order, key=lambda row: (store.formats[row], store.path(row))))
+        self.order = order
+
+
+def _one_line(text):
+    return text.replace('\r', ' ').replace('\n', ' ').replace('\t', ' ')
+
+
+def first_match_context(file_path, pattern, encoding, width=SNIPPET_WIDTH, cache=None):
+    """返回 (第一个匹配的位置, 上下文片段)，没有匹配时返回 (-1, '')
+
+    只读取到第一个匹配之后 width 个字符为止，Office 文件优先使用 cache 中的文本和位置，
+    不在缓存中时找到匹配后不再解析；
+    Office 文件的片段前面加上匹配所在的单元格或段落，例如 "Sheet1!B7 …前文【匹配】后文…"。
+    """
+    if file_type_of(file_path) != 'text':
+        text_map = cached_text_map(file_path, cache)
+        if text_map is not None:
+            content, offset_map = text_map
+            offset, snippet = _first_match(io.StringIO(content), pattern, width)
+        else:
+            offset_map = OffsetMap(file_type_of(file_path))
+            with open_located_text(file_path, offset_map) as source:
+                offset, snippet = _first_match(source, pattern, width)
+        location = offset_map.describe(offset) if offset >= 0 else ''
+        return offset, f"{location} {snippet}" if location else snippet
+    if is_virtual(file_path):
+        with open_member_source(file_path, encoding) as source:
+            return _first_match(source, pattern, width)
+    with open(file_path, 'r', encoding=file_encoding(file_path, encoding), errors='ignore') as source:
+        return _first_match(source, pattern, width)
+
+
+def _first_match(source, pattern, width):
+    offset = 0
+    before = ''
+    matches = iter_stream_matches(source, pattern)
+    for text, match in matches:
+        offset += len(text)
+        before = text[-width:] if len(text) >= width else (before + text)[-width:]
+        if match is None:
+            continue
+        after = ''
+        for text, next_match in matches:
+            after += text + (next_match.group() if next_match is not None else '')
+            if len(after) >= width:
+                break
+        matched = match.group()
+        if len(matched) > width:
+            matched = matched[:width] + '…'
+        return offset, f"…{_one_line(before)}【{_one_line(matched)}】{_one_line(after[:width])}…"
+    return -1, ''
@@ -0,0 +1,109 @@
+"""上一次查找的快照，用于增量查找
+
+记录每个文件的大小、mtime_ns 和各个查询的匹配数。再次查找时只 stat 文件：
+未改动的文件直接使用记录的匹配数；缩小范围的查询（例如在 "abc" 之后查找 "abcd"）
+只需要重新查找在原查询中有匹配的文件。
+"""
+import os
+
+from .index import pattern_exact, pattern_literal
+
+# 最多记住这么多个查询的匹配数
+MAX_QUERIES = 16
+
+
+def query_key(pattern, limit=None):
+    """limit 为每个文件最多统计的匹配数，不同上限的匹配数分开记录"""
+    return pattern.pattern, pattern.flags, limit
+
+
+class SearchSnapshot:
+    """跨多次查找保存的文件状态和匹配数"""
+
+    def __init__(self):
+        self.encoding = None
+        # path -> (size, mtime_ns, {query_key: count})
+        self.files = {}
+        # 最近使用的查询，最新的在最后；值为该查询匹配的固定字符串（不是固定字符串时为 None）
+        self.queries = {}
+
+    def begin(self, pattern, encoding, limit=None):
+        """开始一次查找，返回 SnapshotRun；limit 为每个文件最多统计的匹配数"""
+        if encoding != self.encoding:
+            # 纯文本文件的匹配数取决于编码
+            self.files.clear()
+            self.queries.clear()
+            self.encoding = encoding
+        key = query_key(pattern, limit)
+        base_keys = self.narrowing_bases(pattern, key)
+        self.queries.pop(key, None)
+        self.queries[key] = pattern_literal(pattern)
+        while len(self.queries) > MAX_QUERIES:
+            self.queries.pop(next(iter(self.queries)))
+        return SnapshotRun(self, key, base_keys)
+
+    def narrowing_bases(self, pattern, key):
+        """返回比 pattern 范围更大的已记录查询：pattern 的每个匹配都包含这些查询的固定字符串
+
+        只用来判断没有匹配，与匹配数的上限无关。
+        """
+        exact = pattern_exact(pattern)
+        if not exact:
+            return []
+        return [k for k, literal in self.queries.items()
+                if literal and k != key and all(literal in s for s in exact)]
+
+    def clear(self):
+        self.files.clear()
+        self.queries.clear()
+
+
+class SnapshotRun:
+    """一次查找中对快照的读写"""
+
+    def __init__(self, snapshot, key, base_keys):
+        self.snapshot = snapshot
+        self.key = key
+        self.base_keys = base_keys
+        self.pending = {}
+
+    def reuse(self, file_path):
+        """文件未改动且匹配数已知时返回匹配数，否则返回 None 表示需要重新查找"""
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        state = (st.st_size, st.st_mtime_ns)
+        entry = self.snapshot.files.get(file_path)
+        if entry is None or entry[:2] != state:
+            self.pending[file_path] = state
+            return None
+        counts = entry[2]
+        if self.key in counts:
+            return counts[self.key]
+        if any(counts.get(base) == 0 for base in self.base_keys):
+            # 范围更大的查询都没有匹配，这个查询也不会有
+            counts[self.key] = 0
+            return 0
+        self.pending[file_path] = state
+        return None
+
+    def record(self, file_path, count):
+        state = self.pending.pop(file_path, None)
+        if state is None:
+            return
+        entry = self.snapshot.files.get(file_path)
+        if entry is None or entry[:2] != state:
+            entry = (state[0], state[1], {})
+            self.snapshot.files[file_path] = entry
+        counts = entry[2]
+        counts[self.key] = count
+        # 丢弃已经不再记住的查询
+        for key in [k for k in counts if k not in self.snapshot.queries]:
+            del counts[key]
+
+    def finish(self, file_paths):
+        """完整查找结束后删除本次没有遍历到的文件（已删除或不再符合过滤规则）"""
+        seen = set(file_paths)
+        for file_path in [p for p in self.snapshot.files if p not in seen]:
+            del self.snapshot.files[file_path]
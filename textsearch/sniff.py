@@ -0,0 +1,111 @@
+"""读取文件开头几 KB 判断二进制文件和文本编码
+
+先看 BOM，再看 NUL 字节和控制字符的比例，最后依次尝试 UTF-8、GBK，都不行时使用 latin1。
+检测结果按文件缓存，文件大小或修改时间变化后重新检测；缓存的文件数有上限，超出时丢掉最久未用的。
+"""
+import os
+import codecs
+import threading
+from collections import OrderedDict
+
+# 界面中选择这个“编码”时按文件自动检测
+AUTO_ENCODING = 'auto'
+# 读取文件开头的字节数
+SNIFF_SIZE = 8192
+# 控制字符超过这个比例视为二进制文件
+BINARY_CONTROL_RATIO = 0.1
+# 编码缓存最多保存的文件数
+ENCODING_CACHE_ENTRIES = 100000
+
+_BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+_CANDIDATES = ['utf-8', 'gbk']
+_FALLBACK = 'latin1'
+# 文本中常见的控制字符：\b \t \n \f \r 和 ESC
+_TEXT_CONTROLS = frozenset(b'\b\t\n\f\r\x1b')
+_CONTROL_BYTES = bytes(b for b in range(32) if b not in _TEXT_CONTROLS) + b'\x7f'
+
+
+def sniff_bytes(head, complete):
+    """根据文件开头的字节返回编码，二进制文件返回 None；complete 表示 head 是整个文件"""
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding
+    if b'\0' in head:
+        return None
+    if head and len(head) - len(head.translate(None, _CONTROL_BYTES)) > len(head) * BINARY_CONTROL_RATIO:
+        return None
+    for encoding in _CANDIDATES:
+        try:
+            # 末尾可能截断在多字节字符中间，不是整个文件时不要求完整
+            codecs.getincrementaldecoder(encoding)().decode(head, final=complete)
+        except UnicodeDecodeError:
+            continue
+        return encoding
+    return _FALLBACK
+
+
+def sniff_file(file_path):
+    with open(file_path, 'rb') as file:
+        head = file.read(SNIFF_SIZE + 1)
+    return sniff_bytes(head[:SNIFF_SIZE], len(head) <= SNIFF_SIZE)
+
+
+class EncodingCache:
+    """按文件缓存检测结果：path -> (size, mtime_ns, 编码或 None)，最多保存 max_entries 个文件"""
+
+    def __init__(self, max_entries=ENCODING_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        # 界面线程和查找线程共用
+        self._lock = threading.Lock()
+
+    def lookup(self, file_path):
+        """返回 (编码, 文件大小)，二进制文件的编码为 None；每次只调用一次 os.stat"""
+        st = os.stat(file_path)
+        with self._lock:
+            entry = self.entries.get(file_path)
+            if entry is not None and entry[:2] == (st.st_size, st.st_mtime_ns):
+                self.entries.move_to_end(file_path)
+                return entry[2], st.st_size
+        encoding = sniff_file(file_path)
+        with self._lock:
+            self.entries[file_path] = (st.st_size, st.st_mtime_ns, encoding)
+            self.entries.move_to_end(file_path)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return encoding, st.st_size
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+
+encoding_cache = EncodingCache()
+
+
+def sniff(file_path, encoding):
+    """返回 (读取 file_path 使用的编码, 文件大小)，二进制文件的编码为 None
+
+    与先后调用 is_binary、file_encoding 和 os.path.getsize 的结果相同，但只调用一次 os.stat。
+    """
+    detected, size = encoding_cache.lookup(file_path)
+    if detected is None:
+        return None, size
+    return (detected if encoding == AUTO_ENCODING else encoding), size
+
+
+def is_binary(file_path):
+    return encoding_cache.lookup(file_path)[0] is None
+
+
+def file_encoding(file_path, encoding):
+    """返回读写 file_path 使用的编码：选择了具体编码时直接使用，自动检测时使用检测结果"""
+    if encoding != AUTO_ENCODING:
+        return encoding
+    return encoding_cache.lookup(file_path)[0] or _FALLBACK
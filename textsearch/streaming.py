@@ -0,0 +1,229 @@
+"""大文本文件的分块查找和替换
+
+按固定大小分块读取，相邻块之间保留一段重叠窗口，跨越块边界的匹配也能找到。
+无论文件多大，内存中只保留一个块加上重叠窗口。
+"""
+import os
+import shutil
+import tempfile
+
+from .extractors import READ_CHUNK_SIZE, is_cancelled, iter_office_text
+from .multiterm import match_counter
+from .profiling import PhaseClock, TimedReader
+
+# 单个匹配的最大长度，也是相邻块之间的重叠窗口；更长的匹配会在块边界被截断
+MAX_MATCH_LENGTH = 64 * 1024
+# 每次继续查找时保留在前面的已处理文本，供 \b、^（MULTILINE）和后行断言参考
+LOOKBEHIND_CONTEXT = 256
+
+
+def iter_stream_matches(file, pattern, cancel_event=None):
+    """分块查找，依次返回 (text, match)
+
+    text 是上一个匹配之后、这个匹配之前的原文；match 为 None 时 text 只是一段原文。
+    把所有 text 和匹配文本依次拼起来就是完整的文件内容。
+    """
+    buffer = ''
+    start = 0  # buffer 中已经输出到的位置
+    empty_at = -1  # 上一个空匹配的位置，防止在同一位置重复匹配
+    eof = False
+    while not eof:
+        if is_cancelled(cancel_event):
+            return
+        chunk = file.read(READ_CHUNK_SIZE)
+        eof = not chunk
+        buffer += chunk
+        # limit 之后开始的匹配可能延伸到下一个块，留到下一轮再找
+        limit = len(buffer) if eof else len(buffer) - MAX_MATCH_LENGTH
+        carried = False
+        for match in pattern.finditer(buffer, start):
+            if match.start() == match.end() == empty_at:
+                continue
+            if not eof and match.end() > limit and match.end() - match.start() < MAX_MATCH_LENGTH:
+                carried = True
+                break
+            yield buffer[start:match.start()], match
+            start = match.end()
+            empty_at = start if match.start() == match.end() else -1
+        if not carried and limit > start:
+            yield buffer[start:limit], None
+            start = limit
+
+        drop = max(0, start - LOOKBEHIND_CONTEXT)
+        if drop:
+            buffer = buffer[drop:]
+            start -= drop
+            if empty_at >= 0:
+                empty_at -= drop
+    if start < len(buffer):
+        yield buffer[start:], None
+
+
+class IterReader:
+    """把逐段返回的文本包装成有 read(size) 的对象，供 iter_stream_matches 分块查找
+
+    每次最多返回 chunk_size 个字符：比纯文本文件的读取块小，边解析边查找时可以更早停止解析。
+    """
+
+    def __init__(self, pieces, chunk_size=MAX_MATCH_LENGTH):
+        self.pieces = iter(pieces)
+        self.chunk_size = chunk_size
+        self.buffer = ''
+
+    def read(self, size):
+        size = min(size, self.chunk_size)
+        parts = [self.buffer]
+        length = len(self.buffer)
+        while length < size:
+            piece = next(self.pieces, None)
+            if piece is None:
+                break
+            parts.append(piece)
+            length += len(piece)
+        text = ''.join(parts)
+        self.buffer = text[size:]
+        return text[:size]
+
+
+def _count_source(source, pattern, cancel_event, limit):
+    """统计匹配数，数到 limit 个时停止读取"""
+    counter = match_counter(pattern)
+    for _, match in iter_stream_matches(source, pattern, cancel_event):
+        if match is not None:
+            counter.add(match)
+            if limit is not None and counter.total >= limit:
+                break
+    return counter.result()
+
+
+def count_stream_matches(file_path, pattern, encoding, cancel_event=None, timings=None, limit=None):
+    """分块统计纯文本文件中的匹配数，给出 limit 时数到 limit 个就停止读取
+
+    给出 timings 时把读取（含解码）和匹配的耗时累加进去。
+    """
+    with open(file_path, 'r', encoding=encoding, errors='ignore') as file:
+        return count_text_matches(file, pattern, cancel_event, timings, limit)
+
+
+def count_text_matches(file, pattern, cancel_event=None, timings=None, limit=None):
+    """分块统计已打开的文本流中的匹配数，参数与 count_stream_matches 相同"""
+    clock = PhaseClock(timings)
+    source = TimedReader(file) if timings is not None else file
+    count = _count_source(source, pattern, cancel_event, limit)
+    _split_read_time(clock, source, 'match')
+    return count
+
+
+def count_office_matches(file_path, pattern, cancel_event=None, timings=None, limit=None, file=None):
+    """边解析边统计 .docx/.xlsx 中的匹配数，数到 limit 个时不再解析后面的段落或行
+
+    给出 timings 时解析的耗时计入 extract，其余计入 match；给出 file 时从这个文件对象中读取。
+    """
+    clock = PhaseClock(timings)
+    pieces = iter_office_text(file_path, cancel_event, file)
+    source = IterReader(pieces)
+    if timings is not None:
+        source = TimedReader(source)
+    try:
+        count = _count_source(source, pattern, cancel_event, limit)
+    finally:
+        # 关闭解析器，释放打开的压缩包
+        pieces.close()
+    _split_read_time(clock, source, 'match', 'extract')
+    return count
+
+
+def _split_read_time(clock, source, rest, read='read'):
+    """把 clock 上一次 lap 以来的耗时分为读取（read）和 rest 两部分"""
+    if clock.timings is None:
+        return
+    clock.lap(rest)
+    clock.timings[rest] -= source.seconds
+    clock.timings[read] = clock.timings.get(read, 0.0) + source.seconds
+
+
+def stream_replace(file_path, pattern, replace_term, encoding, cancel_event=None, timings=None):
+    """把替换结果分块写到同一目录下的临时文件，返回 (temp_path, num_subs)
+
+    没有替换或被取消时删除临时文件并返回 (None, 0)。
+    给出 timings 时累加读取的耗时，查找、替换和写入的耗时计入 write。
+    """
+    clock = PhaseClock(timings)
+    fd, temp_path = make_temp_beside(file_path)
+    num_subs = 0
+    try:
+        with open(file_path, 'r', encoding=encoding, errors='ignore') as src, \
+                open(fd, 'w', encoding=encoding, errors='ignore') as dst:
+            source = TimedReader(src) if timings is not None else src
+            for text, match in iter_stream_matches(source, pattern, cancel_event):
+                dst.write(text)
+                if match is not None:
+                    dst.write(match.expand(replace_term))
+                    num_subs += 1
+            # 写入磁盘后再由 commit_replace 改名，中断时原文件保持完整
+            dst.flush()
+            os.fsync(dst.fileno())
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    _split_read_time(clock, source, 'write')
+    if num_subs == 0 or is_cancelled(cancel_event):
+        os.remove(temp_path)
+        return None, 0
+    return temp_path, num_subs
+
+
+def make_temp_beside(file_path):
+    """在 file_path 实际所在的目录中创建临时文件，返回 (fd, temp_path)
+
+    file_path 是符号链接时放在链接指向的文件旁边，commit_replace 才能用 os.replace 替换那个文件。
+    """
+    directory, name = os.path.split(os.path.realpath(file_path))
+    return tempfile.mkstemp(prefix=f'.{name}.', suffix='.tmp', dir=directory)
+
+
+def commit_replace(file_path, temp_path, backup_path=None):
+    """用已经写入磁盘的临时文件替换原文件；给出 backup_path 时先把原文件保存到那里以便撤销
+
+    原文件先硬链接（不在同一设备上时复制）到 backup_path，再用 os.replace 一步换成临时文件，
+    原路径在任何时候都存在；出错时原文件保持不变，已经保存的备份也不删除。
+    file_path 是符号链接时替换链接指向的文件，链接本身保持不变。
+    """
+    file_path = os.path.realpath(file_path)
+    shutil.copymode(file_path, temp_path)
+    if backup_path is not None:
+        try:
+            os.link(file_path, backup_path)
+        except OSError:
+            shutil.copy2(file_path, backup_path)
+    os.replace(temp_path, file_path)
+    _fsync_dir(os.path.dirname(file_path))
+
+
+def _fsync_dir(directory):
+    """把目录项的修改（改名）写入磁盘；不支持打开目录的系统（Windows）上跳过"""
+    try:
+        fd = os.open(directory or '.', os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def stream_trigrams(file_path, encoding, cancel_event=None):
+    """分块提取纯文本文件的三元组"""
+    trigrams = set()
+    tail = ''
+    with open(file_path, 'r', encoding=encoding, errors='ignore') as file:
+        while not is_cancelled(cancel_event):
+            chunk = file.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            text = tail + chunk
+            trigrams.update(text[i:i + 3] for i in range(len(text) - 2))
+            tail = text[-2:]
+    return trigrams
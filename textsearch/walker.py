@@ -0,0 +1,108 @@
+"""基于 os.scandir 的文件夹遍历
+
+所有文件过滤规则合并成一个正则，排除规则在进入子目录之前剪掉整棵子树。
+尽量使用 scandir 返回的目录项类型，只有在需要时才调用 stat，网络盘上能少很多往返。
+"""
+import os
+import re
+import fnmatch
+
+from .archives import archive_kind
+from .extractors import is_cancelled
+
+DEFAULT_EXCLUDES = ['.git', '.svn', '.hg', 'node_modules', '__pycache__']
+
+
+def compile_globs(globs):
+    """把多个通配符合并成一个正则，与 fnmatch.fnmatch 一样按 os.path.normcase 比较
+
+    没有任何规则时返回 None。
+    """
+    globs = [os.path.normcase(g) for g in globs]
+    if not globs:
+        return None
+    return re.compile('|'.join(f'(?:{fnmatch.translate(g)})' for g in globs))
+
+
+class WalkOptions:
+    """遍历选项
+
+    exclude 中的规则与文件名或目录名匹配，含 / 的规则与相对于查找文件夹的路径匹配；
+    max_depth 为 0 时只查找文件夹本身，None 表示不限；max_file_size 单位为字节，None 表示不限；
+    follow_symlinks 决定是否进入指向目录的符号链接；
+    archive_depth 大于 0 时查找压缩包中的文件，最多进入这么多层嵌套的压缩包，见 archives。
+    """
+
+    def __init__(self, exclude=(), max_depth=None, max_file_size=None, follow_symlinks=False, archive_depth=0):
+        self.exclude = list(exclude)
+        self.max_depth = max_depth
+        self.max_file_size = max_file_size
+        self.follow_symlinks = follow_symlinks
+        self.archive_depth = archive_depth
+        self.name_excludes = compile_globs([g for g in self.exclude if '/' not in g])
+        self.path_excludes = compile_globs([g.strip('/') for g in self.exclude if '/' in g])
+
+    def is_excluded(self, name, rel_path):
+        if self.name_excludes is not None and self.name_excludes.match(os.path.normcase(name)):
+            return True
+        if self.path_excludes is not None:
+            return self.path_excludes.match(os.path.normcase(rel_path.replace(os.sep, '/'))) is not None
+        return False
+
+
+def walk_files(folder_path, file_filters, cancel_event=None, options=None):
+    """遍历文件夹，返回符合过滤规则的文件路径，顺序与 os.walk 相同
+
+    查找压缩包中的文件时，压缩包本身不论是否符合过滤规则都会返回，由调用方按过滤规则读取其中的文件。
+    """
+    if options is None:
+        options = WalkOptions()
+    include = compile_globs(file_filters)
+    if include is None:
+        return
+    follow = options.follow_symlinks
+    # 跟随符号链接时记录已访问的目录，避免循环链接
+    visited = set()
+    stack = [(folder_path, '', 0)]
+    while stack:
+        dir_path, rel_dir, depth = stack.pop()
+        if follow:
+            try:
+                st = os.stat(dir_path)
+            except OSError:
+                continue
+            if (st.st_dev, st.st_ino) in visited:
+                continue
+            visited.add((st.st_dev, st.st_ino))
+        try:
+            with os.scandir(dir_path) as it:
+                entries = list(it)
+        except OSError:
+            continue
+
+        subdirs = []
+        for entry in entries:
+            if is_cancelled(cancel_event):
+                return
+            rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+            if options.is_excluded(entry.name, rel_path):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=follow):
+                    if options.max_depth is None or depth < options.max_depth:
+                        subdirs.append((entry.path, rel_path, depth + 1))
+                    continue
+                if not include.match(os.path.normcase(entry.name)) and \
+                        not (options.archive_depth and archive_kind(entry.name)):
+                    continue
+                # 与 os.walk 一样，指向文件的符号链接总是照常读取
+                if not entry.is_file():
+                    continue
+                if options.max_file_size is not None and entry.stat().st_size > options.max_file_size:
+                    continue
+            except OSError:
+                continue
+            yield entry.path
+
+        # 倒序压栈，使子目录按 scandir 的顺序依次处理
+        stack.extend(reversed(subdirs))